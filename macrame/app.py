@@ -13,7 +13,17 @@ from .command.cleanCommand import CleanCommand
 from .command.infoCommand import InfoCommand
 from .command.toolCommand import ToolCommand
 from .command.todoCommand import TodoCommand
-from .test import TestCommand
+from .command.sizeCommand import SizeCommand
+from .command.convertCommand import ConvertCommand
+from .command.memoryCommand import MemoryCommand
+from .command.versionCommand import VersionCommand
+from .command.depsCommand import DepsCommand
+from .command.workspaceCommand import WorkspaceCommand
+from .command.compileDbCommand import CompileDbCommand
+from .command.lintCommand import LintCommand
+from .command.benchCommand import BenchCommand
+from .command.testCommand import TestCommand
+from .command.statsCommand import StatsCommand
 
 
 class App:
@@ -30,14 +40,27 @@ class App:
 			"mac[rame]",
 			"Utility to build Assembly/C/C++ projects",
 			"Author: Kanelis Elias")
-		NewCommand("new", "Instantiate a new macrame project")
-		BuildCommand("build", "builds the software")
-		CleanCommand("clean", "remove the generated files")
-		RunCommand("run", "executes the program")
-		InfoCommand("info", "shows project specific information")
-		ToolCommand("tool", "Checks for tools")
-		TodoCommand("todo", "Lists programmer's todo/bug/fix keywords")
-		TestCommand("test", "this is a test")
+		NewCommand(self.parser, "new", "Instantiate a new macrame project")
+		BuildCommand(self.parser, "build", "builds the software")
+		CleanCommand(self.parser, "clean", "remove the generated files")
+		RunCommand(self.parser, "run", "executes the program")
+		InfoCommand(self.parser, "info", "shows project specific information")
+		ToolCommand(self.parser, "tool", "Checks for tools")
+		TodoCommand(self.parser, "todo", "Lists programmer's todo/bug/fix keywords")
+		SizeCommand(self.parser, "size", "shows the firmware size per section and symbol")
+		ConvertCommand(self.parser, "convert", "converts the elf to bin, hex and sym files")
+		MemoryCommand(self.parser, "memory", "reports the stack and static RAM usage")
+		VersionCommand(self.parser, "version", "generates inc/version.h from git")
+		DepsCommand(self.parser, "deps", "ranks the headers by the cost of rebuilding their dependents")
+		WorkspaceCommand(
+			self.parser, "workspace", "builds, cleans or checks all the projects of a workspace")
+		CompileDbCommand(
+			self.parser, "compile-db", "writes the compile_commands.json of a port without building")
+		LintCommand(self.parser, "lint", "runs a static analyzer on every translation unit")
+		BenchCommand(self.parser, "bench", "times repeated runs of the posix program against a baseline")
+		TestCommand(self.parser, "test", "builds and runs the unit tests")
+		StatsCommand(
+			self.parser, "stats", "shows the trends of the recorded builds and flags regressions")
 
 	def run(self):
 		"""
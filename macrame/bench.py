@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks of the posix program
+
+The linked program is run several times, one run after the other, with
+the same input (the 'commands' file by default). The first runs warm the
+caches up and are not measured. Every measured run gives its wall time,
+its CPU time and its peak memory. The runs go through the launcher of
+core.process, which measures the program alone: without a C compiler
+to build it, the peak memory is not measured.
+
+The samples can be saved as the baseline of the port and target
+(tmp/<port>/<target>/bench/baseline.json) and later runs are compared
+with it. A difference is significant when the medians differ by at least
+MIN_CHANGE and the Mann-Whitney U test gives a p-value below ALPHA: the
+test makes no assumption on the distribution of the times, and a few
+outliers (a busy machine) do not hide or fake a change.
+"""
+
+import os
+import json
+import math
+import time
+import statistics
+import subprocess
+from .core import process
+from .core.exceptions import UserInputError
+from .core.utils import AtomicWriter
+from .size import get_commit_hash
+
+BASELINE_FILENAME = "baseline.json"
+
+# The measurements of every run
+METRICS = ("wall", "cpu", "max_rss")
+
+# Significance level of the comparisons
+ALPHA = 0.05
+
+# Smallest change of the median that is reported (%), below it is noise of the machine
+MIN_CHANGE = 5.0
+
+
+def run_once(program, input_path=None):
+	"""
+	Runs a program once and measures it
+
+	param: program      The program path
+	param: input_path   The file given as its input or None for no input
+
+	Returns {"returncode", "wall", "cpu", "max_rss"}, max_rss is None if unknown
+	"""
+	command = [os.path.join(".", program)]
+	try:
+		if input_path is None:
+			result = process.run(command, capture=True, stdin=subprocess.DEVNULL)
+		else:
+			with open(input_path, "rb") as stdin:
+				result = process.run(command, capture=True, stdin=stdin)
+	except OSError as e:
+		raise UserInputError(f"'{program}' could not be run: {e.strerror}") from e
+
+	return {
+		"returncode": result.returncode,
+		"wall": result.wall,
+		"cpu": result.cpu,
+		"max_rss": result.max_rss}
+
+
+def measure(program, runs=10, warmup=1, input_path=None):
+	"""
+	Runs a program repeatedly
+
+	param: program      The program path
+	param: runs         The number of measured runs
+	param: warmup       The number of runs before them, not measured
+	param: input_path   The file given as input of every run or None for no input
+
+	Returns the samples {metric: [values]}, without the metrics that were not measured
+	"""
+	if not os.path.isfile(program):
+		raise UserInputError(f"The program '{program}' does not exist. Please build it first")
+
+	rv = {metric: list() for metric in METRICS}
+	for index in range(warmup + runs):
+		result = run_once(program, input_path)
+		if result["returncode"] != 0:
+			raise UserInputError(f"'{program}' failed with exit code {result['returncode']}")
+		if index >= warmup:
+			for metric in METRICS:
+				if result[metric] is not None:
+					rv[metric].append(result[metric])
+
+	return {metric: values for metric, values in rv.items() if values}
+
+
+def describe(values):
+	"""
+	The statistics of samples
+
+	Returns {"mean", "median", "stdev", "min", "max"}
+	"""
+	return {
+		"mean": statistics.mean(values),
+		"median": statistics.median(values),
+		"stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+		"min": min(values),
+		"max": max(values),
+	}
+
+
+def mann_whitney(a, b):
+	"""
+	The Mann-Whitney U test of two samples
+
+	The p-value is two-sided and comes from the normal approximation with
+	the tie correction, which is good from about 8 samples per side.
+
+	Returns the p-value (1.0 when the samples cannot be told apart)
+	"""
+	n1 = len(a)
+	n2 = len(b)
+	if n1 == 0 or n2 == 0:
+		return 1.0
+
+	# Ranks of the pooled samples, ties get their average rank
+	pooled = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+	ranks = [0.0] * len(pooled)
+	ties = 0.0
+	index = 0
+	while index < len(pooled):
+		end = index
+		while end + 1 < len(pooled) and pooled[end + 1][0] == pooled[index][0]:
+			end += 1
+		for position in range(index, end + 1):
+			ranks[position] = (index + end) / 2 + 1
+		count = end - index + 1
+		ties += count ** 3 - count
+		index = end + 1
+
+	rank_sum = sum(rank for rank, (_, group) in zip(ranks, pooled) if group == 0)
+	u = rank_sum - n1 * (n1 + 1) / 2
+	n = n1 + n2
+	variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+	if variance <= 0:
+		return 1.0
+
+	# Continuity correction
+	z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+	return min(1.0, math.erfc(max(0.0, z) / math.sqrt(2)))
+
+
+def compare(samples, baseline, min_change=MIN_CHANGE):
+	"""
+	Compares samples with the baseline
+
+	param: samples      The samples (see measure)
+	param: baseline     The samples of the baseline
+	param: min_change   The smallest significant change of the median (%)
+
+	Returns a list of tuples (metric, change in %, p-value, significant)
+	"""
+	rv = list()
+	for metric in METRICS:
+		old = baseline.get(metric) or list()
+		new = samples.get(metric) or list()
+		if not old or not new:
+			continue
+		old_median = statistics.median(old)
+		change = 100 * (statistics.median(new) - old_median) / old_median if old_median else 0.0
+		p_value = mann_whitney(new, old)
+		rv.append((metric, change, p_value, p_value < ALPHA and abs(change) >= min_change))
+
+	return rv
+
+
+def _value(metric, value):
+	"""
+	Formats a measurement
+	"""
+	if metric == "max_rss":
+		return f"{value / 1024:.0f} KiB"
+	return f"{value * 1000:.2f} ms"
+
+
+def format_statistics(samples):
+	"""
+	Formats the statistics of the samples as a table
+	"""
+	txt = f"{'Metric':<8} {'Mean':>12} {'Median':>12} {'Stdev':>12} {'Min':>12} {'Max':>12}\n"
+	for metric in METRICS:
+		if not samples.get(metric):
+			continue
+		stats = describe(samples[metric])
+		txt += f"{metric:<8}"
+		for key in ("mean", "median", "stdev", "min", "max"):
+			txt += f" {_value(metric, stats[key]):>12}"
+		txt += "\n"
+
+	return txt
+
+
+def format_comparison(comparison):
+	"""
+	Formats the comparison with the baseline
+	"""
+	txt = f"{'Metric':<8} {'Change':>8} {'p-value':>8}\n"
+	for metric, change, p_value, significant in comparison:
+		verdict = ""
+		if significant and metric == "max_rss":
+			verdict = "  more memory" if change > 0 else "  less memory"
+		elif significant:
+			verdict = "  slower" if change > 0 else "  faster"
+		txt += f"{metric:<8} {change:+7.1f}% {p_value:8.3f}{verdict}\n"
+
+	return txt
+
+
+class BenchStore:
+	"""
+	The benchmark baseline of a port and target
+	"""
+
+	def __init__(self, directory):
+		"""
+		param: directory   Where the baseline is stored (tmp/<port>/<target>/bench)
+		"""
+		self.path = os.path.join(directory, BASELINE_FILENAME)
+
+	def load(self):
+		"""
+		Returns the saved baseline or None
+		"""
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return None
+
+	def save(self, samples, input_path=None):
+		"""
+		Saves samples as the baseline
+
+		param: samples      The samples (see measure)
+		param: input_path   The input file of the runs or None
+		"""
+		with AtomicWriter(self.path) as f:
+			json.dump({
+				"time": int(time.time()),
+				"commit": get_commit_hash("HEAD"),
+				"input": input_path,
+				"samples": samples}, f, indent=1)
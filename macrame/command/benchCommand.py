@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+Bench command
+"""
+
+import os
+from ..core.cli import Command
+from ..core.utils import listPortNames
+from ..bench import MIN_CHANGE
+from ..bench import BenchStore
+from ..bench import compare
+from ..bench import format_comparison
+from ..bench import format_statistics
+from ..bench import measure
+from ..makefile import MakefileBuildManager
+from ..profiling import COMMANDS_FILENAME
+
+
+class BenchCommand(Command):
+	"""
+	Times repeated runs of the posix program
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Local or remote makefile
+		self.subparser.add_argument(
+			'-r', '--force_remote',
+			default=False,
+			action='store_true',
+			help="use the tools internal build system config files")
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default="",
+			choices=listPortNames(),
+			type=str,
+			help="the port name.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Runs
+		self.subparser.add_argument(
+			'-n', '--runs',
+			default=10,
+			type=int,
+			help="number of measured runs")
+
+		self.subparser.add_argument(
+			'-w', '--warmup',
+			default=1,
+			type=int,
+			help="number of runs before the measured ones")
+
+		# Input
+		self.subparser.add_argument(
+			'-i', '--input',
+			default=None,
+			type=str,
+			help=f"the input of every run (default: the '{COMMANDS_FILENAME}' file if any)")
+
+		# Baseline
+		self.subparser.add_argument(
+			'--threshold',
+			default=MIN_CHANGE,
+			type=float,
+			help=f"smallest change from the baseline reported, in %% (default: {MIN_CHANGE})")
+
+		self.subparser.add_argument(
+			'--save-baseline',
+			default=False,
+			action='store_true',
+			help="saves the measurements as the baseline of the port and target")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		build_manager = MakefileBuildManager(
+			port_name=args.port,
+			use_local_makefile=not args.force_remote,
+			target=args.target
+		)
+		if build_manager.port not in (None, "posix"):
+			self.error("Benchmarks are only available for the posix port")
+		if args.runs < 2:
+			self.error("At least 2 runs are needed")
+
+		input_path = args.input
+		if input_path is None and os.path.isfile(COMMANDS_FILENAME):
+			input_path = COMMANDS_FILENAME
+		if input_path is not None and not os.path.isfile(input_path):
+			self.error(f"The input file '{input_path}' does not exist")
+
+		samples = measure(
+			build_manager.elf_path, runs=args.runs, warmup=args.warmup, input_path=input_path)
+		print(f"{build_manager.elf_path}: {args.runs} runs, {args.warmup} warm-up")
+		print(format_statistics(samples), end="")
+		if "max_rss" not in samples:
+			print("The peak memory was not measured: its launcher needs a C compiler (cc)")
+
+		rv = 0
+		store = BenchStore(os.path.join(build_manager.tmp_outdir, "bench"))
+		baseline = store.load()
+		if baseline is not None:
+			comparison = compare(samples, baseline["samples"], min_change=args.threshold)
+			print()
+			print(f"Baseline of commit {baseline.get('commit') or '-'}:")
+			print(format_comparison(comparison), end="")
+			if any(significant and change > 0 for _, change, _, significant in comparison):
+				rv = 1
+
+		if args.save_baseline:
+			store.save(samples, input_path)
+			print(f"Baseline saved in '{store.path}'")
+
+		return rv
@@ -4,9 +4,15 @@
 Build command
 """
 
+import os
 from ..core.cli import Command
+from ..core.exceptions import UserInputError
 from ..core.utils import listPortNames
 from ..makefile import MakefileBuildManager
+from ..matrix import build_matrix
+from ..matrix import plan_cells
+from ..metrics import BuildRecorder
+from ..ninja import NinjaBuildManager
 
 
 class BuildCommand(Command):
@@ -34,14 +40,139 @@ class BuildCommand(Command):
 			type=str,
 			help="the port name.")
 
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Backend
+		self.subparser.add_argument(
+			'-b', '--backend',
+			default="make",
+			choices=["make", "ninja"],
+			type=str,
+			help="the build tool. 'ninja' generates a build.ninja from the makefiles.")
+
+		# Parallel jobs
+		self.subparser.add_argument(
+			'-j', '--jobs',
+			default=None,
+			nargs='?',
+			const=os.cpu_count() or 1,
+			type=int,
+			help="builds in parallel, longest path first (all CPUs when no number is given).")
+
+		# Load average cap
+		self.subparser.add_argument(
+			'-l', '--load-average',
+			default=None,
+			type=float,
+			help="starts no parallel job while the load average is above this.")
+
+		# Rebuild reasons
+		self.subparser.add_argument(
+			'--explain',
+			default=False,
+			action='store_true',
+			help="prints why every object, program and conversion is rebuilt.")
+
+		# Precompiled headers
+		self.subparser.add_argument(
+			'--pch',
+			default=False,
+			action='store_true',
+			help="precompiles the headers that most sources include.")
+
+		# Unity build
+		self.subparser.add_argument(
+			'--unity',
+			default=None,
+			metavar="N",
+			type=int,
+			help="compiles the sources of each language in N unity files (rel target only).")
+
+		# Unit tests
+		self.subparser.add_argument(
+			'--no-tests',
+			default=False,
+			action='store_true',
+			help="builds the program without the unit tests.")
+
+		# Build matrix
+		self.subparser.add_argument(
+			'--all-ports',
+			default=False,
+			action='store_true',
+			help="builds every port concurrently. The logs are in tmp/<port>/<target>/build.log.")
+
+		self.subparser.add_argument(
+			'--targets',
+			default=None,
+			type=lambda value: value.split(","),
+			help="comma separated targets built concurrently (e.g. 'dbg,rel').")
+
 	def run(self, args):
 		"""
 		Runs the command
 		"""
-		build_manager = MakefileBuildManager(
+		if args.all_ports or args.targets:
+			return self.run_matrix(args)
+
+		if args.backend == "ninja":
+			manager_class = NinjaBuildManager
+		else:
+			manager_class = MakefileBuildManager
+		build_manager = manager_class(
 			port_name=args.port,
-			use_local_makefile=not args.force_remote
+			use_local_makefile=not args.force_remote,
+			target=args.target
+		)
+		variables = {"RUN_TESTS": "no"} if args.no_tests else None
+		recorder = BuildRecorder(build_manager, args.backend)
+		rv = build_manager.build(
+			jobs=args.jobs,
+			max_load=args.load_average,
+			explain=args.explain,
+			pch=args.pch,
+			unity=args.unity,
+			variables=variables,
+			env=recorder.env
 		)
-		rv = build_manager.build()
+		recorder.record(rv)
 
 		return rv
+
+	def run_matrix(self, args):
+		"""
+		Builds ports and targets concurrently
+		"""
+		targets = args.targets or [args.target]
+		for target in targets:
+			if target not in ("dbg", "rel"):
+				raise UserInputError(f"Target '{target}' is not available. Options are 'dbg' and 'rel'")
+		ports = listPortNames()
+		if ports is not None and not args.all_ports:
+			# The selected port or else the first one, like a single build
+			ports = [args.port or ports[0]]
+
+		arguments = ["-b", args.backend]
+		if args.force_remote:
+			arguments.append("-r")
+		if args.load_average is not None:
+			arguments += ["-l", str(args.load_average)]
+		if args.explain:
+			arguments.append("--explain")
+		if args.pch:
+			arguments.append("--pch")
+		if args.unity is not None:
+			arguments += ["--unity", str(args.unity)]
+
+		cells = plan_cells(ports, targets)
+		for cell in cells:
+			if args.no_tests:
+				cell.run_tests = False
+
+		return build_matrix(cells, arguments, jobs=args.jobs)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""
+Compile database command
+"""
+
+from ..core.cli import Command
+from ..core.utils import listPortNames
+from ..compiledb import FILENAME
+from ..compiledb import CompileDatabase
+from ..makefile import MakefileBuildManager
+
+
+class CompileDbCommand(Command):
+	"""
+	Writes the compile_commands.json of a port and target
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Local or remote makefile
+		self.subparser.add_argument(
+			'-r', '--force_remote',
+			default=False,
+			action='store_true',
+			help="use the tools internal build system config files")
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default="",
+			choices=listPortNames(),
+			type=str,
+			help="the port name.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Output
+		self.subparser.add_argument(
+			'-o', '--output',
+			default=FILENAME,
+			type=str,
+			help=f"the database file (default: {FILENAME})")
+
+		# Regenerate
+		self.subparser.add_argument(
+			'-f', '--force',
+			default=False,
+			action='store_true',
+			help="evaluates the makefiles even if nothing changed")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		build_manager = MakefileBuildManager(
+			port_name=args.port,
+			use_local_makefile=not args.force_remote,
+			target=args.target
+		)
+
+		database = CompileDatabase(build_manager, args.output)
+		count = database.generate(force=args.force)
+		if count is None:
+			print(f"'{args.output}' is up to date")
+		else:
+			print(f"'{args.output}': {count} translation units")
+
+		return 0
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""
+Convert command
+"""
+
+import os
+from ..core.cli import Command
+from ..convert import convert
+
+
+class ConvertCommand(Command):
+	"""
+	Converts the linked ELF to binary, Intel hex and symbol files
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Input file
+		self.subparser.add_argument(
+			'elf',
+			type=str,
+			help="the ELF file to convert")
+
+		# Outputs
+		self.subparser.add_argument(
+			'--bin',
+			default=None,
+			type=str,
+			help="the raw binary output file")
+		self.subparser.add_argument(
+			'--hex',
+			default=None,
+			type=str,
+			help="the Intel hex output file")
+		self.subparser.add_argument(
+			'--sym',
+			default=None,
+			type=str,
+			help="the symbol listing output file")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		if not os.path.isfile(args.elf):
+			self.error(f"'{args.elf}' was not found")
+
+		bin_path, hex_path, sym_path = args.bin, args.hex, args.sym
+
+		# Without explicit outputs all of them are placed next to the ELF
+		if bin_path is None and hex_path is None and sym_path is None:
+			base = os.path.splitext(args.elf)[0]
+			bin_path, hex_path, sym_path = f"{base}.bin", f"{base}.hex", f"{base}.sym"
+
+		convert(args.elf, bin_path=bin_path, hex_path=hex_path, sym_path=sym_path)
+
+		return 0
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+Deps command
+"""
+
+import os
+import json
+from ..core.cli import Command
+from ..core.exceptions import UserInputError
+from ..core.utils import listPortNames
+from ..compiledb import FILENAME
+from ..compiledb import CompileDatabase
+from ..makefile import MakefileBuildManager
+from ..scheduler import BuildHistory
+from ..deps import collect_dependencies
+from ..deps import header_fanout
+from ..deps import format_fanout
+
+
+class DepsCommand(Command):
+	"""
+	Ranks the headers by the cost of rebuilding their dependents
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default="",
+			choices=listPortNames(),
+			type=str,
+			help="the port name.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Number of headers
+		self.subparser.add_argument(
+			'-n', '--top',
+			default=20,
+			type=int,
+			help="number of headers to list")
+
+		# JSON output
+		self.subparser.add_argument(
+			'--json',
+			default=False,
+			action='store_true',
+			help="print all the headers as JSON")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		build_manager = MakefileBuildManager(
+			port_name=args.port,
+			target=args.target
+		)
+
+		# The objects of the build, from the compilation database of the port and target
+		database = CompileDatabase(build_manager, os.path.join(build_manager.tmp_outdir, FILENAME))
+		try:
+			objects = [entry["output"] for entry in database.entries()]
+		except UserInputError:
+			objects = None
+
+		dependencies = collect_dependencies(build_manager.obj_outdir, objects)
+		if not dependencies:
+			self.error(
+				f"No dependency files were found in '{build_manager.obj_outdir}'. Please build the project first")
+
+		history = BuildHistory(build_manager.history_path)
+		durations = dict()
+		for obj_path in dependencies:
+			duration = history.get(obj_path, "duration")
+			if duration is not None:
+				durations[obj_path] = duration
+		entries = header_fanout(dependencies, durations)
+		total_cost = sum(durations.values())
+
+		if args.json:
+			print(json.dumps({
+				"units": len(dependencies),
+				"cost": total_cost,
+				"headers": entries}, indent=4))
+		else:
+			print(format_fanout(entries, len(dependencies), total_cost, top=args.top), end="")
+
+		return 0
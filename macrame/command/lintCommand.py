@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+Lint command
+"""
+
+import os
+import shlex
+from ..core.cli import Command
+from ..core.utils import listPortNames
+from ..compiledb import FILENAME
+from ..compiledb import CompileDatabase
+from ..lint import ANALYZERS
+from ..lint import Linter
+from ..makefile import MakefileBuildManager
+
+
+class LintCommand(Command):
+	"""
+	Runs a static analyzer on every translation unit
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Local or remote makefile
+		self.subparser.add_argument(
+			'-r', '--force_remote',
+			default=False,
+			action='store_true',
+			help="use the tools internal build system config files")
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default="",
+			choices=listPortNames(),
+			type=str,
+			help="the port name.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Analyzer
+		self.subparser.add_argument(
+			'-a', '--analyzer',
+			default="clang-tidy",
+			choices=ANALYZERS,
+			type=str,
+			help="the static analyzer.")
+
+		# Analyzer options
+		self.subparser.add_argument(
+			'--args',
+			default="",
+			type=str,
+			help="options given to the analyzer (e.g. \"--checks=bugprone-*\").")
+
+		# Parallel jobs
+		self.subparser.add_argument(
+			'-j', '--jobs',
+			default=os.cpu_count() or 1,
+			type=int,
+			help="number of analyzers that run at once (default: all CPUs).")
+
+		# Cache
+		self.subparser.add_argument(
+			'--no-cache',
+			default=False,
+			action='store_true',
+			help="analyzes every unit again.")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		build_manager = MakefileBuildManager(
+			port_name=args.port,
+			use_local_makefile=not args.force_remote,
+			target=args.target
+		)
+
+		# A database of the port and target, the makefiles are only evaluated when it is out of date
+		database = CompileDatabase(build_manager, os.path.join(build_manager.tmp_outdir, FILENAME))
+		entries = database.entries()
+
+		linter = Linter(args.analyzer, os.path.join(build_manager.tmp_outdir, "lint"), shlex.split(args.args))
+		return linter.run(entries, jobs=args.jobs, use_cache=not args.no_cache)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+Memory command
+"""
+
+import os
+import json
+from ..core.cli import Command
+from ..core.utils import listPortNames
+from ..makefile import MakefileBuildManager
+from ..memory import memory_report
+
+
+class MemoryCommand(Command):
+	"""
+	Reports the stack and static RAM usage of a port
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Local or remote makefile
+		self.subparser.add_argument(
+			'-r', '--force_remote',
+			default=False,
+			action='store_true',
+			help="use the tools internal build system config files")
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default="",
+			choices=listPortNames(),
+			type=str,
+			help="the port name.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Number of entry points
+		self.subparser.add_argument(
+			'-n', '--top',
+			default=10,
+			type=int,
+			help="number of entry points to list")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		build_manager = MakefileBuildManager(
+			port_name=args.port,
+			use_local_makefile=not args.force_remote,
+			target=args.target
+		)
+
+		# C and C++ objects compiled without stack usage are rebuilt. The
+		# assembly objects never have one: their sources are kept by path
+		# in the object directory (e.g. src/startup.s in obj/src/startup.o)
+		obj_outdir = build_manager.obj_outdir
+		for parent_path, _, filenames in os.walk(obj_outdir):
+			for filename in filenames:
+				if filename.endswith(".o"):
+					obj_path = os.path.join(parent_path, filename)
+					if os.path.isfile(obj_path[:-2] + ".su"):
+						continue
+					src_path = os.path.relpath(obj_path, obj_outdir)[:-2]
+					if os.path.isfile(src_path + ".c") or os.path.isfile(src_path + ".cpp"):
+						os.remove(obj_path)
+
+		rv = build_manager.build(variables={"STACK_USAGE": "yes"})
+		if rv != 0:
+			return rv
+
+		ram_size = build_manager.query("RAM_SIZE")["RAM_SIZE"]
+		ram_size = int(ram_size, 0) if ram_size else None
+
+		port = build_manager.port or os.path.basename(os.getcwd())
+		txt, report = memory_report(
+			port,
+			obj_outdir,
+			build_manager.elf_path,
+			ram_size=ram_size,
+			top=args.top)
+
+		with open(os.path.join(build_manager.tmp_outdir, "memory.json"), "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=4)
+		print(txt, end="")
+
+		return 0
@@ -4,10 +4,10 @@
 New command
 """
 
-import os
 from ..core.cli import Command
-from ..resource import get_abs_resourse_path
-from ..core.utils import copytree
+from ..core.utils import listPortNames
+from ..scaffold import create_project
+from ..scaffold import template_path
 
 
 class NewCommand(Command):
@@ -15,27 +15,53 @@ class NewCommand(Command):
 	Instantiates a new macrame project
 	"""
 
-	def run(self, args):
+	def config(self):
 		"""
-		Runs the command
+		Configuration of arguments
 		"""
-		rv = 0
 
-		source_dir = get_abs_resourse_path("new_project")
-		destination_dir = os.path.abspath(args.directory)
+		# Project directory
+		self.subparser.add_argument(
+			'path',
+			default=".",
+			nargs='?',
+			type=str,
+			help="the project directory, created when missing (default: the current one).")
 
-		# Getting the list of directories
-		listDir = os.listdir(destination_dir)
-		listDir = [x for x in listDir if not x.startswith('.')]
+		# Ports
+		self.subparser.add_argument(
+			'-p', '--ports',
+			default=None,
+			type=lambda value: value.split(","),
+			help=f"comma separated ports to instantiate (default: all). "
+			f"Options are: {', '.join(listPortNames(template_path()) or list())}.")
 
-		if len(listDir):
-			self.error("Directory is Not empty")
+		# Copy method
+		self.subparser.add_argument(
+			'--link',
+			default=False,
+			action='store_true',
+			help="hard links the files of the template instead of copying them, for throwaway projects. "
+			"Editing a linked file in place edits the template.")
 
+		# Parallel copies
+		self.subparser.add_argument(
+			'-j', '--jobs',
+			default=None,
+			type=int,
+			help="number of files copied at once (default: all CPUs).")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
 		try:
-			copytree(source_dir, destination_dir)
+			counts = create_project(args.path, ports=args.ports, link=args.link, jobs=args.jobs)
 		except KeyboardInterrupt:
-			for item in listDir:
-				os.remove(item)
-			self.error()
+			self.error("Interrupted. The project was not created")
+
+		verbs = {"hardlink": "linked", "reflink": "reflinked", "copy": "copied"}
+		methods = ", ".join(f"{counts[method]} {verbs[method]}" for method in verbs if method in counts)
+		print(f"Project created in '{args.path}' ({sum(counts.values())} files: {methods})")
 
-		return rv
+		return 0
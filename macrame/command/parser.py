@@ -6,7 +6,6 @@ Parser and build commands
 
 import io
 import os
-import sys
 from ..core.complete import complete
 from ..core.cli import Parser
 from .. import __version__
@@ -41,12 +40,14 @@ class MyParser(Parser):
 
 	def run(self, args):
 		"""
-		Configuration of arguments
+		Handles the arguments of the program itself
+
+		Returns an exit code to stop or None to run the command
 		"""
 		# Version information
 		if args.version:
 			print(f"Version: {__version__}")
-			sys.exit(0)
+			return 0
 
 		# Working directory
 		directory = os.path.abspath(args.directory)
@@ -65,7 +66,7 @@ class MyParser(Parser):
 				for line in lines:
 					print(line.strip())
 				completion_script.close()
-				sys.exit(0)
+				return 0
 		elif args.complete is not None:
 			program_names = sorted(['mac', 'macrame'], key=len, reverse=True)
 
@@ -81,4 +82,6 @@ class MyParser(Parser):
 
 			rv = complete(self.parser, cli_args)
 			print(rv)
-			sys.exit(0)
+			return 0
+
+		return None
@@ -7,6 +7,8 @@ Run command
 from ..core.cli import Command
 from ..core.utils import listPortNames
 from ..makefile import MakefileBuildManager
+from ..profiling import PROFILERS
+from ..profiling import profile
 
 
 class RunCommand(Command):
@@ -34,14 +36,42 @@ class RunCommand(Command):
 			type=str,
 			help="the port name.")
 
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Profiling
+		self.subparser.add_argument(
+			'--profile',
+			default=None,
+			choices=PROFILERS,
+			type=str,
+			help="runs the posix program under a profiler and shows its hotspots.")
+
+		self.subparser.add_argument(
+			'--top',
+			default=20,
+			type=int,
+			help="number of functions in the hotspot summary.")
+
 	def run(self, args):
 		"""
 		Runs the command
 		"""
 		build_manager = MakefileBuildManager(
 			port_name=args.port,
-			use_local_makefile=not args.force_remote
+			use_local_makefile=not args.force_remote,
+			target=args.target
 		)
+		if args.profile is not None:
+			if build_manager.port not in (None, "posix"):
+				self.error("Profiling is only available for the posix port")
+			return profile(args.profile, build_manager.elf_path, build_manager.tmp_outdir, top=args.top)
+
 		rv = build_manager.run()
 
 		return rv
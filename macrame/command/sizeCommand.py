@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Size command
+"""
+
+import os
+import time
+from ..core.cli import Command
+from ..core.utils import listPortNames
+from ..makefile import MakefileBuildManager
+from ..size import take_snapshot
+from ..size import diff_snapshots
+from ..size import format_diff
+
+
+class SizeCommand(Command):
+	"""
+	Shows the firmware size per section and symbol
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default="",
+			choices=listPortNames(),
+			type=str,
+			help="the port name.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Reference snapshot
+		self.subparser.add_argument(
+			'-d', '--diff',
+			default=None,
+			metavar="REF",
+			type=str,
+			help="compare against the snapshot of a git reference or a snapshot file")
+
+		# Number of symbols
+		self.subparser.add_argument(
+			'-n', '--top',
+			default=10,
+			type=int,
+			help="number of growers and shrinkers to list per section")
+
+		# History
+		self.subparser.add_argument(
+			'--history',
+			default=False,
+			action='store_true',
+			help="show the section totals of the previous builds")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		build_manager = MakefileBuildManager(
+			port_name=args.port,
+			target=args.target
+		)
+		store = build_manager.size_store()
+
+		if args.history:
+			for record in store.history():
+				date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["time"]))
+				commit = (record["commit"] or "")[:7]
+				totals = " ".join(f"{k}={v}" for k, v in sorted(record["totals"].items()))
+				print(f"{date}  {commit:7}  {totals}")
+			return 0
+
+		elf_path = build_manager.elf_path
+		if not os.path.isfile(elf_path):
+			self.error(f"'{elf_path}' was not found. Please build the project first")
+		snapshot = take_snapshot(elf_path)
+
+		if args.diff is None:
+			for section, total in sorted(snapshot["totals"].items()):
+				print(f"{section:24} {total:10d}")
+			return 0
+
+		reference = store.load(args.diff)
+		if reference is None:
+			self.error(f"No size snapshot was saved for '{args.diff}'")
+
+		changes = diff_snapshots(reference, snapshot)
+		print(format_diff(reference, snapshot, changes, top=args.top), end="")
+
+		return 0
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+Stats command
+"""
+
+import os
+from ..core.cli import Command
+from ..core.utils import listPortNames
+from ..metrics import OPENMETRICS_PATH
+from ..metrics import WINDOW
+from ..metrics import MetricsStore
+from ..metrics import find_regressions
+from ..metrics import format_builds
+from ..metrics import format_phases
+from ..metrics import format_regressions
+from ..metrics import write_openmetrics
+
+
+class StatsCommand(Command):
+	"""
+	Shows the trends of the recorded builds
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default=None,
+			choices=listPortNames(),
+			type=str,
+			help="shows only the builds of this port.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default=None,
+			choices=["dbg", "rel"],
+			type=str,
+			help="shows only the builds of this configuration.")
+
+		# Builds shown
+		self.subparser.add_argument(
+			'-n', '--count',
+			default=10,
+			type=int,
+			help="number of recent builds shown per port and target")
+
+		# Baseline
+		self.subparser.add_argument(
+			'-w', '--window',
+			default=WINDOW,
+			type=int,
+			help=f"number of previous builds in the rolling baseline (default: {WINDOW})")
+
+		# Export
+		self.subparser.add_argument(
+			'--openmetrics',
+			default=None,
+			nargs='?',
+			const=OPENMETRICS_PATH,
+			metavar="PATH",
+			help=f"writes the last builds in the OpenMetrics text format (default: {OPENMETRICS_PATH})")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		if args.count < 1 or args.window < 1:
+			self.error("The number of builds must be positive")
+
+		store = MetricsStore()
+		configurations = [
+			(port, target, backend) for port, target, backend in store.configurations()
+			if args.port in (None, port) and args.target in (None, target)]
+		if not configurations:
+			self.error("No build was recorded. Please run 'mac build' first")
+
+		rv = 0
+		latest = list()
+		for port, target, backend in configurations:
+			records = store.builds(port, target, backend, limit=max(args.count, args.window + 1))
+			regressions = find_regressions(records, window=args.window)
+			latest.append((records[-1], regressions))
+
+			shown = records[-args.count:]
+			print(f"{port or '-'}/{target} ({backend}):")
+			print(format_builds(shown), end="")
+			print(f"Median step times: {format_phases(shown) or '-'}")
+			if regressions:
+				print(f"Regressions against the previous {args.window} builds:")
+				print(format_regressions(regressions), end="")
+				rv = 1
+			print()
+
+		if args.openmetrics is not None:
+			write_openmetrics(args.openmetrics, os.path.basename(os.getcwd()), latest)
+			print(f"Metrics written in '{args.openmetrics}'")
+
+		return rv
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""
+Test command
+"""
+
+import os
+from ..core.cli import Command
+from ..core.utils import listPortNames
+from ..coverage import collect_coverage
+from ..coverage import format_coverage
+from ..coverage import remove_data
+from ..coverage import write_reports
+from ..makefile import MakefileBuildManager
+from ..testrunner import run_tests
+
+
+class TestCommand(Command):
+	"""
+	Builds and runs the unit tests
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Local or remote makefile
+		self.subparser.add_argument(
+			'-r', '--force_remote',
+			default=False,
+			action='store_true',
+			help="use the tools internal build system config files")
+
+		# Port name
+		self.subparser.add_argument(
+			'-p', '--port',
+			default="",
+			choices=listPortNames(),
+			type=str,
+			help="the port name.")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration.")
+
+		# Parallel jobs
+		self.subparser.add_argument(
+			'-j', '--jobs',
+			default=os.cpu_count() or 1,
+			type=int,
+			help="number of parallel build and gcov jobs (default: all CPUs).")
+
+		# Shards
+		self.subparser.add_argument(
+			'-s', '--shards',
+			default=1,
+			type=int,
+			help="splits the test groups in concurrent runner processes.")
+
+		# Coverage
+		self.subparser.add_argument(
+			'--coverage',
+			default=False,
+			action='store_true',
+			help="measures the line and branch coverage (lcov and Cobertura in tmp/<port>/<target>/coverage/).")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		build_manager = MakefileBuildManager(
+			port_name=args.port,
+			use_local_makefile=not args.force_remote,
+			target=args.target
+		)
+
+		variables = {"COVERAGE": "yes" if args.coverage else "no"}
+		found = build_manager.test_runner(variables)
+		if found is None:
+			self.error("The project has no unit tests (a 'tests' directory)")
+		testsmk_path, runner, outdir, runner_args = found
+
+		if args.coverage and os.path.isdir(outdir):
+			remove_data(outdir)
+		rv = build_manager.build_tests(testsmk_path, variables, jobs=args.jobs)
+		if rv != 0:
+			return rv
+
+		rv = run_tests(runner, shards=args.shards, args=runner_args)
+
+		if args.coverage:
+			coverage = collect_coverage(outdir, os.getcwd(), jobs=args.jobs)
+			print()
+			print(format_coverage(coverage), end="")
+			for path in write_reports(coverage, outdir, os.getcwd()):
+				print(f"Written '{path}'")
+
+		return rv
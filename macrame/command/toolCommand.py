@@ -5,7 +5,9 @@ Tool command
 """
 
 import argparse
+import shlex
 import toml
+from ..core import process
 from ..core.cli import Command
 from ..configuration.config import Tool
 
@@ -39,11 +41,14 @@ class ToolCommand(Command):
 
 			# print(parsed_toml)
 
-			for tool in parsed_toml['Tool']:
-				# print(tool)
-				t = Tool(tool)
-				rv = t.check()
-				print(t)
+			tools = [Tool(tool) for tool in parsed_toml['Tool']]
+
+			# The version commands run concurrently
+			results = process.run_all([shlex.split(tool.command) for tool in tools], capture=True, stderr=False)
+			for tool, result in zip(tools, results):
+				output = None if isinstance(result, Exception) else result.output
+				rv = tool.check(output)
+				print(tool)
 				print(f"Result: {rv}")
 				print("")
 
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+"""
+Version command
+"""
+
+from ..core.cli import Command
+from ..gitversion import generate_version_header
+
+
+class VersionCommand(Command):
+	"""
+	Generates the version header of the project from git
+	"""
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		if generate_version_header():
+			print("Version header updated")
+		else:
+			print("Version header is up to date")
+
+		return 0
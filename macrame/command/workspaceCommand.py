@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+Workspace command
+"""
+
+import os
+from ..core.cli import Command
+from ..workspace import MANIFEST_NAME
+from ..workspace import Workspace
+
+
+class WorkspaceCommand(Command):
+	"""
+	Runs a command on all the projects of a workspace
+	"""
+
+	def config(self):
+		"""
+		Configuration of arguments
+		"""
+
+		# Action
+		self.subparser.add_argument(
+			'action',
+			choices=["build", "clean", "todo", "tool"],
+			type=str,
+			help="what to do on every member project.")
+
+		# Manifest
+		self.subparser.add_argument(
+			'-f', '--file',
+			default=None,
+			type=str,
+			help=f"the workspace manifest (by default the '{MANIFEST_NAME}' of this or a parent directory).")
+
+		# Local or remote makefile
+		self.subparser.add_argument(
+			'-r', '--force_remote',
+			default=False,
+			action='store_true',
+			help="use the tools internal build system config files")
+
+		# Target
+		self.subparser.add_argument(
+			'-t', '--target',
+			default="dbg",
+			choices=["dbg", "rel"],
+			type=str,
+			help="the build configuration of the members that do not set one.")
+
+		# Parallel jobs
+		self.subparser.add_argument(
+			'-j', '--jobs',
+			default=None,
+			type=int,
+			help="the total number of parallel jobs (all CPUs by default).")
+
+		# Todo keywords
+		self.subparser.add_argument(
+			'-k', '--keywords',
+			default=['todo', 'bug', 'fix'],
+			choices=['todo', 'bug', 'fix'],
+			action='store',
+			type=str,
+			nargs='*',
+			help="keywords to search in the projects ('todo' action)")
+
+		# Whole words
+		self.subparser.add_argument(
+			'-w', '--whole_words',
+			action='store_true',
+			help="search only for whole words ('todo' action)")
+
+	def run(self, args):
+		"""
+		Runs the command
+		"""
+		if args.file is not None:
+			workspace = Workspace(args.file)
+		else:
+			workspace = Workspace.find(os.getcwd())
+
+		if args.action == "build":
+			rv = workspace.build(target=args.target, jobs=args.jobs, use_local_makefile=not args.force_remote)
+		elif args.action == "clean":
+			rv = workspace.clean(use_local_makefile=not args.force_remote)
+		elif args.action == "todo":
+			rv = workspace.todo(args.keywords, whole_words=args.whole_words)
+		else:
+			rv = workspace.tool()
+
+		return rv
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+Compilation database
+
+Writes the 'compile_commands.json' that clangd and clang-tidy read, from
+the compile jobs of a port and target (the makefile command templates,
+see MakefileBuildManager.jobs), so nothing is built:
+
+	[{"directory": "/path/to/project",
+	  "file": "src/main.c",
+	  "output": "tmp/posix/dbg/obj/src/main.o",
+	  "arguments": ["gcc", "-c", "src/main.c", "-o", "tmp/posix/dbg/obj/src/main.o", ...]}]
+
+The sources of the unit tests are included. The makefiles are only
+evaluated again when the layout (a source added or removed), a makefile
+or the toolchain changes, and the database is only rewritten when its
+content changes.
+"""
+
+import os
+import json
+import shlex
+import hashlib
+from .core.exceptions import UserInputError
+from .core.utils import AtomicWriter
+from .core.utils import read_json
+
+FILENAME = "compile_commands.json"
+
+# Compiler launchers that the tools must not take for the compiler
+LAUNCHERS = ("ccache", "sccache", "distcc")
+
+
+def compile_entries(jobs, directory):
+	"""
+	Composes the database entries of the compile jobs
+
+	A source compiled twice (by the program and by the unit tests) keeps
+	the entry of its first job, the one of the program.
+
+	param: jobs        The jobs (see MakefileBuildManager.jobs)
+	param: directory   The absolute project directory
+
+	Returns the list of entries
+	"""
+	rv = list()
+	sources = set()
+	for job in jobs:
+		if not job.is_compile or job.inputs[0] in sources:
+			continue
+		sources.add(job.inputs[0])
+		arguments = shlex.split(job.command)
+		while arguments and os.path.basename(arguments[0]) in LAUNCHERS:
+			arguments.pop(0)
+		rv.append({
+			"directory": directory,
+			"file": job.inputs[0],
+			"output": job.output,
+			"arguments": arguments,
+		})
+
+	return rv
+
+
+class CompileDatabase:
+	"""
+	The compilation database of a port and target
+	"""
+
+	def __init__(self, manager, path=FILENAME):
+		"""
+		param: manager   The MakefileBuildManager of the port and target
+		param: path      The database file (the project root by default, where clangd looks)
+		"""
+		self.manager = manager
+		self.path = path
+
+	@property
+	def cache_path(self):
+		"""
+		Where the fingerprint of the generation is kept, next to the database
+		when it is not the one of the project root
+		"""
+		if self.path != FILENAME:
+			return f"{self.path}.cache"
+		return os.path.join(self.manager.tmp_outdir, f"{FILENAME}.cache")
+
+	def _cache(self):
+		"""
+		The generation cache or an empty dictionary
+		"""
+		return read_json(self.cache_path)
+
+	def _digest(self):
+		"""
+		Hash of the database file or None if missing
+		"""
+		try:
+			with open(self.path, "rb") as f:
+				return hashlib.sha1(f.read()).hexdigest()
+		except OSError:
+			return None
+
+	def is_up_to_date(self, variables=None):
+		"""
+		True if the database is the one of the port and target and nothing it comes from changed
+		"""
+		cache = self._cache()
+		if not cache or cache.get("path") != os.path.abspath(self.path):
+			return False
+		if cache.get("digest") != self._digest():
+			# Written for another port or target, or edited
+			return False
+
+		return cache.get("fingerprint") == self.manager.fingerprint(cache.get("files", list()), variables)
+
+	def generate(self, variables=None, force=False):
+		"""
+		Writes the database when it is not up to date
+
+		param: variables   Dictionary of extra make variables
+		param: force       Write it even if it is up to date
+
+		Returns the number of entries or None if it was up to date
+		"""
+		if not force and self.is_up_to_date(variables):
+			return None
+
+		jobs = self.manager.jobs(variables)
+		if jobs is None:
+			raise UserInputError(
+				f"The makefile '{self.manager.makefile_path}' does not provide the command templates")
+
+		directory = os.path.abspath(self.manager.directory or os.getcwd())
+		entries = compile_entries(jobs, directory)
+		with AtomicWriter(self.path) as f:
+			json.dump(entries, f, indent=1)
+
+		files = set(["toolchain.toml"])
+		for job in jobs:
+			files.update(job.aux)
+		files = sorted(files)
+		with AtomicWriter(self.cache_path) as cache:
+			json.dump({
+				"fingerprint": self.manager.fingerprint(files, variables),
+				"files": files,
+				"path": os.path.abspath(self.path),
+				"digest": self._digest()}, cache)
+
+		return len(entries)
+
+	def entries(self, variables=None):
+		"""
+		The entries of the database, written first when it is not up to date
+
+		param: variables   Dictionary of extra make variables
+		"""
+		self.generate(variables)
+		with open(self.path, "r", encoding="utf-8") as f:
+			return json.load(f)
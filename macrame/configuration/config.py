@@ -41,15 +41,25 @@ class Tool(Config):
 	Configuration class for Tools
 	"""
 
-	def check(self):
+	@property
+	def command(self):
+		"""
+		The command that prints the version of the tool
+		"""
+		return self.name + " " + self.arg
+
+	def check(self, output=None):
 		"""
 		Checks a tools existance in the system
 		and its version
+
+		params output: The output of the version command or None to run it
 		"""
 
-		cmd = self.name + " " + self.arg
+		if output is None:
+			output = run_command2(self.command)
 
-		string_with_actual_version = str(run_command2(cmd))
+		string_with_actual_version = str(output)
 
 		string_with_actual_version = acquireCliProgramVersion(string_with_actual_version)
 
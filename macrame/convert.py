@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+"""
+Converts a linked ELF file to raw binary, Intel hex and symbol listings
+
+All outputs are produced from a single memory-mapped pass over the ELF file.
+An output is replaced only when its content changed, so that the steps
+depending on it (flashing, packaging) see a stable modification time.
+"""
+
+from .core.elf import ElfFile
+from .core.elf import PT_LOAD
+from .core.elf import SHF_ALLOC
+from .core.elf import SHF_WRITE
+from .core.elf import SHF_EXECINSTR
+from .core.elf import SHT_NOBITS
+from .core.elf import SHN_UNDEF
+from .core.elf import SHN_ABS
+from .core.elf import SHN_COMMON
+from .core.elf import SHN_LORESERVE
+from .core.elf import STT_OBJECT
+from .core.elf import STT_SECTION
+from .core.elf import STT_FILE
+from .core.elf import STB_LOCAL
+from .core.elf import STB_WEAK
+from .core.utils import AtomicWriter
+
+# Bytes per Intel hex data record (same as objcopy)
+IHEX_RECORD_SIZE = 16
+
+# Chunk size used when filling the gaps of the binary
+GAP_CHUNK_SIZE = 64 * 1024
+
+
+def loadable_sections(elf):
+	"""
+	Returns the (load address, section) pairs with contents, sorted by address
+
+	The load address (LMA) of a section is found through the loadable
+	segment that holds it. This way initialised data appear in flash
+	right after the code, like 'objcopy' does.
+
+	param: elf   The ElfFile
+	"""
+	rv = list()
+	for section in elf.sections:
+		if not section.flags & SHF_ALLOC or section.type == SHT_NOBITS or section.size == 0:
+			continue
+
+		lma = section.addr
+		for segment in elf.segments:
+			if segment.type != PT_LOAD:
+				continue
+			if segment.offset <= section.offset < segment.offset + segment.filesz:
+				lma = segment.paddr + section.offset - segment.offset
+				break
+
+		rv.append((lma, section))
+
+	rv.sort(key=lambda pair: pair[0])
+	return rv
+
+
+def write_binary(elf, f):
+	"""
+	Writes the raw memory image starting from the lowest load address
+
+	Gaps between sections are filled with zeros.
+
+	param: elf   The ElfFile
+	param: f     Binary file object to write to
+	"""
+	sections = loadable_sections(elf)
+	if not sections:
+		return
+
+	address = sections[0][0]
+	for lma, section in sections:
+		gap = lma - address
+		while gap > 0:
+			chunk = min(gap, GAP_CHUNK_SIZE)
+			f.write(bytes(chunk))
+			gap -= chunk
+
+		with elf.data(section.offset, section.size) as data:
+			f.write(data)
+		address = max(address, lma + section.size)
+
+
+def _ihex_record(record_type, address, data):
+	"""
+	Formats an Intel hex record
+	"""
+	raw = bytes([len(data), (address >> 8) & 0xff, address & 0xff, record_type]) + bytes(data)
+	checksum = (-sum(raw)) & 0xff
+	return ":" + raw.hex().upper() + f"{checksum:02X}\r\n"
+
+
+def write_ihex(elf, f):
+	"""
+	Writes the loadable contents in Intel hex format
+
+	Extended linear address records are emitted whenever the upper
+	16 bits of the address change.
+
+	param: elf   The ElfFile
+	param: f     Text file object to write to
+	"""
+	upper = 0
+	for lma, section in loadable_sections(elf):
+		with elf.data(section.offset, section.size) as data:
+			position = 0
+			while position < section.size:
+				address = lma + position
+				if address >> 16 != upper:
+					upper = address >> 16
+					f.write(_ihex_record(0x04, 0, upper.to_bytes(2, "big")))
+
+				# Records never cross a 64KiB boundary
+				size = min(IHEX_RECORD_SIZE, section.size - position, 0x10000 - (address & 0xffff))
+				f.write(_ihex_record(0x00, address & 0xffff, data[position:position + size]))
+				position += size
+
+	# Start address: segmented (CS:IP) when it fits in 20 bits, linear otherwise
+	if 0 < elf.entry <= 0xfffff:
+		start = bytes([(elf.entry & 0xf0000) >> 12, 0, (elf.entry >> 8) & 0xff, elf.entry & 0xff])
+		f.write(_ihex_record(0x03, 0, start))
+	elif elf.entry:
+		f.write(_ihex_record(0x05, 0, (elf.entry & 0xffffffff).to_bytes(4, "big")))
+	f.write(_ihex_record(0x01, 0, b""))
+
+
+def _symbol_letter(symbol, section):
+	"""
+	Returns the symbol type letter the way 'nm' shows it
+	"""
+	if symbol.shndx == SHN_UNDEF:
+		return "w" if symbol.bind == STB_WEAK else "U"
+	if symbol.shndx == SHN_ABS:
+		letter = "A"
+	elif symbol.shndx == SHN_COMMON:
+		return "C"
+	elif symbol.bind == STB_WEAK:
+		return "V" if symbol.type == STT_OBJECT else "W"
+	elif section is None or not section.flags & SHF_ALLOC:
+		letter = "N"
+	elif section.flags & SHF_EXECINSTR:
+		letter = "T"
+	elif section.type == SHT_NOBITS:
+		letter = "B"
+	elif section.flags & SHF_WRITE:
+		letter = "D"
+	else:
+		letter = "R"
+
+	if symbol.bind == STB_LOCAL:
+		letter = letter.lower()
+
+	return letter
+
+
+def write_symbols(elf, f):
+	"""
+	Writes the symbol table sorted by address like 'nm -n' does
+
+	param: elf   The ElfFile
+	param: f     Text file object to write to
+	"""
+	width = elf.elf_class // 4
+	symbols = list()
+	for symbol in elf.symbols():
+		if symbol.type in (STT_SECTION, STT_FILE) or symbol.name == "":
+			continue
+		# ARM/AArch64 mapping symbols are hidden by nm too
+		if symbol.name[0] == "$" and symbol.name[1:2] in ("a", "d", "t", "x"):
+			continue
+		symbols.append(symbol)
+
+	symbols.sort(key=lambda s: (s.shndx != SHN_UNDEF, s.value, s.name))
+	for symbol in symbols:
+		section = None
+		if symbol.shndx < SHN_LORESERVE and symbol.shndx < len(elf.sections):
+			section = elf.sections[symbol.shndx]
+		letter = _symbol_letter(symbol, section)
+		if letter in ("U", "w"):
+			f.write(f"{'':{width}} {letter} {symbol.name}\n")
+		else:
+			f.write(f"{symbol.value:0{width}x} {letter} {symbol.name}\n")
+
+
+def convert(elf_path, bin_path=None, hex_path=None, sym_path=None):
+	"""
+	Produces the requested outputs of an ELF file in one pass
+
+	param: elf_path   The linked ELF file
+	param: bin_path   Output raw binary file or None
+	param: hex_path   Output Intel hex file or None
+	param: sym_path   Output symbol listing or None
+
+	Returns the list of outputs that were actually rewritten
+	"""
+	rv = list()
+	with ElfFile(elf_path) as elf:
+		outputs = [
+			(bin_path, "wb", write_binary),
+			(hex_path, "w", write_ihex),
+			(sym_path, "w", write_symbols),
+		]
+		for path, mode, writer in outputs:
+			if path is None:
+				continue
+			with AtomicWriter(path, mode) as f:
+				writer(elf, f)
+			if f.changed:
+				rv.append(path)
+
+	return rv
@@ -4,11 +4,6 @@ from .exceptions import UserInputError
 import argparse
 # import shtab
 import os
-import sys
-
-_commandList = []
-_parser = None
-_subparser = None
 
 
 class Parser(object):
@@ -16,6 +11,9 @@ class Parser(object):
 	"""
 	Supports the creation of commandline argument subcommands
 	with support from argparse.
+
+	Every parser keeps its own commands, so parsers can be created and
+	used more than once in a process (e.g. by tests).
 	"""
 
 	def __init__(self, name, description, epilog):
@@ -27,32 +25,32 @@ class Parser(object):
 		epilog: Text at the end of the help section
 		"""
 
-		global _parser
-		if _parser is not None:
-			raise Exception("Could not init parser")
-		_parser = argparse.ArgumentParser(
+		self.parser = argparse.ArgumentParser(
 			prog=name,
 			description=description,
 			epilog=epilog,
 			fromfile_prefix_chars='@')
 
-		# shtab.add_argument_to(_parser, ["-s", "--print-completion"])
+		# shtab.add_argument_to(self.parser, ["-s", "--print-completion"])
 
-		global _subparser
-		_subparser = _parser.add_subparsers(dest='cmd', description="")
-
-		self.parser = _parser
+		self.subparsers = self.parser.add_subparsers(dest='cmd', description="")
+		self.commands = list()
 		self.config()
-		_parser = self.parser
+
+	def add_command(self, command):
+		"""
+		Registers a command and returns the parser of its arguments
+
+		command: The Command
+		"""
+		self.commands.append(command)
+		return self.subparsers.add_parser(command.name, help=command.help)
 
 	def error(self, message):
 		"""
-		Print error message and exit
+		Raises a user error, reported by handle()
 		"""
-		# TODO: Is it good to quit from argparse like this?
-		# _parser.error("\033[0;31m" + str(message) + "\033[0m")
-		print("\033[0;31m[ERROR]\t" + str(message) + "\033[0m")
-		sys.exit(1)
+		raise UserInputError(message)
 
 	def config(self):
 		"""
@@ -67,29 +65,39 @@ class Parser(object):
 		"""
 		pass
 
-	def handle(self):
-		args = _parser.parse_args()
-		subcommand = _parser.parse_args().cmd
+	def handle(self, argv=None):
+		"""
+		Parses the arguments and runs the selected command
 
-		self.parser = _parser
-		self.run(args)
-		# _parser = self.parser
+		argv: The arguments or None for the ones of the process
+
+		Returns the exit code
+		"""
+		args = self.parser.parse_args(argv)
 
 		rv = 0
-		global _commandList
-		for command in _commandList:
-			cmd_name = command['name']
-			cmd_callback = command['callback']
-			if cmd_name == subcommand:
-				try:
-					rv = cmd_callback(args)
-				except UserInputError as e:
-					self.error(e)
+		try:
+			early_rv = self.run(args)
+			if early_rv is not None:
+				return early_rv
+
+			for command in self.commands:
+				if command.name == args.cmd:
+					command.args = args
+					rv = command.run(args)
+		except UserInputError as e:
+			print("\033[0;31m[ERROR]\t" + str(e) + "\033[0m")
+			rv = 1
 
 		return rv
 
 	def run(self, args):
-		pass
+		"""
+		Handles the arguments of the program itself
+
+		Returns an exit code to stop or None to run the command
+		"""
+		return None
 
 
 class Command(object):
@@ -98,42 +106,28 @@ class Command(object):
 	with support from argparse.
 	"""
 
-	def __init__(self, name, help=None):
+	def __init__(self, parser, name, help=None):
 		"""
 		Creates an argument command
 
+		parser: The Parser of the program
 		name: The name of the command
 		help: Description of the command or None
 		"""
 		self.name = name
-		global _parser
-		if _parser is None:
-			raise Exception(f"Could not append command '{self.name}' to the parser")
-
-		global _subparser
-		self.subparser = _subparser.add_parser(
-			self.name,
-			help=help)
-
-		d = dict()
-		d['name'] = self.name
-		d['callback'] = self.run
-
-		global _commandList
-		_commandList.append(d)
+		self.help = help
+		self.args = None
+		self.subparser = parser.add_command(self)
 
 		self.config()
 
 	def error(self, message):
 		"""
-		Print error message and exit
+		Raises a user error, reported by the parser
 
 		message: The error message
 		"""
-		# TODO: Is it good to quit from argparse like this?
-		# _parser.error("\033[0;31m" + str(message) + "\033[0m")
-		print("\033[0;31m[ERROR]\t" + str(message) + "\033[0m")
-		sys.exit(1)
+		raise UserInputError(message)
 
 	def config(self):
 		"""
@@ -158,41 +152,23 @@ class Command(object):
 	def check_directory(self, directoryPath):
 		"""
 		Check if this is a valid directory
-		else exit with a message.
+		else raise a user error.
 
 		directoryPath: The directory path to check for validity
 		"""
 		if not os.path.isdir(directoryPath):
 			self.error(f"The directory {directoryPath} does not exist")
 
-	def addArgument(self, name):
-		"""
-		Gets the value of an argument
-
-		name: The argument name
-		"""
-
-		args = vars(_parser.parse_args())
-		rv = None
-		try:
-			rv = args[name]
-		except KeyError:
-			self.error(f"Argument '{name}' does not exist")
-
-		return rv
-
 	def getArgument(self, name):
 		"""
-		Gets the value of an argument
+		Gets the value of an argument of the running command
 
 		name: The argument name
 		"""
-
-		args = vars(_parser.parse_args())
 		rv = None
 		try:
-			rv = args[name]
-		except KeyError:
+			rv = vars(self.args)[name]
+		except (KeyError, TypeError):
 			self.error(f"Argument '{name}' does not exist")
 
 		return rv
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+"""
+Minimal reader for ELF object files
+
+Only the parts needed by macrame are parsed: the file header, the section
+and program header tables and the symbol tables. The file is memory-mapped
+so that large firmware images are never copied into memory as a whole.
+"""
+
+import mmap
+import struct
+from collections import namedtuple
+from .exceptions import UserInputError
+
+# Section types
+SHT_NULL = 0
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_NOBITS = 8
+SHT_DYNSYM = 11
+
+# Section flags
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+# Special section indexes
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_ABS = 0xfff1
+SHN_COMMON = 0xfff2
+
+# Segment types
+PT_LOAD = 1
+
+# Symbol types
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_SECTION = 3
+STT_FILE = 4
+
+# Symbol bindings
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STB_WEAK = 2
+
+Section = namedtuple("Section", "index name type flags addr offset size link info entsize")
+Segment = namedtuple("Segment", "type flags offset vaddr paddr filesz memsz")
+Symbol = namedtuple("Symbol", "name value size type bind shndx section")
+
+
+class ElfFile:
+	"""
+	A memory-mapped ELF file
+
+	Use it as a context manager so that the mapping is released:
+
+		with ElfFile("bin/posix/dbg/project.elf") as elf:
+			for symbol in elf.symbols():
+				print(symbol.name, symbol.size)
+	"""
+
+	def __init__(self, path):
+		"""
+		Opens and parses the headers of an ELF file
+
+		param: path   The path of the ELF file
+		"""
+		self.path = path
+		self._map = None
+		self._file = open(path, "rb")
+		try:
+			self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			self._file.close()
+			raise UserInputError(f"'{path}' is an empty file")
+
+		try:
+			self._parse_header()
+			self.sections = self._parse_sections()
+			self.segments = self._parse_segments()
+		except UserInputError:
+			self.close()
+			raise
+		except (struct.error, IndexError):
+			self.close()
+			raise UserInputError(f"'{path}' is not a valid ELF file")
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""
+		Releases the memory map and the file
+		"""
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+		self._file.close()
+
+	def data(self, offset, size):
+		"""
+		Returns a read only view of the file contents
+
+		param: offset   Offset from the start of the file
+		param: size     Number of bytes
+		"""
+		return memoryview(self._map)[offset:offset + size]
+
+	def section(self, name):
+		"""
+		Returns the section with the given name or None
+		"""
+		for section in self.sections:
+			if section.name == name:
+				return section
+		return None
+
+	def symbols(self):
+		"""
+		Yields the symbols of the symbol table
+
+		The static symbol table is preferred. The dynamic one is used
+		for stripped files.
+		"""
+		tables = [s for s in self.sections if s.type == SHT_SYMTAB]
+		if not tables:
+			tables = [s for s in self.sections if s.type == SHT_DYNSYM]
+
+		for table in tables:
+			strtab = self.sections[table.link]
+			entsize = table.entsize or struct.calcsize(self._sym_fmt)
+			for i in range(1, table.size // entsize):
+				fields = struct.unpack_from(self._sym_fmt, self._map, table.offset + i * entsize)
+				if self.elf_class == 32:
+					st_name, value, size, info, _, shndx = fields
+				else:
+					st_name, info, _, shndx, value, size = fields
+				if shndx < len(self.sections) and shndx < SHN_LORESERVE:
+					section = self.sections[shndx].name
+				else:
+					section = None
+				yield Symbol(
+					self._string(strtab, st_name), value, size,
+					info & 0xf, info >> 4, shndx, section)
+
+	def _string(self, strtab, index):
+		"""
+		Reads a null terminated string from a string table
+		"""
+		start = strtab.offset + index
+		end = self._map.find(b"\0", start, strtab.offset + strtab.size)
+		if end < 0:
+			end = strtab.offset + strtab.size
+		return self._map[start:end].decode("utf-8", errors="replace")
+
+	def _parse_header(self):
+		"""
+		Parses the ELF file header
+		"""
+		ident = self._map[:16]
+		if ident[:4] != b"\x7fELF":
+			raise UserInputError(f"'{self.path}' is not an ELF file")
+
+		if ident[4] == 1:
+			self.elf_class = 32
+		elif ident[4] == 2:
+			self.elf_class = 64
+		else:
+			raise UserInputError(f"'{self.path}' has an unknown ELF class")
+
+		self.endian = "<" if ident[5] == 1 else ">"
+		if self.elf_class == 32:
+			header_fmt = self.endian + "HHIIIIIHHHHHH"
+			self._sym_fmt = self.endian + "IIIBBH"
+			self._shdr_fmt = self.endian + "IIIIIIIIII"
+			self._phdr_fmt = self.endian + "IIIIIIII"
+		else:
+			header_fmt = self.endian + "HHIQQQIHHHHHH"
+			self._sym_fmt = self.endian + "IBBHQQ"
+			self._shdr_fmt = self.endian + "IIQQQQIIQQ"
+			self._phdr_fmt = self.endian + "IIQQQQQQ"
+
+		(self.type, self.machine, _, self.entry, self._phoff, self._shoff, _, _,
+		 self._phentsize, self._phnum, self._shentsize, self._shnum,
+		 self._shstrndx) = struct.unpack_from(header_fmt, self._map, 16)
+
+	def _parse_sections(self):
+		"""
+		Parses the section header table
+		"""
+		raw = list()
+		for i in range(self._shnum):
+			raw.append(struct.unpack_from(self._shdr_fmt, self._map, self._shoff + i * self._shentsize))
+
+		sections = list()
+		names = raw[self._shstrndx] if self._shnum else None
+		for i, (st_name, sh_type, flags, addr, offset, size, link, info, _, entsize) in enumerate(raw):
+			name = ""
+			if names is not None:
+				start = names[4] + st_name
+				end = self._map.find(b"\0", start)
+				name = self._map[start:end].decode("utf-8", errors="replace")
+			sections.append(Section(i, name, sh_type, flags, addr, offset, size, link, info, entsize))
+
+		return sections
+
+	def _parse_segments(self):
+		"""
+		Parses the program header table
+		"""
+		segments = list()
+		for i in range(self._phnum):
+			fields = struct.unpack_from(self._phdr_fmt, self._map, self._phoff + i * self._phentsize)
+			if self.elf_class == 32:
+				p_type, offset, vaddr, paddr, filesz, memsz, flags, _ = fields
+			else:
+				p_type, flags, offset, vaddr, paddr, filesz, memsz, _ = fields
+			segments.append(Segment(p_type, flags, offset, vaddr, paddr, filesz, memsz))
+
+		return segments
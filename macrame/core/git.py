@@ -0,0 +1,647 @@
+#!/usr/bin/env python
+
+"""
+Minimal in-process reader of git repositories
+
+It reads references, loose and packed objects, commits and the index
+straight from the '.git' directory, so that simple queries do not need
+to fork git processes.
+"""
+
+import os
+import mmap
+import glob
+import heapq
+import zlib
+import struct
+from collections import namedtuple
+
+Commit = namedtuple("Commit", "sha parents time timezone subject")
+IndexEntry = namedtuple("IndexEntry", "path size mtime_ns sha")
+
+# Pack object types
+_OBJ_COMMIT = 1
+_OBJ_TREE = 2
+_OBJ_BLOB = 3
+_OBJ_TAG = 4
+_OBJ_OFS_DELTA = 6
+_OBJ_REF_DELTA = 7
+
+_TYPE_NAMES = {
+	_OBJ_COMMIT: "commit",
+	_OBJ_TREE: "tree",
+	_OBJ_BLOB: "blob",
+	_OBJ_TAG: "tag",
+}
+
+
+class GitError(Exception):
+	"""
+	The repository can not be read in-process
+	"""
+
+
+def find_git_dir(path="."):
+	"""
+	Finds the git directory of the repository that holds a path
+
+	Returns None if the path is not inside a repository
+	"""
+	path = os.path.abspath(path)
+	while True:
+		candidate = os.path.join(path, ".git")
+		if os.path.isdir(candidate):
+			return candidate
+		if os.path.isfile(candidate):
+			# Worktrees and submodules: 'gitdir: <path>'
+			with open(candidate, "r", encoding="utf-8") as f:
+				content = f.read().strip()
+			if content.startswith("gitdir:"):
+				return os.path.normpath(os.path.join(path, content[len("gitdir:"):].strip()))
+		parent = os.path.dirname(path)
+		if parent == path:
+			return None
+		path = parent
+
+
+def _map(path):
+	"""
+	Maps a file read only. The mapping stays valid once the file is closed.
+	"""
+	with open(path, "rb") as f:
+		return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _Pack:
+	"""
+	A pack file and its version 2 index
+	"""
+
+	def __init__(self, idx_path):
+		self._idx = _map(idx_path)
+		self.data = None
+		try:
+			if self._idx[:4] != b"\377tOc" or struct.unpack_from(">I", self._idx, 4)[0] != 2:
+				raise GitError(f"Unsupported pack index '{idx_path}'")
+			self._fanout = struct.unpack_from(">256I", self._idx, 8)
+			self.count = self._fanout[255]
+			self._names = 8 + 256 * 4
+			self._offsets = self._names + self.count * 24
+			self._large_offsets = self._offsets + self.count * 4
+
+			self.data = _map(idx_path[:-4] + ".pack")
+		except BaseException:
+			self.close()
+			raise
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""
+		Unmaps the index and the pack
+		"""
+		for mapping in (self._idx, self.data):
+			if mapping is not None:
+				mapping.close()
+
+	def _name(self, index):
+		"""
+		The name of the object at an index
+		"""
+		start = self._names + index * 20
+		return self._idx[start:start + 20]
+
+	def names(self, prefix):
+		"""
+		Returns the names of the objects that start with a hexadecimal prefix
+		"""
+		key = bytes.fromhex(prefix.ljust(40, "0"))
+		lo = self._fanout[key[0] - 1] if key[0] else 0
+		hi = self._fanout[key[0]]
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self._name(mid) < key:
+				lo = mid + 1
+			else:
+				hi = mid
+
+		rv = list()
+		for index in range(lo, self.count):
+			name = self._name(index).hex()
+			if not name.startswith(prefix):
+				break
+			rv.append(name)
+
+		return rv
+
+	def find(self, sha):
+		"""
+		Returns the offset of an object in the pack or None
+		"""
+		key = bytes.fromhex(sha)
+		lo = self._fanout[key[0] - 1] if key[0] else 0
+		hi = self._fanout[key[0]]
+		while lo < hi:
+			mid = (lo + hi) // 2
+			name = self._name(mid)
+			if name < key:
+				lo = mid + 1
+			elif name > key:
+				hi = mid
+			else:
+				offset = struct.unpack_from(">I", self._idx, self._offsets + mid * 4)[0]
+				if offset & 0x80000000:
+					index = offset & 0x7fffffff
+					offset = struct.unpack_from(">Q", self._idx, self._large_offsets + index * 8)[0]
+				return offset
+		return None
+
+
+def _apply_delta(base, delta):
+	"""
+	Applies a git delta on a base object
+	"""
+	def varint(position):
+		value = 0
+		shift = 0
+		while True:
+			byte = delta[position]
+			position += 1
+			value |= (byte & 0x7f) << shift
+			shift += 7
+			if not byte & 0x80:
+				return value, position
+
+	_, position = varint(0)
+	size, position = varint(position)
+	out = bytearray()
+	while position < len(delta):
+		opcode = delta[position]
+		position += 1
+		if opcode & 0x80:
+			offset = 0
+			length = 0
+			for i in range(4):
+				if opcode & (1 << i):
+					offset |= delta[position] << (8 * i)
+					position += 1
+			for i in range(3):
+				if opcode & (0x10 << i):
+					length |= delta[position] << (8 * i)
+					position += 1
+			if length == 0:
+				length = 0x10000
+			out += base[offset:offset + length]
+		elif opcode:
+			out += delta[position:position + opcode]
+			position += opcode
+		else:
+			raise GitError("Invalid delta opcode")
+
+	if len(out) != size:
+		raise GitError("Invalid delta size")
+
+	return bytes(out)
+
+
+class GitRepository:
+	"""
+	Read only access to a git repository
+	"""
+
+	def __init__(self, path="."):
+		"""
+		param: path   A path inside the repository
+		"""
+		self.git_dir = find_git_dir(path)
+		if self.git_dir is None:
+			raise GitError(f"'{os.path.abspath(path)}' is not in a git repository")
+
+		# Linked worktrees keep the objects and the refs in a common directory
+		self.common_dir = self.git_dir
+		commondir_path = os.path.join(self.git_dir, "commondir")
+		if os.path.isfile(commondir_path):
+			with open(commondir_path, "r", encoding="utf-8") as f:
+				self.common_dir = os.path.normpath(os.path.join(self.git_dir, f.read().strip()))
+
+		self.work_tree = os.path.dirname(self.git_dir)
+		self._packs = None
+		self._packed_refs = None
+		self._commits = dict()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""
+		Closes the pack files. They are opened again when needed.
+		"""
+		for pack in self._packs or list():
+			pack.close()
+		self._packs = None
+
+	# --------------------------------------------------------------------
+	# References
+
+	def head(self):
+		"""
+		Returns a tuple (ref name or None when detached, commit sha or None)
+		"""
+		with open(os.path.join(self.git_dir, "HEAD"), "r", encoding="utf-8") as f:
+			content = f.read().strip()
+		if content.startswith("ref:"):
+			ref = content[4:].strip()
+			return ref, self.resolve(ref)
+		return None, content
+
+	def resolve(self, ref):
+		"""
+		Resolves a full reference name (e.g. 'refs/heads/master') to a sha
+
+		Returns None if the reference does not exist
+		"""
+		for _ in range(10):
+			for directory in (self.git_dir, self.common_dir):
+				path = os.path.join(directory, ref)
+				if os.path.isfile(path):
+					with open(path, "r", encoding="utf-8") as f:
+						content = f.read().strip()
+					break
+			else:
+				return self.packed_refs().get(ref, (None, None))[0]
+
+			if not content.startswith("ref:"):
+				return content
+			ref = content[4:].strip()
+
+		raise GitError(f"Too deep symbolic reference '{ref}'")
+
+	def packed_refs(self):
+		"""
+		Returns the packed references {name: (sha, peeled sha or None)}
+		"""
+		if self._packed_refs is None:
+			self._packed_refs = dict()
+			path = os.path.join(self.common_dir, "packed-refs")
+			if os.path.isfile(path):
+				last = None
+				with open(path, "r", encoding="utf-8") as f:
+					for line in f:
+						line = line.strip()
+						if not line or line.startswith("#"):
+							continue
+						if line.startswith("^") and last is not None:
+							self._packed_refs[last] = (self._packed_refs[last][0], line[1:])
+							continue
+						sha, _, name = line.partition(" ")
+						self._packed_refs[name] = (sha, None)
+						last = name
+
+		return self._packed_refs
+
+	def refs(self, prefix):
+		"""
+		Returns the references under a prefix (e.g. 'refs/tags/') {name: sha}
+		"""
+		rv = {name: sha for name, (sha, _) in self.packed_refs().items() if name.startswith(prefix)}
+		root = os.path.join(self.common_dir, prefix)
+		for parent_path, _, filenames in os.walk(root):
+			for filename in filenames:
+				path = os.path.join(parent_path, filename)
+				name = os.path.relpath(path, self.common_dir).replace(os.sep, "/")
+				with open(path, "r", encoding="utf-8") as f:
+					rv[name] = f.read().strip()
+
+		return rv
+
+	def tags(self):
+		"""
+		Returns the tags peeled to commits {commit sha: [tag names]}
+		"""
+		rv = dict()
+		packed = self.packed_refs()
+		for name, sha in self.refs("refs/tags/").items():
+			peeled = packed.get(name, (None, None))[1]
+			if peeled is None:
+				peeled = self.peel(sha)
+			if peeled is not None:
+				rv.setdefault(peeled, list()).append(name[len("refs/tags/"):])
+
+		return rv
+
+	def peel(self, sha):
+		"""
+		Follows annotated tags until a commit is reached
+		"""
+		for _ in range(10):
+			try:
+				object_type, data = self.read_object(sha)
+			except KeyError:
+				return None
+			if object_type != "tag":
+				return sha if object_type == "commit" else None
+			sha = data.split(b"\n", 1)[0].split(b" ")[1].decode("ascii")
+
+		return None
+
+	# --------------------------------------------------------------------
+	# Objects
+
+	def read_object(self, sha):
+		"""
+		Reads an object
+
+		Returns a tuple (type name, content bytes). Raises KeyError if the
+		object does not exist.
+		"""
+		path = os.path.join(self.common_dir, "objects", sha[:2], sha[2:])
+		if os.path.isfile(path):
+			with open(path, "rb") as f:
+				raw = zlib.decompress(f.read())
+			header, _, content = raw.partition(b"\0")
+			return header.split(b" ")[0].decode("ascii"), content
+
+		for pack in self._get_packs():
+			offset = pack.find(sha)
+			if offset is not None:
+				object_type, content = self._read_packed(pack, offset)
+				return _TYPE_NAMES[object_type], content
+
+		raise KeyError(sha)
+
+	def _get_packs(self):
+		"""
+		Opens the pack files on first use
+		"""
+		if self._packs is None:
+			self._packs = list()
+			for idx_path in sorted(glob.glob(os.path.join(self.common_dir, "objects", "pack", "*.idx"))):
+				try:
+					self._packs.append(_Pack(idx_path))
+				except BaseException:
+					self.close()
+					raise
+		return self._packs
+
+	def abbreviate(self, sha, length=None):
+		"""
+		The shortest unique prefix of an object name, like 'git rev-parse --short'
+
+		param: sha      The full object name
+		param: length   The minimum length or None for the default of git, from
+		                the number of packed objects (at least 7)
+		"""
+		packs = self._get_packs()
+		if length is None:
+			count = sum(pack.count for pack in packs)
+			length = max(7, (count.bit_length() + 1) // 2)
+
+		prefix = sha[:length]
+		others = set()
+		directory = os.path.join(self.common_dir, "objects", prefix[:2])
+		if os.path.isdir(directory):
+			others.update(prefix[:2] + name for name in os.listdir(directory) if name.startswith(prefix[2:]))
+		for pack in packs:
+			others.update(pack.names(prefix))
+		others.discard(sha)
+
+		for other in others:
+			length = max(length, len(os.path.commonprefix([sha, other])) + 1)
+
+		return sha[:length]
+
+	def _read_packed(self, pack, offset):
+		"""
+		Reads an object from a pack, resolving deltas
+		"""
+		data = pack.data
+		byte = data[offset]
+		position = offset + 1
+		object_type = (byte >> 4) & 7
+		size = byte & 0x0f
+		shift = 4
+		while byte & 0x80:
+			byte = data[position]
+			position += 1
+			size |= (byte & 0x7f) << shift
+			shift += 7
+
+		base = None
+		if object_type == _OBJ_OFS_DELTA:
+			byte = data[position]
+			position += 1
+			distance = byte & 0x7f
+			while byte & 0x80:
+				byte = data[position]
+				position += 1
+				distance = ((distance + 1) << 7) | (byte & 0x7f)
+			base = self._read_packed(pack, offset - distance)
+		elif object_type == _OBJ_REF_DELTA:
+			base_sha = data[position:position + 20].hex()
+			position += 20
+			base_type, base_content = self.read_object(base_sha)
+			base = ({v: k for k, v in _TYPE_NAMES.items()}[base_type], base_content)
+
+		decompressor = zlib.decompressobj()
+		content = b""
+		chunk = max(size * 2, 4096)
+		while not decompressor.eof:
+			if position >= len(data):
+				raise GitError("Truncated pack object")
+			content += decompressor.decompress(data[position:position + chunk])
+			position += chunk
+
+		if base is not None:
+			return base[0], _apply_delta(base[1], content)
+
+		return object_type, content
+
+	# --------------------------------------------------------------------
+	# Commits
+
+	def commit(self, sha):
+		"""
+		Reads and parses a commit
+		"""
+		if sha in self._commits:
+			return self._commits[sha]
+
+		object_type, data = self.read_object(sha)
+		if object_type != "commit":
+			raise GitError(f"'{sha}' is not a commit")
+
+		headers, _, message = data.partition(b"\n\n")
+		parents = list()
+		time = 0
+		timezone = "+0000"
+		for line in headers.split(b"\n"):
+			if line.startswith(b"parent "):
+				parents.append(line[7:].decode("ascii"))
+			elif line.startswith(b"committer "):
+				fields = line.rsplit(b" ", 2)
+				time = int(fields[1])
+				timezone = fields[2].decode("ascii")
+
+		subject = message.split(b"\n\n", 1)[0].replace(b"\n", b" ").strip()
+		commit = Commit(sha, parents, time, timezone, subject.decode("utf-8", errors="replace"))
+		self._commits[sha] = commit
+		return commit
+
+	def ancestors(self, sha):
+		"""
+		Returns the set of commits reachable from a commit (itself included)
+
+		Missing parents (shallow clones) end the walk.
+		"""
+		rv = set()
+		pending = [sha]
+		while pending:
+			current = pending.pop()
+			if current in rv:
+				continue
+			try:
+				commit = self.commit(current)
+			except KeyError:
+				continue
+			rv.add(current)
+			pending.extend(p for p in commit.parents if p not in rv)
+
+		return rv
+
+	def _walk_push(self, queue, flags, sha, parent_flags):
+		"""
+		Queues a commit of the walk of describe, newest first, with the
+		candidate tags that reach it
+		"""
+		if sha not in flags:
+			try:
+				commit = self.commit(sha)
+			except KeyError:
+				# Missing in a shallow clone
+				return
+			flags[sha] = 0
+			heapq.heappush(queue, (-commit.time, len(flags), sha))
+		flags[sha] |= parent_flags
+
+	def describe(self, sha, max_candidates=10):
+		"""
+		Finds the nearest tag like 'git describe --tags'
+
+		Like git, the commits are walked by date and every commit carries a bit
+		per candidate tag that reaches it. The depth of a candidate is the
+		number of walked commits that it does not reach. The walk stops when
+		all the tags are found or a tag is found past max_candidates, and
+		then only the depth of the best candidate is completed.
+
+		Returns a tuple (tag name, number of commits since the tag) or None
+		"""
+		tags = self.tags()
+		if not tags:
+			return None
+
+		queue = list()
+		flags = dict()
+		self._walk_push(queue, flags, sha, 0)
+
+		# [commit sha, depth, flag]
+		candidates = list()
+		walked = 0
+		while queue:
+			entry = heapq.heappop(queue)
+			current = entry[2]
+			if current in tags:
+				if len(candidates) == max_candidates:
+					heapq.heappush(queue, entry)
+					break
+				flag = 1 << len(candidates)
+				candidates.append([current, walked, flag])
+				flags[current] |= flag
+			walked += 1
+			for candidate in candidates:
+				if not flags[current] & candidate[2]:
+					candidate[1] += 1
+			for parent in self.commit(current).parents:
+				self._walk_push(queue, flags, parent, flags[current])
+			if len(candidates) == len(tags):
+				break
+
+		if not candidates:
+			return None
+
+		# Ties go to the candidate found first
+		best = min(candidates, key=lambda candidate: candidate[1])
+		flag = best[2]
+		while queue:
+			current = heapq.heappop(queue)[2]
+			if flags[current] & flag:
+				# Nothing that remains is out of the reach of the tag
+				if all(flags[entry[2]] & flag for entry in queue):
+					break
+			else:
+				best[1] += 1
+			for parent in self.commit(current).parents:
+				self._walk_push(queue, flags, parent, flags[current])
+
+		return sorted(tags[best[0]])[-1], best[1]
+
+	# --------------------------------------------------------------------
+	# Index
+
+	def index(self):
+		"""
+		Reads the entries of the index (versions 2 to 4)
+		"""
+		path = os.path.join(self.git_dir, "index")
+		if not os.path.isfile(path):
+			return list()
+
+		with open(path, "rb") as f:
+			data = f.read()
+
+		signature, version, count = struct.unpack_from(">4sII", data, 0)
+		if signature != b"DIRC" or version not in (2, 3, 4):
+			raise GitError(f"Unsupported index version {version}")
+
+		rv = list()
+		position = 12
+		previous = b""
+		for _ in range(count):
+			start = position
+			fields = struct.unpack_from(">IIIIIIIIII20sH", data, position)
+			mtime_ns = fields[2] * 1000000000 + fields[3]
+			size = fields[9]
+			sha = fields[10].hex()
+			flags = fields[11]
+			position += 62
+			if flags & 0x4000:
+				position += 2
+
+			if version == 4:
+				# Offset encoding of the prefix to remove from the previous path
+				byte = data[position]
+				position += 1
+				strip = byte & 0x7f
+				while byte & 0x80:
+					byte = data[position]
+					position += 1
+					strip = ((strip + 1) << 7) | (byte & 0x7f)
+				end = data.index(b"\0", position)
+				name = previous[:len(previous) - strip] + data[position:end]
+				position = end + 1
+			else:
+				end = data.index(b"\0", position)
+				name = data[position:end]
+				# Entries are padded to a multiple of 8 bytes
+				position = start + ((end - start + 8) // 8) * 8
+
+			previous = name
+			rv.append(IndexEntry(name.decode("utf-8", errors="surrogateescape"), size, mtime_ns, sha))
+
+		return rv
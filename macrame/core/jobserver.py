@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+"""
+GNU Make jobserver
+
+A jobserver is a pipe (or a named fifo) holding one byte per job slot.
+Every process of the tree owns one implicit slot and reads a byte
+(token) for every extra job it runs, writing it back when the job ends.
+So nested builds share one global limit of parallel jobs.
+
+macrame joins the jobserver it inherits through MAKEFLAGS or creates one
+for the make processes that it starts.
+"""
+
+import os
+import re
+import select
+
+_AUTH_REGEX = re.compile(r"--jobserver-(?:auth|fds)=(\S+)")
+
+
+def parse_makeflags(makeflags):
+	"""
+	Finds the jobserver of MAKEFLAGS
+
+	param: makeflags   The MAKEFLAGS value
+
+	Returns ('fifo', path), ('pipe', (read fd, write fd)) or None
+	"""
+	matches = _AUTH_REGEX.findall(makeflags or "")
+	if not matches:
+		return None
+
+	# The last one is the one of the closest make
+	auth = matches[-1]
+	if auth.startswith("fifo:"):
+		return "fifo", auth[len("fifo:"):]
+
+	fields = auth.split(",")
+	if len(fields) == 2 and all(f.lstrip("-").isdigit() for f in fields):
+		read_fd, write_fd = int(fields[0]), int(fields[1])
+		if read_fd >= 0 and write_fd >= 0:
+			return "pipe", (read_fd, write_fd)
+
+	return None
+
+
+def _open_reader(fd):
+	"""
+	Opens a non blocking reader of a pipe with a file description of its own
+
+	Changing the inherited description to non blocking would affect the
+	other readers of the pipe (make versions before 4.3 read blocking).
+
+	Returns a tuple (descriptor, True) or (fd, False) if not possible
+	"""
+	try:
+		return os.open(f"/proc/self/fd/{fd}", os.O_RDONLY | os.O_NONBLOCK), True
+	except OSError:
+		return fd, False
+
+
+class Jobserver:
+	"""
+	Tokens of a jobserver
+	"""
+
+	def __init__(self, read_fd, write_fd, auth, shared_read=False, close_fds=(), pass_fds=(), jobs=None):
+		"""
+		Use Jobserver.inherit() or Jobserver.create()
+
+		param: read_fd       Descriptor to read tokens from
+		param: write_fd      Descriptor to give the tokens back
+		param: auth          The '--jobserver-auth' value for the children
+		param: shared_read   True if read_fd is blocking and shared with other readers
+		param: close_fds     Descriptors closed by close()
+		param: pass_fds      Descriptors that the child processes must inherit
+		param: jobs          The total number of jobs if this is the server
+		"""
+		self.read_fd = read_fd
+		self.write_fd = write_fd
+		self.auth = auth
+		self.shared_read = shared_read
+		self.close_fds = close_fds
+		self.pass_fds = pass_fds
+		self.jobs = jobs
+		self._tokens = list()
+
+	@classmethod
+	def inherit(cls, makeflags=None):
+		"""
+		Joins the jobserver of a parent make
+
+		param: makeflags   The MAKEFLAGS value or None for the environment one
+
+		Returns the Jobserver or None if there is none (or it is not reachable)
+		"""
+		if makeflags is None:
+			makeflags = os.environ.get("MAKEFLAGS", "")
+
+		server = parse_makeflags(makeflags)
+		if server is None:
+			return None
+
+		kind, address = server
+		try:
+			if kind == "fifo":
+				read_fd = os.open(address, os.O_RDONLY | os.O_NONBLOCK)
+				write_fd = os.open(address, os.O_WRONLY)
+				return cls(read_fd, write_fd, f"fifo:{address}", close_fds=(read_fd, write_fd))
+
+			# The descriptors are only inherited when the parent make knows
+			# that the command is recursive ('+' prefix or $(MAKE)).
+			inherited_read, inherited_write = address
+			os.fstat(inherited_read)
+			os.fstat(inherited_write)
+		except OSError:
+			return None
+
+		read_fd, owned = _open_reader(inherited_read)
+		return cls(
+			read_fd,
+			inherited_write,
+			f"{inherited_read},{inherited_write}",
+			shared_read=not owned,
+			close_fds=(read_fd,) if owned else (),
+			pass_fds=address)
+
+	@classmethod
+	def create(cls, jobs):
+		"""
+		Creates a jobserver for the child processes
+
+		param: jobs   The total number of parallel jobs
+		"""
+		pipe_read, pipe_write = os.pipe()
+		os.write(pipe_write, b"+" * max(0, jobs - 1))
+		read_fd, owned = _open_reader(pipe_read)
+		close_fds = (pipe_read, pipe_write, read_fd) if owned else (pipe_read, pipe_write)
+		return cls(
+			read_fd,
+			pipe_write,
+			f"{pipe_read},{pipe_write}",
+			shared_read=not owned,
+			close_fds=close_fds,
+			pass_fds=(pipe_read, pipe_write),
+			jobs=jobs)
+
+	def makeflags(self, makeflags=None):
+		"""
+		MAKEFLAGS for a child make that uses this jobserver
+
+		param: makeflags   The MAKEFLAGS to extend or None for the environment one
+		"""
+		if makeflags is None:
+			makeflags = os.environ.get("MAKEFLAGS", "")
+
+		flags = [f for f in makeflags.split() if not _AUTH_REGEX.match(f)]
+		if self.jobs is not None:
+			flags = [f for f in flags if not re.match(r"^-j\d*$", f)] + [f"-j{self.jobs}"]
+		flags.append(f"--jobserver-auth={self.auth}")
+
+		return " ".join(flags)
+
+	def acquire(self):
+		"""
+		Takes a token without waiting
+
+		Returns True if a token was taken
+		"""
+		if self.shared_read:
+			# Blocking shared description: read only when a token is there
+			readable, _, _ = select.select([self.read_fd], [], [], 0)
+			if not readable:
+				return False
+		try:
+			token = os.read(self.read_fd, 1)
+		except (BlockingIOError, InterruptedError):
+			return False
+		if not token:
+			return False
+
+		self._tokens.append(token)
+		return True
+
+	def release(self):
+		"""
+		Gives a token back
+		"""
+		if self._tokens:
+			os.write(self.write_fd, self._tokens.pop())
+
+	@property
+	def held(self):
+		"""
+		The number of tokens taken
+		"""
+		return len(self._tokens)
+
+	def close(self):
+		"""
+		Gives back all the tokens and closes the descriptors of this process
+		"""
+		while self._tokens:
+			self.release()
+		for fd in self.close_fds:
+			os.close(fd)
+		self.close_fds = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
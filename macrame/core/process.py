@@ -0,0 +1,490 @@
+#!/usr/bin/env python
+
+"""
+Process runner
+
+Runs commands from an asyncio loop: an argument list is executed without
+a shell (a string still goes through one), many commands can run
+concurrently, and the output can be streamed line by line or captured.
+
+	result = run(["make", "-f", "Makefile", "printvars"], capture=True, timeout=60)
+	print(result.returncode, result.output, result.wall, result.cpu, result.max_rss)
+
+The buffers are bounded: a line longer than MAX_LINE is passed on in
+pieces and only the last MAX_CAPTURE bytes of an output are kept.
+
+Every process is reaped with wait4(), so its CPU time is known. The loop
+learns that a process exited through a pidfd when the system has them, or
+else by polling.
+
+The peak memory of a process cannot come from its own wait4() nor from
+the RUSAGE_CHILDREN usage of this process: Linux keeps the peak of the
+process across exec, and the process started as a copy of this
+interpreter. So the commands run through a small
+launcher, built with the C compiler on first use (see launcher_path),
+that forks the command and reports the resource usage of that child
+alone. Without a C compiler the peak memory is unknown (None).
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import hashlib
+import platform
+import tempfile
+import functools
+import threading
+import subprocess
+from collections import namedtuple
+
+# Longest line passed to the callbacks (bytes)
+MAX_LINE = 64 * 1024
+
+# Captured output that is kept (bytes, the end of the output)
+MAX_CAPTURE = 16 * 1024 * 1024
+
+# Time between the SIGTERM and the SIGKILL of a process that timed out (seconds)
+KILL_GRACE = 2.0
+
+# Exit polling period when pidfds are not available (seconds)
+_POLL_PERIOD = 0.01
+
+# Serializes the builds of the launcher by the threads of this process
+_LAUNCHER_LOCK = threading.Lock()
+
+# Runs a command in a child and writes in a descriptor either
+# 'ok <wall ns> <user us> <system us> <peak RSS>' or 'exec <errno>'.
+# It exits like the command, with the same signal when it was killed.
+_LAUNCHER_SOURCE = r"""
+#define _GNU_SOURCE
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#ifdef __linux__
+#include <sys/prctl.h>
+#endif
+
+static pid_t child = 0;
+
+static void forward(int sig)
+{
+	if (child > 0)
+		kill(child, sig);
+}
+
+int main(int argc, char **argv)
+{
+	struct timespec start, end;
+	struct rusage usage;
+	struct rlimit no_core = {0, 0};
+	pid_t parent = getpid();
+	int fd, status;
+
+	if (argc < 3)
+		return 2;
+	fd = atoi(argv[1]);
+	fcntl(fd, F_SETFD, FD_CLOEXEC);
+	signal(SIGTERM, forward);
+	signal(SIGHUP, forward);
+
+	clock_gettime(CLOCK_MONOTONIC, &start);
+	child = fork();
+	if (child < 0) {
+		dprintf(fd, "exec %d\n", errno);
+		return 127;
+	}
+	if (child == 0) {
+#ifdef __linux__
+		/* The command does not outlive a killed launcher */
+		prctl(PR_SET_PDEATHSIG, SIGKILL);
+		if (getppid() != parent)
+			_exit(127);
+#endif
+		execvp(argv[2], argv + 2);
+		dprintf(fd, "exec %d\n", errno);
+		_exit(127);
+	}
+
+	/* The terminal sends them to the command too */
+	signal(SIGINT, SIG_IGN);
+	signal(SIGQUIT, SIG_IGN);
+	while (wait4(child, &status, 0, &usage) < 0) {
+		if (errno != EINTR)
+			return 127;
+	}
+	clock_gettime(CLOCK_MONOTONIC, &end);
+	dprintf(fd, "ok %lld %lld %lld %ld\n",
+		(long long)(end.tv_sec - start.tv_sec) * 1000000000LL + (end.tv_nsec - start.tv_nsec),
+		(long long)usage.ru_utime.tv_sec * 1000000LL + usage.ru_utime.tv_usec,
+		(long long)usage.ru_stime.tv_sec * 1000000LL + usage.ru_stime.tv_usec,
+		usage.ru_maxrss);
+
+	if (WIFSIGNALED(status)) {
+		setrlimit(RLIMIT_CORE, &no_core);
+		signal(WTERMSIG(status), SIG_DFL);
+		kill(getpid(), WTERMSIG(status));
+	}
+	return WIFEXITED(status) ? WEXITSTATUS(status) : 128 + WTERMSIG(status);
+}
+"""
+
+# The resource usage of a process reported by the launcher
+Usage = namedtuple("Usage", "wall cpu max_rss")
+
+
+class ProcessResult:
+	"""
+	The outcome of a process
+	"""
+
+	def __init__(
+			self, args, returncode, output=None, wall=0.0, cpu=0.0, max_rss=None, timed_out=False):
+		"""
+		param: args         The command
+		param: returncode   The exit code (negative for a signal)
+		param: output       The captured output or None
+		param: wall         The wall time in seconds
+		param: cpu          The user and system time in seconds
+		param: max_rss      The peak resident memory in bytes or None if unknown
+		param: timed_out    True if it was stopped after its timeout
+		"""
+		self.args = args
+		self.returncode = returncode
+		self.output = output
+		self.wall = wall
+		self.cpu = cpu
+		self.max_rss = max_rss
+		self.timed_out = timed_out
+
+	def __repr__(self):
+		return f"ProcessResult({self.args!r}, returncode={self.returncode})"
+
+
+class _LineReader:
+	"""
+	Splits the chunks of a pipe in lines and keeps the end of the output
+	"""
+
+	def __init__(self, on_line, capture):
+		self.on_line = on_line
+		self.capture = capture
+		self.captured = bytearray()
+		self.pending = bytearray()
+
+	def feed(self, data):
+		if self.capture:
+			self.captured += data
+			if len(self.captured) > MAX_CAPTURE:
+				del self.captured[:len(self.captured) - MAX_CAPTURE]
+		if self.on_line is None:
+			return
+
+		self.pending += data
+		while True:
+			index = self.pending.find(b"\n")
+			if index < 0 and len(self.pending) < MAX_LINE:
+				break
+			end = index + 1 if 0 <= index < MAX_LINE else MAX_LINE
+			self.on_line(self.pending[:end].decode("utf-8", "replace"))
+			del self.pending[:end]
+
+	def close(self):
+		if self.on_line is not None and self.pending:
+			self.on_line(self.pending.decode("utf-8", "replace"))
+			self.pending.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def launcher_path():
+	"""
+	The launcher that measures a command alone (see _LAUNCHER_SOURCE)
+
+	It is built once per machine, in the cache directory of the user
+	($XDG_CACHE_HOME/macrame or ~/.cache/macrame). A build writes a file
+	of its own and renames it, so concurrent processes do not clash.
+
+	Returns its path or None if it cannot be built
+	"""
+	cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+	digest = hashlib.sha1(_LAUNCHER_SOURCE.encode()).hexdigest()[:12]
+	path = os.path.join(cache, "macrame", f"launcher-{platform.machine()}-{digest}")
+
+	with _LAUNCHER_LOCK:
+		if os.access(path, os.X_OK):
+			return path
+
+		tmp_path = None
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			fd, tmp_path = tempfile.mkstemp(
+				prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path))
+			os.close(fd)
+			subprocess.run(
+				["cc", "-O2", "-x", "c", "-o", tmp_path, "-"], input=_LAUNCHER_SOURCE.encode(),
+				stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60, check=True)
+			os.chmod(tmp_path, 0o755)
+			os.replace(tmp_path, path)
+		except (OSError, subprocess.SubprocessError):
+			if tmp_path is not None and os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			return None
+
+	return path
+
+
+def launch(args, pass_fds=(), **options):
+	"""
+	Starts a command through the launcher
+
+	param: args       The argument list, or a string run by the shell
+	param: pass_fds   Descriptors that the process inherits
+	param: options    Other options of subprocess.Popen
+
+	Returns a tuple (Popen, descriptor of the report or None without launcher)
+	"""
+	path = launcher_path()
+	if path is None:
+		return subprocess.Popen(args, shell=isinstance(args, str), pass_fds=pass_fds, **options), None
+
+	command = [path]
+	if isinstance(args, str):
+		command += ["/bin/sh", "-c", args]
+	else:
+		command += list(args)
+	read_fd, write_fd = os.pipe()
+	command.insert(1, str(write_fd))
+	try:
+		popen = subprocess.Popen(command, pass_fds=tuple(pass_fds) + (write_fd,), **options)
+	except BaseException:
+		os.close(read_fd)
+		raise
+	finally:
+		os.close(write_fd)
+
+	return popen, read_fd
+
+
+def read_usage(fd, args):
+	"""
+	Reads the report of the launcher of an exited process and closes it
+
+	param: fd     The descriptor (see launch)
+	param: args   The command
+
+	Returns the Usage or None if the launcher was killed. Raises the
+	OSError of the exec when the command could not start.
+	"""
+	data = b""
+	try:
+		while True:
+			chunk = os.read(fd, 4096)
+			if not chunk:
+				break
+			data += chunk
+	finally:
+		os.close(fd)
+
+	for line in data.decode().splitlines():
+		fields = line.split()
+		if fields[0] == "exec":
+			error = int(fields[1])
+			program = args if isinstance(args, str) else args[0]
+			raise OSError(error, os.strerror(error), program)
+		if fields[0] == "ok":
+			wall, user, system, max_rss = (int(field) for field in fields[1:])
+			# Kilobytes on Linux
+			if sys.platform != "darwin":
+				max_rss *= 1024
+			return Usage(wall / 1e9, (user + system) / 1e6, max_rss)
+
+	return None
+
+
+def _wait_rusage(pid, options=0):
+	"""
+	Reaps a process
+
+	Returns (pid, exit code, rusage) or (0, None, None) if it runs
+	"""
+	pid, status, rusage = os.wait4(pid, options)
+	if pid == 0:
+		return 0, None, None
+	return pid, os.waitstatus_to_exitcode(status), rusage
+
+
+async def _wait_exit(process):
+	"""
+	Waits for a process to exit and reaps it
+
+	Returns (exit code, rusage)
+	"""
+	loop = asyncio.get_running_loop()
+	try:
+		pidfd = os.pidfd_open(process.pid)
+	except (AttributeError, OSError):
+		pidfd = None
+
+	if pidfd is not None:
+		exited = loop.create_future()
+		loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+		try:
+			await exited
+		finally:
+			loop.remove_reader(pidfd)
+			os.close(pidfd)
+		_, returncode, rusage = _wait_rusage(process.pid)
+	else:
+		while True:
+			pid, returncode, rusage = _wait_rusage(process.pid, os.WNOHANG)
+			if pid != 0:
+				break
+			await asyncio.sleep(_POLL_PERIOD)
+
+	# Popen must not reap it again
+	process.returncode = returncode
+	return returncode, rusage
+
+
+async def run_async(
+		args, env=None, cwd=None, capture=False, on_line=None, timeout=None, pass_fds=(), stderr=True,
+		stdin=None):
+	"""
+	Runs a command
+
+	Without capture nor on_line, the process writes in the streams of
+	this process (e.g. the terminal), so nothing is copied.
+
+	param: args       The argument list, or a string run by the shell
+	param: env        The environment or None to inherit it
+	param: cwd        The working directory or None for the current one
+	param: capture    Keep the output in the result
+	param: on_line    Called with every line of the output (with its newline)
+	param: timeout    Seconds before the process is stopped or None
+	param: pass_fds   Descriptors that the process inherits
+	param: stderr     True for the errors in the output, False to drop them,
+	                  None to leave them in the stream of this process
+	param: stdin      The input stream (e.g. subprocess.DEVNULL) or None to inherit it
+
+	Returns a ProcessResult
+	"""
+	loop = asyncio.get_running_loop()
+	piped = capture or on_line is not None
+	if stderr is True:
+		stderr_stream = subprocess.STDOUT if piped else None
+	elif stderr is False:
+		stderr_stream = subprocess.DEVNULL
+	else:
+		stderr_stream = None
+
+	start = time.monotonic()
+	process, usage_fd = launch(
+		args,
+		env=env,
+		cwd=cwd,
+		stdin=stdin,
+		stdout=subprocess.PIPE if piped else None,
+		stderr=stderr_stream,
+		pass_fds=pass_fds)
+
+	reader = _LineReader(on_line, capture)
+	drained = None
+	if piped:
+		drained = loop.create_future()
+		fd = process.stdout.fileno()
+		os.set_blocking(fd, False)
+
+		def on_readable():
+			try:
+				data = os.read(fd, 65536)
+			except BlockingIOError:
+				return
+			if data:
+				reader.feed(data)
+			else:
+				loop.remove_reader(fd)
+				if not drained.done():
+					drained.set_result(None)
+		loop.add_reader(fd, on_readable)
+
+	timed_out = False
+	waiter = asyncio.ensure_future(_wait_exit(process))
+	try:
+		await asyncio.wait_for(asyncio.shield(waiter), timeout)
+	except asyncio.TimeoutError:
+		timed_out = True
+		process.send_signal(signal.SIGTERM)
+		try:
+			await asyncio.wait_for(asyncio.shield(waiter), KILL_GRACE)
+		except asyncio.TimeoutError:
+			process.kill()
+	returncode, rusage = await waiter
+
+	if piped:
+		# Children of the process may keep the pipe open
+		try:
+			await asyncio.wait_for(drained, KILL_GRACE if timed_out else None)
+		except asyncio.TimeoutError:
+			loop.remove_reader(process.stdout.fileno())
+		process.stdout.close()
+		reader.close()
+
+	wall = time.monotonic() - start
+	usage = None if usage_fd is None else read_usage(usage_fd, args)
+	if usage is None:
+		# The launcher or this process measured, not the command alone
+		usage = Usage(wall, rusage.ru_utime + rusage.ru_stime, None)
+
+	return ProcessResult(
+		args,
+		returncode,
+		output=reader.captured.decode("utf-8", "replace") if capture else None,
+		wall=usage.wall,
+		cpu=usage.cpu,
+		max_rss=usage.max_rss,
+		timed_out=timed_out)
+
+
+async def run_all_async(commands, max_jobs=None, **options):
+	"""
+	Runs commands concurrently
+
+	param: commands   The commands (see run_async)
+	param: max_jobs   How many run at once or None for no limit
+	param: options    The run_async options of all the commands
+
+	Returns the ProcessResult of every command in order, or the exception
+	of the commands that could not start (e.g. FileNotFoundError)
+	"""
+	semaphore = asyncio.Semaphore(max_jobs or max(1, len(commands)))
+
+	async def limited(args):
+		async with semaphore:
+			return await run_async(args, **options)
+
+	return await asyncio.gather(*(limited(args) for args in commands), return_exceptions=True)
+
+
+def run(args, **options):
+	"""
+	Runs a command and waits for it (see run_async)
+
+	Returns a ProcessResult
+	"""
+	return asyncio.run(run_async(args, **options))
+
+
+def run_all(commands, max_jobs=None, **options):
+	"""
+	Runs commands concurrently and waits for them (see run_all_async)
+
+	Returns the list of ProcessResult
+	"""
+	return asyncio.run(run_all_async(commands, max_jobs, **options))
@@ -1,27 +1,191 @@
 #!/usr/bin/env python
 
-import subprocess
+from . import process
+import concurrent.futures
+import filecmp
+import fcntl
+import shlex
+import json
 import os
 import re
 import shutil
+import tempfile
 
 
-def copytree(src: str, dst: str, symlinks=False, ignore=None) -> None:
+# The ioctl that clones a file (copy-on-write) on Linux, e.g. on Btrfs and XFS
+_FICLONE = 0x40049409
+
+
+def clone_file(src, dst, link=False, reflink=True):
+	"""
+	Copies a file, sharing its data when the file system allows it
+
+	A reflink shares the blocks until one of the files is written, so it
+	is a copy. A hard link is the same file: a change in one path is seen
+	in the other, so it is only made when asked.
+
+	param: src       The source file
+	param: dst       The destination file, must not exist
+	param: link      Try a hard link first
+	param: reflink   Try a reflink before a copy
+
+	Returns how it was copied: 'hardlink', 'reflink' or 'copy'
 	"""
-	Copy a file or all the contents of a directory
+	if link:
+		try:
+			os.link(src, dst)
+			return "hardlink"
+		except OSError:
+			pass
+
+	if reflink:
+		with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+			try:
+				fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+				cloned = True
+			except OSError:
+				cloned = False
+		if cloned:
+			shutil.copystat(src, dst)
+			return "reflink"
+		os.remove(dst)
+
+	shutil.copy2(src, dst)
+	return "copy"
+
+
+def copy_files(src, dst, paths, link=False, jobs=None):
+	"""
+	Copies files of a directory in parallel (see clone_file)
+
+	The directories are created first, then the files are copied by a
+	pool of threads: the copies happen in the kernel, without the GIL.
+	Reflinks are not tried again once the file system refused one.
+
+	param: src     The source directory
+	param: dst     The destination directory
+	param: paths   The files, relative to src
+	param: link    Hard link the files when possible
+	param: jobs    The number of threads or None for all CPUs
+
+	Returns the number of files per copy method {'reflink': 3, ...}
+	"""
+	for directory in sorted(set(os.path.dirname(path) for path in paths)):
+		os.makedirs(os.path.join(dst, directory), exist_ok=True)
+
+	counts = dict()
+	reflink = [True]
+
+	def copy(path):
+		method = clone_file(os.path.join(src, path), os.path.join(dst, path), link, reflink[0])
+		if method == "copy":
+			reflink[0] = False
+		return method
+
+	pool = concurrent.futures.ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1)
+	try:
+		for method in pool.map(copy, paths):
+			counts[method] = counts.get(method, 0) + 1
+	finally:
+		# On an error or an interrupt, the copies that did not start are dropped
+		pool.shutdown(cancel_futures=True)
+
+	return counts
+
+
+def read_json(path):
+	"""
+	Reads a JSON cache (e.g. written with AtomicWriter)
+
+	Returns its content or an empty dictionary if it is missing or corrupted
+	"""
+	try:
+		with open(path, "r", encoding="utf-8") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return dict()
+
 
-	param: src The source file or directory
-	param: dst The source file or directory
-	param: symlinks Do you want symlinks to be copied
-	param: ignore What files to ignore
+class AtomicWriter:
 	"""
-	for item in os.listdir(src):
-		s = os.path.join(src, item)
-		d = os.path.join(dst, item)
-		if os.path.isdir(s):
-			shutil.copytree(s, d, symlinks, ignore)
+	Writes a file through a temporary one
+
+	The destination is replaced only when the new content differs, so
+	its modification time does not change needlessly. After the 'with'
+	block, the attribute 'changed' tells if the file was replaced.
+
+		with AtomicWriter("inc/version.h") as f:
+			f.write(content)
+	"""
+
+	def __init__(self, path, mode="w"):
+		"""
+		param: path   The destination file path
+		param: mode   'w' for text or 'wb' for binary files
+		"""
+		self.path = path
+		self.mode = mode
+		self.changed = False
+		self._file = None
+
+	def __enter__(self):
+		directory = os.path.dirname(os.path.abspath(self.path))
+		os.makedirs(directory, exist_ok=True)
+		fd, self._tmp_path = tempfile.mkstemp(
+			dir=directory,
+			prefix=f".{os.path.basename(self.path)}.",
+			suffix=".tmp")
+		encoding = None if "b" in self.mode else "utf-8"
+		self._file = os.fdopen(fd, self.mode, encoding=encoding)
+		return self
+
+	def write(self, data):
+		"""
+		Writes data in the temporary file
+		"""
+		return self._file.write(data)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self._file.close()
+		if exc_type is None and not (
+				os.path.isfile(self.path) and filecmp.cmp(self._tmp_path, self.path, shallow=False)):
+			os.chmod(self._tmp_path, 0o666 & ~get_umask())
+			os.replace(self._tmp_path, self.path)
+			self.changed = True
 		else:
-			shutil.copy2(s, d)
+			os.remove(self._tmp_path)
+
+
+def in_root(root, path):
+	"""
+	Path of a project file from the current directory
+
+	param: root   The project directory or None for the current one
+	param: path   The path relative to the project directory
+	"""
+	return path if root is None else os.path.join(root, path)
+
+
+def get_umask():
+	"""
+	The umask of the process
+
+	Temporary files are created private, so the permissions of the files
+	that replace them are set from it. It is read from /proc where
+	available: setting it to read it back is not safe while other threads
+	create files.
+	"""
+	try:
+		with open("/proc/self/status", "r", encoding="ascii") as f:
+			for line in f:
+				if line.startswith("Umask:"):
+					return int(line.split()[1], 8)
+	except (OSError, ValueError):
+		pass
+
+	rv = os.umask(0)
+	os.umask(rv)
+	return rv
 
 
 def acquireCliProgramVersion(s):
@@ -59,49 +223,61 @@ def toString(obj):
 	return rv
 
 
-def run_command(cmd):
+def run_command(cmd, env=None, pass_fds=(), cwd=None, timeout=None):
 	"""
-	Run a shell command
+	Run a command
 	The stdout is shown.
 
+	param: cmd        The argument list, or a command line run by the shell
+	param: env        The environment or None to inherit it
+	param: pass_fds   Descriptors that the command inherits
+	param: cwd        The working directory or None for the current one
+	param: timeout    Seconds before the command is stopped or None
+
 	Returns the error code
 	"""
 
-	rv = subprocess.call(cmd, shell=True)
+	rv = process.run(cmd, env=env, pass_fds=pass_fds, cwd=cwd, timeout=timeout).returncode
 	return rv
 
 
-def run_command2(cmd):
+def run_command2(cmd, cwd=None, timeout=None):
 	"""
-	Run a shell command
+	Run a command without shell
+
+	param: cmd       The command line, or its argument list
+	param: cwd       The working directory or None for the current one
+	param: timeout   Seconds before the command is stopped or None
 
-	Returns the stdout
+	Returns the stdout or None if the program does not exist
 	"""
 
-	cmdList = cmd.split(" ")
+	cmdList = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
 	rv = None
 	try:
-		rv = subprocess.run(cmdList, stdout=subprocess.PIPE).stdout.decode('utf-8')
+		rv = process.run(cmdList, cwd=cwd, capture=True, stderr=False, timeout=timeout).output
 	except FileNotFoundError:
 		pass
 
 	return rv
 
 
-def listPortNames():
+def listPortNames(directory=None):
 	"""
 	Returns the available port names in the project.
 
 	Ports are directories inside the 'root/port/' directory (if available).
 	Port names are the name of those directories.
 
+	param: directory   The project directory or None for the current one
+
 	Returns:
 	- list of port name strings (if available).
 	- None if port dir is not available or if not any ports are available.
 	"""
 	rv = None
 	portNameList = list()
-	portPath = "port"
+	portPath = os.path.join(directory or ".", "port")
 	if os.path.isdir(portPath):
 		dirCandidateList = os.listdir(portPath)
 		for dirCandidate in dirCandidateList:
@@ -116,18 +292,19 @@ def listPortNames():
 	return rv
 
 
-def egrep(keywords, whole_words=False):
+def egrep(keywords, whole_words=False, cwd=None):
 	"""
 	Runs egrep
 
 	param: keywords       Keywords to search for
 	param: whole_words    Search for whole words
+	param: cwd            The project directory or None for the current one
 	"""
-	grep_flags = "-i -nr -R --color --no-messages"
+	args = ["grep", "-E", "-i", "-nr", "-R", "--color=auto", "--no-messages"]
 
 	if whole_words:
-		grep_flags += " -w"
+		args.append("-w")
 
-	cmd = f"grep -E {grep_flags} '{keywords}' src/ inc/ port/ || true"
-	rv = run_command(cmd)
-	return rv
+	# Nothing found is not an error
+	run_command(args + [keywords, "src/", "inc/", "port/"], cwd=cwd)
+	return 0
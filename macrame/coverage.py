@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+"""
+Coverage of the unit tests
+
+The test objects are built with '--coverage' (COVERAGE=yes, see tests.mk)
+and the test runner writes a '.gcda' file next to every object. gcov reads
+them in parallel chunks and prints JSON ('gcov --json-format --stdout'),
+so no '.gcov' file is written and gcov runs a few times, not once per
+file. The counts of every source are merged in memory:
+
+	{"src/led.c": {
+		"lines": {12: 3, 13: 0},
+		"branches": {12: [3, 0]},
+		"functions": {"led_on": {"line": 10, "count": 3}}}}
+
+and written as an lcov tracefile ('coverage.info') and a Cobertura report
+('coverage.xml') under tmp/<port>/<target>/coverage/.
+"""
+
+import os
+import json
+import time
+import subprocess
+from xml.etree import ElementTree
+from .core import process
+from .core.exceptions import UserInputError
+from .core.utils import AtomicWriter
+
+LCOV_FILENAME = "coverage.info"
+COBERTURA_FILENAME = "coverage.xml"
+
+# The sources that are not measured, relative to the project
+EXCLUDED_DIRECTORIES = ("tests/", "thirdparty/")
+
+
+def find_data(directory):
+	"""
+	Finds the coverage data ('.gcda') below a directory
+	"""
+	rv = list()
+	for parent_path, _, filenames in os.walk(directory):
+		rv += [os.path.join(parent_path, f) for f in filenames if f.endswith(".gcda")]
+
+	return sorted(rv)
+
+
+def remove_data(directory):
+	"""
+	Removes the coverage data of a previous run, so the counts do not add up
+	"""
+	for path in find_data(directory):
+		os.remove(path)
+
+
+def gcov_commands(paths, jobs):
+	"""
+	Splits the gcov work in commands
+
+	param: paths   The '.gcda' files
+	param: jobs    The number of commands
+
+	Returns the list of commands
+	"""
+	chunks = [paths[index::jobs] for index in range(jobs)]
+	command = ["gcov", "--branch-probabilities", "--json-format", "--stdout"]
+	return [command + chunk for chunk in chunks if chunk]
+
+
+def _relative(path, document, root):
+	"""
+	The path of a source of a gcov document relative to the project or None if outside
+	"""
+	path = os.path.normpath(os.path.join(document.get("current_working_directory", root), path))
+	rv = os.path.relpath(path, root).replace(os.sep, "/")
+	if rv.startswith("../"):
+		return None
+	return rv
+
+
+def merge_reports(documents, root, excluded=EXCLUDED_DIRECTORIES):
+	"""
+	Adds up the counts of gcov JSON documents per source
+
+	A header included by many units, or a source of many test programs,
+	gets the sum of the counts of all of them.
+
+	param: documents   The parsed gcov JSON documents
+	param: root        The absolute project directory
+	param: excluded    Prefixes of the sources left out
+
+	Returns the coverage {source: {"lines", "branches", "functions"}}
+	"""
+	rv = dict()
+	for document in documents:
+		for entry in document.get("files", list()):
+			source = _relative(entry["file"], document, root)
+			if source is None or source.startswith(tuple(excluded)):
+				continue
+			counts = rv.setdefault(source, {"lines": dict(), "branches": dict(), "functions": dict()})
+			for line in entry.get("lines", list()):
+				number = line["line_number"]
+				counts["lines"][number] = counts["lines"].get(number, 0) + line["count"]
+				taken = [branch["count"] for branch in line.get("branches", list()) if not branch.get("throw")]
+				if taken:
+					previous = counts["branches"].get(number, list())
+					size = max(len(previous), len(taken))
+					previous = previous + [0] * (size - len(previous))
+					padded = taken + [0] * (size - len(taken))
+					counts["branches"][number] = [a + b for a, b in zip(previous, padded)]
+			for function in entry.get("functions", list()):
+				name = function.get("demangled_name") or function["name"]
+				record = counts["functions"].setdefault(name, {"line": function["start_line"], "count": 0})
+				record["count"] += function["execution_count"]
+
+	return rv
+
+
+def collect_coverage(directory, root, jobs=None):
+	"""
+	Reads the coverage data of a directory with parallel gcov processes
+
+	param: directory   Where the '.gcda' files are (the test objects)
+	param: root        The absolute project directory
+	param: jobs        The number of gcov processes or None for all CPUs
+
+	Returns the coverage (see merge_reports)
+	"""
+	paths = find_data(directory)
+	if not paths:
+		raise UserInputError(f"No coverage data was found in '{directory}'")
+
+	jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths)))
+	documents = list()
+	results = process.run_all(
+		gcov_commands(paths, jobs), capture=True, stderr=False, cwd=root, stdin=subprocess.DEVNULL)
+	for result in results:
+		if isinstance(result, Exception):
+			raise UserInputError(f"gcov could not run: {result}")
+		if result.returncode != 0:
+			raise UserInputError(f"gcov failed with exit code {result.returncode}")
+		documents += [json.loads(line) for line in result.output.splitlines() if line.strip()]
+
+	return merge_reports(documents, root)
+
+
+def summarize(counts):
+	"""
+	The totals of a source
+
+	Returns (lines hit, lines, branches hit, branches)
+	"""
+	lines = counts["lines"].values()
+	branches = [count for taken in counts["branches"].values() for count in taken]
+	return (
+		sum(1 for count in lines if count > 0),
+		len(lines),
+		sum(1 for count in branches if count > 0),
+		len(branches))
+
+
+def _percent(hit, total):
+	return f"{100 * hit / total:5.1f}%" if total else "    -"
+
+
+def format_coverage(coverage):
+	"""
+	Formats the coverage per source as a table
+	"""
+	width = max([len("File"), len("Total")] + [len(source) for source in coverage])
+	txt = f"{'File':<{width}}  {'Lines':>11} {'':>6}  {'Branches':>11} {'':>6}\n"
+	totals = [0, 0, 0, 0]
+	for source in sorted(coverage):
+		line_hit, line_total, branch_hit, branch_total = summarize(coverage[source])
+		totals = [a + b for a, b in zip(totals, (line_hit, line_total, branch_hit, branch_total))]
+		txt += f"{source:<{width}}  {f'{line_hit}/{line_total}':>11} {_percent(line_hit, line_total):>6}"
+		txt += f"  {f'{branch_hit}/{branch_total}':>11} {_percent(branch_hit, branch_total):>6}\n"
+
+	line_hit, line_total, branch_hit, branch_total = totals
+	txt += f"{'Total':<{width}}  {f'{line_hit}/{line_total}':>11} {_percent(line_hit, line_total):>6}"
+	txt += f"  {f'{branch_hit}/{branch_total}':>11} {_percent(branch_hit, branch_total):>6}\n"
+
+	return txt
+
+
+def to_lcov(coverage, test_name=""):
+	"""
+	Converts the coverage to an lcov tracefile
+	"""
+	txt = ""
+	for source in sorted(coverage):
+		counts = coverage[source]
+		txt += f"TN:{test_name}\nSF:{source}\n"
+		functions = sorted(counts["functions"].items(), key=lambda item: item[1]["line"])
+		for name, function in functions:
+			txt += f"FN:{function['line']},{name}\n"
+		for name, function in functions:
+			txt += f"FNDA:{function['count']},{name}\n"
+		txt += f"FNF:{len(functions)}\nFNH:{sum(1 for _, f in functions if f['count'] > 0)}\n"
+		for number in sorted(counts["branches"]):
+			for index, count in enumerate(counts["branches"][number]):
+				taken = count if counts["lines"].get(number) else "-"
+				txt += f"BRDA:{number},0,{index},{taken}\n"
+		line_hit, line_total, branch_hit, branch_total = summarize(counts)
+		txt += f"BRF:{branch_total}\nBRH:{branch_hit}\n"
+		for number in sorted(counts["lines"]):
+			txt += f"DA:{number},{counts['lines'][number]}\n"
+		txt += f"LF:{line_total}\nLH:{line_hit}\nend_of_record\n"
+
+	return txt
+
+
+def to_cobertura(coverage, root, timestamp=None):
+	"""
+	Converts the coverage to a Cobertura XML report
+
+	param: root        The project directory (the source of the paths)
+	param: timestamp   Seconds since the epoch or None for now
+	"""
+	def rate(hit, total):
+		return f"{hit / total:.4f}" if total else "1.0"
+
+	totals = [0, 0, 0, 0]
+	packages = dict()
+	for source in sorted(coverage):
+		packages.setdefault(os.path.dirname(source) or ".", list()).append(source)
+
+	root_element = ElementTree.Element(
+		"coverage", {"version": "1.9", "timestamp": str(int(timestamp or time.time()))})
+	sources_element = ElementTree.SubElement(root_element, "sources")
+	ElementTree.SubElement(sources_element, "source").text = root
+	packages_element = ElementTree.SubElement(root_element, "packages")
+	for package, sources in sorted(packages.items()):
+		package_totals = [0, 0, 0, 0]
+		package_element = ElementTree.SubElement(
+			packages_element, "package", {"name": package.replace("/", ".")})
+		classes_element = ElementTree.SubElement(package_element, "classes")
+		for source in sources:
+			counts = coverage[source]
+			source_totals = summarize(counts)
+			package_totals = [a + b for a, b in zip(package_totals, source_totals)]
+			class_element = ElementTree.SubElement(classes_element, "class", {
+				"name": os.path.basename(source),
+				"filename": source,
+				"line-rate": rate(source_totals[0], source_totals[1]),
+				"branch-rate": rate(source_totals[2], source_totals[3]),
+				"complexity": "0"})
+			ElementTree.SubElement(class_element, "methods")
+			lines_element = ElementTree.SubElement(class_element, "lines")
+			for number in sorted(counts["lines"]):
+				attributes = {"number": str(number), "hits": str(counts["lines"][number]), "branch": "false"}
+				taken = counts["branches"].get(number)
+				if taken:
+					covered = sum(1 for count in taken if count > 0)
+					attributes["branch"] = "true"
+					attributes["condition-coverage"] = f"{100 * covered // len(taken)}% ({covered}/{len(taken)})"
+				ElementTree.SubElement(lines_element, "line", attributes)
+		package_element.set("line-rate", rate(package_totals[0], package_totals[1]))
+		package_element.set("branch-rate", rate(package_totals[2], package_totals[3]))
+		package_element.set("complexity", "0")
+		totals = [a + b for a, b in zip(totals, package_totals)]
+
+	root_element.set("lines-covered", str(totals[0]))
+	root_element.set("lines-valid", str(totals[1]))
+	root_element.set("branches-covered", str(totals[2]))
+	root_element.set("branches-valid", str(totals[3]))
+	root_element.set("line-rate", rate(totals[0], totals[1]))
+	root_element.set("branch-rate", rate(totals[2], totals[3]))
+	root_element.set("complexity", "0")
+
+	return '<?xml version="1.0" ?>\n' + ElementTree.tostring(root_element, encoding="unicode") + "\n"
+
+
+def write_reports(coverage, directory, root):
+	"""
+	Writes the lcov and Cobertura files
+
+	param: coverage    See merge_reports
+	param: directory   Where the files are written
+	param: root        The absolute project directory
+
+	Returns the paths of the files
+	"""
+	lcov_path = os.path.join(directory, LCOV_FILENAME)
+	cobertura_path = os.path.join(directory, COBERTURA_FILENAME)
+	with AtomicWriter(lcov_path) as f:
+		f.write(to_lcov(coverage))
+	with AtomicWriter(cobertura_path) as f:
+		f.write(to_cobertura(coverage, root))
+
+	return [lcov_path, cobertura_path]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""
+Header fan-out and rebuild cost
+
+The dependency files ('.d') of the objects make the include graph. For
+every header, the translation units that depend on it and their recorded
+compile time (see scheduler.BuildHistory) tell how expensive a change of
+the header is.
+"""
+
+import os
+from .scheduler import read_depfile
+
+
+def collect_dependencies(obj_outdir, objects=None):
+	"""
+	Reads the dependency files of the objects
+
+	The ones of the precompiled headers (OBJ_OUTDIR/pch/) are skipped, and
+	so are the stale ones of removed sources when the objects are given.
+
+	param: obj_outdir   The directory of the objects (OBJ_OUTDIR)
+	param: objects      The objects of the build or None for all the dependency files
+
+	Returns a dictionary {object: (source, [headers])}
+	"""
+	if objects is not None:
+		objects = set(os.path.normpath(path) for path in objects)
+	pch_outdir = os.path.join(obj_outdir, "pch")
+
+	rv = dict()
+	for parent_path, dirnames, filenames in os.walk(obj_outdir):
+		dirnames[:] = sorted(d for d in dirnames if os.path.join(parent_path, d) != pch_outdir)
+		for filename in sorted(filenames):
+			if not filename.endswith(".d"):
+				continue
+			path = os.path.join(parent_path, filename)
+			obj_path = os.path.normpath(path[:-2] + ".o")
+			if objects is not None and obj_path not in objects:
+				continue
+			prerequisites = read_depfile(path)
+			if prerequisites:
+				# Relative to the project, e.g. the '..' of the includes from OBJ_OUTDIR/pch/
+				prerequisites = [os.path.normpath(p).replace(os.sep, "/") for p in prerequisites]
+				rv[obj_path.replace(os.sep, "/")] = (prerequisites[0], prerequisites[1:])
+
+	return rv
+
+
+def header_fanout(dependencies, durations):
+	"""
+	Computes the rebuild cost of every header
+
+	param: dependencies   {object: (source, [headers])}
+	param: durations      {object: compile seconds} of the measured objects
+
+	Returns a list of dictionaries sorted by cost, then by fan-out:
+	- header:     the header path
+	- units:      number of translation units that include it
+	- cost:       sum of their compile seconds
+	- unmeasured: how many of them have no recorded duration
+	"""
+	headers = dict()
+	for obj_path, (_, included) in dependencies.items():
+		for header in set(included):
+			entry = headers.setdefault(header, {"header": header, "units": 0, "cost": 0.0, "unmeasured": 0})
+			entry["units"] += 1
+			if obj_path in durations:
+				entry["cost"] += durations[obj_path]
+			else:
+				entry["unmeasured"] += 1
+
+	return sorted(headers.values(), key=lambda e: (-e["cost"], -e["units"], e["header"]))
+
+
+def format_fanout(entries, total_units, total_cost, top=20):
+	"""
+	Formats the header ranking as a table
+	"""
+	txt = f"{'Cost (s)':>9} {'Share':>6} {'Units':>11}  Header\n"
+	for entry in entries[:top]:
+		share = 100 * entry["cost"] / total_cost if total_cost else 0
+		units = f"{entry['units']}/{total_units}"
+		mark = " *" if entry["unmeasured"] else ""
+		txt += f"{entry['cost']:9.2f} {share:5.1f}% {units:>11}  {entry['header']}{mark}\n"
+
+	if any(entry["unmeasured"] for entry in entries[:top]):
+		txt += "\n* some units have no recorded compile time (build with 'mac build -j')\n"
+
+	return txt
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+"""
+Compiler diagnostics
+
+The output of every compile and link is kept next to its object ('.err'
+files, see runCaptured in the makefile and the scheduler). The GCC
+diagnostics are parsed from them into records:
+
+	{"file": "inc/board.h", "line": 12, "column": 5, "severity": "warning",
+	 "option": "-Wunused-parameter", "message": "unused parameter 'x'",
+	 "notes": [...], "units": ["tmp/posix/dbg/obj/src/main.err", ...]}
+
+A warning of a header shows up in every translation unit that includes
+it, so the same diagnostic is kept once, with the units it came from.
+The records of a build are written in 'diagnostics.json' and in SARIF
+('diagnostics.sarif') under tmp/<port>/<target>/.
+"""
+
+import os
+import re
+import json
+from .core.utils import AtomicWriter
+from .core.utils import in_root
+
+JSON_FILENAME = "diagnostics.json"
+SARIF_FILENAME = "diagnostics.sarif"
+
+# The sources that the objects are compiled from
+SOURCE_EXTENSIONS = (".s", ".c", ".cpp")
+
+_ANSI_REGEX = re.compile(r"\x1b\[[0-9;]*[A-Za-z]|\x1b\]8;[^\x1b]*\x1b\\")
+
+# file:line:column: severity: message [-Woption]
+# (the analyzers put their check names in place of the option, see lint.py)
+_DIAGNOSTIC_REGEX = re.compile(
+	r"^(?P<file>[^:\s][^:]*):(?P<line>\d+):(?:(?P<column>\d+):)? "
+	r"(?P<severity>fatal error|error|warning|style|performance|portability|information|note): "
+	r"(?P<message>.*?)(?: \[(?P<option>[^\]\s]+)\])?$")
+
+# The linker: file:(.text+0x12): message
+_LINKER_REGEX = re.compile(r"^(?P<file>[^:\s][^:]*):\((?P<section>[^)]*)\): (?P<message>.*)$")
+
+# A tool without location: program: severity: message
+_TOOL_REGEX = re.compile(
+	r"^(?P<file>[^:\s]+): (?P<severity>fatal error|error|warning): (?P<message>.*)$")
+
+# SARIF level per severity
+_LEVELS = {
+	"fatal error": "error", "error": "error", "warning": "warning", "style": "warning",
+	"performance": "warning", "portability": "warning", "information": "note", "note": "note"}
+
+
+def parse_diagnostics(text):
+	"""
+	Parses the GCC diagnostics of a compiler output
+
+	The notes that follow a diagnostic are attached to it. The source
+	excerpts and the 'In file included from' lines are skipped.
+
+	param: text   The output of one compile or link
+
+	Returns the list of records (without 'units')
+	"""
+	rv = list()
+	for line in _ANSI_REGEX.sub("", text).splitlines():
+		match = _DIAGNOSTIC_REGEX.match(line)
+		if match is not None:
+			record = {
+				"file": match.group("file"),
+				"line": int(match.group("line")),
+				"column": int(match.group("column")) if match.group("column") else None,
+				"severity": match.group("severity"),
+				"option": match.group("option"),
+				"message": match.group("message"),
+			}
+		else:
+			match = _LINKER_REGEX.match(line) or _TOOL_REGEX.match(line)
+			if match is None:
+				continue
+			groups = match.groupdict()
+			record = {
+				"file": groups["file"],
+				"line": None,
+				"column": None,
+				"severity": groups.get("severity") or "error",
+				"option": None,
+				"message": groups["message"],
+			}
+
+		if record["severity"] == "note" and rv:
+			rv[-1]["notes"].append({k: record[k] for k in ("file", "line", "column", "message")})
+			continue
+		record["notes"] = list()
+		rv.append(record)
+
+	return rv
+
+
+def _key(record):
+	"""
+	What makes two diagnostics the same
+	"""
+	return (
+		record["file"], record["line"], record["column"], record["severity"], record["option"],
+		record["message"])
+
+
+def merge_diagnostics(outputs):
+	"""
+	Parses the outputs of the units of a build and drops the duplicates
+
+	param: outputs   Tuples (unit, output text)
+
+	Returns the list of records, each with the 'units' it was found in
+	"""
+	records = dict()
+	for unit, text in outputs:
+		for record in parse_diagnostics(text):
+			key = _key(record)
+			if key not in records:
+				records[key] = dict(record, units=list())
+			if unit not in records[key]["units"]:
+				records[key]["units"].append(unit)
+
+	return list(records.values())
+
+
+def collect_diagnostics(paths, root=None):
+	"""
+	Parses the '.err' files of a build and drops the duplicates (see merge_diagnostics)
+
+	param: paths   The '.err' files
+	param: root    The project directory the paths are relative to or None for the current one
+	"""
+	outputs = list()
+	for path in sorted(paths):
+		try:
+			with open(in_root(root, path), "r", encoding="utf-8", errors="replace") as f:
+				outputs.append((path, f.read()))
+		except OSError:
+			continue
+
+	return merge_diagnostics(outputs)
+
+
+def job_outputs(jobs):
+	"""
+	The compiler outputs ('.err') of the jobs of a build
+
+	Only the jobs of the build are taken, so the outputs left by other
+	source lists (e.g. a unity build) are not reported. The conversions
+	are left out: their output is not the one of a compiler.
+
+	param: jobs   The jobs (see scheduler.Job)
+	"""
+	return sorted(job.log_path for job in jobs if job.kind != "OC")
+
+
+def find_outputs(object_directories, program_directories, root=None):
+	"""
+	Finds the compiler outputs ('.err') of a build when its jobs are unknown
+
+	The outputs of the objects whose source was removed are left out.
+
+	param: object_directories    The directories of the objects (e.g. OBJ_OUTDIR)
+	param: program_directories   The directories of the programs (BIN_OUTDIR)
+	param: root                  The project directory the directories are relative to
+	                             or None for the current one
+
+	Returns the paths relative to the project
+	"""
+	rv = list()
+	for directory in object_directories:
+		for parent_path, _, filenames in os.walk(in_root(root, directory)):
+			for filename in filenames:
+				if not filename.endswith(".err"):
+					continue
+				path = os.path.join(parent_path, filename)
+				source_stem = in_root(root, os.path.relpath(path[:-len(".err")], in_root(root, directory)))
+				if any(os.path.isfile(source_stem + extension) for extension in SOURCE_EXTENSIONS):
+					rv.append(os.path.relpath(path, root or "."))
+
+	for directory in program_directories:
+		for parent_path, _, filenames in os.walk(in_root(root, directory)):
+			rv += [
+				os.path.relpath(os.path.join(parent_path, f), root or ".")
+				for f in filenames if f.endswith(".err")]
+
+	return sorted(rv)
+
+
+def to_sarif(records, tool="gcc"):
+	"""
+	Converts the records to a SARIF 2.1.0 log
+
+	param: tool   The name of the program that reported them
+	"""
+	results = list()
+	rules = dict()
+	for record in records:
+		rule_id = record["option"] or tool
+		rules.setdefault(rule_id, {"id": rule_id})
+		region = dict()
+		if record["line"] is not None:
+			region["startLine"] = record["line"]
+		if record["column"] is not None:
+			region["startColumn"] = record["column"]
+		location = {"physicalLocation": {"artifactLocation": {"uri": record["file"]}}}
+		if region:
+			location["physicalLocation"]["region"] = region
+		results.append({
+			"ruleId": rule_id,
+			"level": _LEVELS[record["severity"]],
+			"message": {"text": record["message"]},
+			"locations": [location],
+			"properties": {"units": record["units"], "notes": record["notes"]},
+		})
+
+	return {
+		"$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+		"version": "2.1.0",
+		"runs": [{
+			"tool": {"driver": {"name": tool, "rules": sorted(rules.values(), key=lambda r: r["id"])}},
+			"results": results,
+		}],
+	}
+
+
+def write_reports(records, directory, tool="gcc"):
+	"""
+	Writes the records in JSON and SARIF
+
+	param: records     The records (see collect_diagnostics)
+	param: directory   Where the files are written (tmp/<port>/<target>)
+	param: tool        The name of the program that reported them
+	"""
+	with AtomicWriter(os.path.join(directory, JSON_FILENAME)) as f:
+		json.dump(records, f, indent=1)
+	with AtomicWriter(os.path.join(directory, SARIF_FILENAME)) as f:
+		json.dump(to_sarif(records, tool), f, indent=1)
+
+
+def format_diagnostics(records, top=10):
+	"""
+	Formats the counts of the diagnostics and the most repeated ones
+
+	Returns '' when there are none
+	"""
+	if not records:
+		return ""
+
+	counts = dict()
+	occurrences = 0
+	for record in records:
+		severity = "error" if record["severity"] == "fatal error" else record["severity"]
+		counts[severity] = counts.get(severity, 0) + 1
+		occurrences += len(record["units"])
+
+	txt = "Diagnostics: "
+	txt += ", ".join(f"{count} {severity}(s)" for severity, count in sorted(counts.items()))
+	if occurrences > len(records):
+		txt += f" ({occurrences - len(records)} duplicates collapsed)"
+	txt += "\n"
+
+	for record in sorted(records, key=lambda r: (-len(r["units"]), r["file"], r["line"] or 0))[:top]:
+		location = record["file"]
+		if record["line"] is not None:
+			location += f":{record['line']}"
+		if record["column"] is not None:
+			location += f":{record['column']}"
+		option = f" [{record['option']}]" if record["option"] else ""
+		txt += f"  {len(record['units']):4d}x {location}: "
+		txt += f"{record['severity']}: {record['message']}{option}\n"
+
+	return txt
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+
+"""
+Generation of the 'inc/version.h' header from git
+
+The fields are read in-process from the '.git' directory. Only the dirty
+state and the untracked files need one 'git status' process. When the
+repository can not be read in-process, git is asked for every field.
+
+A fingerprint of HEAD, the index, the tracked files and the directories
+that hold them is cached, so nothing is computed when it did not change.
+The header is only replaced when its content changes, so the translation
+units that include it are not recompiled needlessly.
+"""
+
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from .core.git import GitRepository
+from .core.git import GitError
+from .core.git import find_git_dir
+from .core.utils import AtomicWriter
+from .core.utils import read_json
+from .core.utils import run_command2
+
+HEADER_PATH = os.path.join("inc", "version.h")
+CACHE_PATH = os.path.join("tmp", "version.json")
+
+# Field name and its documentation in the header
+FIELDS = [
+	("GIT_RAW_VERSION", "Raw git version."),
+	("VERSION", "Version of the project."),
+	("MAJOR", "Major version from git tag."),
+	("MINOR", "Minor version from git tag"),
+	("PATCH", "Commit number since last tag."),
+	("TOTAL_NUM_COMMITS", "Git current number of commits for the given branch."),
+	("BRANCH", "Current git branch."),
+	("AHEAD_BY_MASTER", "How many commits away of master branch."),
+	("TOTAL_NUM_UNTRACKED", "How many untracked git files."),
+	("COMMIT_HASH", "Latest git commit hash."),
+	("COMMIT_TIMESTAMP", "Latest git commit timestamp."),
+	("COMMIT_DATE", "Latest git commit date( Yy-Mm-Dd )."),
+	("COMMIT_TIME", "Latest git commit time( Hh:Mm:Ss )."),
+	("COMMIT_TIMEZONE", "Latest git commit timezone."),
+	("COMMIT_COMMENT", "Latest git commit comment."),
+]
+
+HEADER_PROLOGUE = """\
+/*******************************************************************************
+	About
+*******************************************************************************/
+
+/**
+* \\file version.h
+*
+* \\brief        This file is generated automatically from script and keeps track
+*               of version control.
+*
+* \\author       Ilias Kanelis    hkanelhs@yahoo.gr
+*/
+
+/**
+* \\defgroup     Version       Version
+*
+* \\code         #include <version.h> @endcode
+*/
+
+/*******************************************************************************
+	Code
+*******************************************************************************/
+
+#ifndef VERSION_H_INCLUDED
+#define VERSION_H_INCLUDED
+
+/*******************************************************************************
+	Custom definitions
+*******************************************************************************/
+"""
+
+HEADER_EPILOGUE = """
+#endif /* VERSION_H_INCLUDED */
+
+"""
+
+
+def render_header(fields):
+	"""
+	Renders the content of the version header
+
+	param: fields   Dictionary {field name: value}
+	"""
+	txt = HEADER_PROLOGUE
+	for name, description in FIELDS:
+		value = fields.get(name, "").replace("\\", "\\\\").replace('"', '\\"')
+		txt += f"\n/**\n * {description}\n */\n"
+		txt += f"#define {name:<48}\"{value}\"\n"
+	txt += HEADER_EPILOGUE
+
+	return txt
+
+
+def _assemble(raw, commits, branch, ahead, untracked, short_hash, timestamp, subject):
+	"""
+	Derives the version fields the same way 'get_version.sh' does
+	"""
+	raw_fields = raw.split("-")
+	tag_fields = raw_fields[0].split("v")
+	numbers = tag_fields[1].split(".") if len(tag_fields) > 1 else list()
+
+	major = numbers[0] if len(numbers) > 0 else ""
+	minor = numbers[1] if len(numbers) > 1 else ""
+	patch = raw_fields[1] if len(raw_fields) > 1 else ""
+	timestamp_fields = timestamp.split(" ") + ["", "", ""]
+
+	return {
+		"GIT_RAW_VERSION": raw,
+		# Empty outside a repository, like 'get_version.sh'
+		"VERSION": f"{major}.{minor}.{patch}" if raw else "",
+		"MAJOR": major,
+		"MINOR": minor,
+		"PATCH": patch,
+		"TOTAL_NUM_COMMITS": str(commits),
+		"BRANCH": branch,
+		"AHEAD_BY_MASTER": str(ahead),
+		"TOTAL_NUM_UNTRACKED": str(untracked),
+		"COMMIT_HASH": short_hash,
+		"COMMIT_TIMESTAMP": timestamp,
+		"COMMIT_DATE": timestamp_fields[0],
+		"COMMIT_TIME": timestamp_fields[1],
+		"COMMIT_TIMEZONE": timestamp_fields[2],
+		"COMMIT_COMMENT": subject,
+	}
+
+
+def _git_status(repo_root, path):
+	"""
+	Returns a tuple (dirty, number of untracked files under path)
+
+	This is the only git process needed on the in-process path.
+	"""
+	command = ["git", "status", "--porcelain", "--untracked-files=all"]
+	output = run_command2(command, cwd=repo_root) or ""
+	prefix = os.path.relpath(os.path.abspath(path), repo_root).replace(os.sep, "/")
+	prefix = "" if prefix == "." else prefix + "/"
+
+	dirty = False
+	untracked = 0
+	for line in output.splitlines():
+		if line.startswith("?? "):
+			if line[3:].strip('"').startswith(prefix):
+				untracked += 1
+		elif line.strip():
+			dirty = True
+
+	return dirty, untracked
+
+
+def _fields_in_process(repo, path):
+	"""
+	Computes the fields by reading the '.git' directory
+	"""
+	ref, head = repo.head()
+	if head is None:
+		raise GitError("The repository has no commits")
+
+	commit = repo.commit(head)
+	short_hash = repo.abbreviate(head)
+	dirty, untracked = _git_status(repo.work_tree, path)
+
+	description = repo.describe(head)
+	if description is None:
+		raw = short_hash
+	else:
+		raw = f"{description[0]}-{description[1]}-g{short_hash}"
+	if dirty:
+		raw += "-dirty"
+
+	ancestors = repo.ancestors(head)
+	master = repo.resolve("refs/heads/master")
+	ahead = len(ancestors - repo.ancestors(master)) if master else ""
+
+	if ref is not None and ref.startswith("refs/heads/"):
+		branch = ref[len("refs/heads/"):]
+	else:
+		branch = "HEAD"
+
+	sign = -1 if commit.timezone.startswith("-") else 1
+	offset = timedelta(hours=int(commit.timezone[1:3]), minutes=int(commit.timezone[3:5])) * sign
+	date = datetime.fromtimestamp(commit.time, timezone(offset))
+	timestamp = date.strftime("%Y-%m-%d %H:%M:%S ") + commit.timezone
+
+	return _assemble(
+		raw, len(ancestors), branch, ahead, untracked, short_hash, timestamp, commit.subject)
+
+
+def _fields_from_git(path):
+	"""
+	Computes the fields with git processes (fallback)
+	"""
+	def git(*args):
+		return (run_command2(["git"] + list(args), cwd=path) or "").strip()
+
+	raw = git("describe", "--always", "--dirty", "--long", "--tags")
+	if raw == "":
+		return _assemble("", "", "", "", "", "", "", "")
+
+	master = ""
+	if git("rev-parse", "--verify", "--quiet", "master"):
+		master = git("rev-list", "--count", "HEAD", "^master")
+	untracked = git("ls-files", "--exclude-standard", "--others", "--full-name", "--", ".")
+	untracked = len(untracked.splitlines())
+
+	return _assemble(
+		raw,
+		git("rev-list", "--count", "HEAD"),
+		git("rev-parse", "--abbrev-ref", "HEAD"),
+		master,
+		untracked,
+		git("rev-parse", "--short", "--verify", "HEAD"),
+		git("log", "-1", "--pretty=format:%ci"),
+		git("log", "-1", "--pretty=format:%s"))
+
+
+def version_fields(path="."):
+	"""
+	Computes the version fields of the project in path
+	"""
+	if find_git_dir(path) is None:
+		return _assemble("", "", "", "", "", "", "", "")
+
+	try:
+		with GitRepository(path) as repo:
+			return _fields_in_process(repo, path)
+	except (GitError, KeyError, OSError, ValueError):
+		return _fields_from_git(path)
+
+
+def fingerprint(path="."):
+	"""
+	Cheap summary of the repository state the version fields depend on
+
+	It covers HEAD, the references, the index, the stat of every tracked
+	file and the directories holding them (new untracked files change the
+	directory modification time). No git process is needed.
+
+	Returns None when it can not be computed.
+	"""
+	try:
+		with GitRepository(path) as repo:
+			ref, head = repo.head()
+			entries = repo.index()
+	except (GitError, OSError, ValueError):
+		return None
+
+	digest = hashlib.sha1()
+	digest.update(f"{ref} {head}\n".encode())
+	for name in ("packed-refs", "refs/tags", "refs/heads", "index"):
+		try:
+			stat = os.stat(os.path.join(repo.common_dir if name != "index" else repo.git_dir, name))
+			digest.update(f"{name} {stat.st_mtime_ns} {stat.st_size}\n".encode())
+		except OSError:
+			pass
+
+	directories = {os.path.abspath(path), repo.work_tree}
+	for entry in entries:
+		file_path = os.path.join(repo.work_tree, entry.path)
+		directories.add(os.path.dirname(file_path))
+		try:
+			stat = os.lstat(file_path)
+			digest.update(f"{entry.path} {stat.st_mtime_ns} {stat.st_size}\n".encode())
+		except OSError:
+			digest.update(f"{entry.path} missing\n".encode())
+
+	for directory in sorted(directories):
+		try:
+			digest.update(f"{directory} {os.stat(directory).st_mtime_ns}\n".encode())
+		except OSError:
+			pass
+
+	return digest.hexdigest()
+
+
+def _head_commit(path):
+	"""
+	The commit hash of HEAD or None
+	"""
+	try:
+		with GitRepository(path) as repo:
+			return repo.head()[1]
+	except (GitError, OSError, ValueError):
+		return None
+
+
+def recorded_commit(cache_path=CACHE_PATH, path="."):
+	"""
+	The commit hash of HEAD that the last generation of the header read
+
+	It is up to date after a build, which generates the header first.
+
+	param: cache_path   Where the fingerprint of the last generation is kept, relative to the project
+	param: path         The project directory
+
+	Returns None if unknown (e.g. outside a repository)
+	"""
+	return read_json(os.path.join(path, cache_path)).get("commit")
+
+
+def generate_version_header(header_path=HEADER_PATH, cache_path=CACHE_PATH, path="."):
+	"""
+	Generates the version header when the repository state changed
+
+	param: header_path   The generated header, relative to the project
+	param: cache_path    Where the fingerprint of the last generation is kept, relative to the project
+	param: path          The project directory
+
+	Returns True if the header was rewritten
+	"""
+	header_path = os.path.join(path, header_path)
+	cache_path = os.path.join(path, cache_path)
+	cache = read_json(cache_path)
+	current = fingerprint(path)
+	up_to_date = current is not None and cache.get("fingerprint") == current and "commit" in cache
+	if up_to_date and os.path.isfile(header_path):
+		return False
+
+	with AtomicWriter(header_path) as f:
+		f.write(render_header(version_fields(path)))
+
+	# Writing the header may touch a tracked directory, so the
+	# fingerprint is taken again after it.
+	os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+	with AtomicWriter(cache_path) as cache_file:
+		json.dump({
+			"fingerprint": fingerprint(path),
+			"time": int(time.time()),
+			"commit": _head_commit(path)}, cache_file)
+
+	return f.changed
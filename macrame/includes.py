@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+"""
+Include scanner
+
+Finds the '#include' directives of the sources and resolves them against
+the '-I' paths of the compile commands, the way the preprocessor does,
+without running it. Conditional compilation is ignored, so the graph is
+an approximation (a superset) of the real one, available before the
+first compile wrote any '.d' file.
+
+The directives of every file are cached by content hash, so only the
+changed files are read again.
+"""
+
+import os
+import re
+import json
+import shlex
+import hashlib
+from .core.utils import AtomicWriter
+from .core.utils import in_root
+
+CACHE_PATH = os.path.join("tmp", "includes.json")
+
+_INCLUDE_REGEX = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\n]+)[>"]', re.MULTILINE)
+
+
+def parse_includes(data):
+	"""
+	Finds the include directives of a source
+
+	param: data   The content of the file (bytes)
+
+	Returns a list of tuples (is_quoted, name)
+	"""
+	return [
+		(m.group(1) == b'"', m.group(2).decode("utf-8", "replace").strip())
+		for m in _INCLUDE_REGEX.finditer(data)]
+
+
+def include_paths(command):
+	"""
+	Finds the include directories of a compile command
+
+	param: command   The command line
+
+	Returns a tuple (quote paths, paths) in search order
+	"""
+	quote_paths = list()
+	paths = list()
+	try:
+		args = shlex.split(command)
+	except ValueError:
+		args = command.split()
+
+	options = {"-I": paths, "-iquote": quote_paths, "-isystem": paths, "-idirafter": paths}
+	index = 0
+	while index < len(args):
+		arg = args[index]
+		for option, destination in options.items():
+			if arg == option and index + 1 < len(args):
+				destination.append(args[index + 1])
+				index += 1
+				break
+			if arg.startswith(option) and len(arg) > len(option):
+				destination.append(arg[len(option):])
+				break
+		index += 1
+
+	return quote_paths, paths
+
+
+class IncludeScanner:
+	"""
+	Approximate header dependencies of the translation units
+	"""
+
+	def __init__(self, cache_path=CACHE_PATH, root=None):
+		"""
+		param: cache_path   The JSON cache of the directives or None for no cache
+		param: root         The project directory or None for the current one.
+		                    The paths (the cache ones too) stay relative to it.
+		"""
+		self.root = root
+		self.cache_path = None if cache_path is None else in_root(root, cache_path)
+		self._files = dict()
+		self._by_hash = dict()
+		self._changed = False
+		self._resolved = dict()
+		if self.cache_path is not None and os.path.isfile(self.cache_path):
+			try:
+				with open(self.cache_path, "r", encoding="utf-8") as f:
+					cache = json.load(f)
+				self._files = cache.get("files", dict())
+				self._by_hash = cache.get("hashes", dict())
+			except ValueError:
+				pass
+
+	def directives(self, path):
+		"""
+		Returns the include directives of a file [(is_quoted, name)]
+
+		The file is read only when its size or time changed, and parsed
+		only when its content hash is unknown.
+		"""
+		stat = os.stat(in_root(self.root, path))
+		entry = self._files.get(path)
+		if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+			digest = entry["hash"]
+		else:
+			with open(in_root(self.root, path), "rb") as f:
+				data = f.read()
+			digest = hashlib.sha1(data).hexdigest()
+			if digest not in self._by_hash:
+				self._by_hash[digest] = parse_includes(data)
+			self._files[path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": digest}
+			self._changed = True
+
+		return [tuple(d) for d in self._by_hash[digest]]
+
+	def resolve(self, name, is_quoted, including_path, quote_paths, paths):
+		"""
+		Finds the file of an include directive
+
+		Returns the normalized path or None if not found (e.g. system headers)
+		"""
+		directories = list()
+		if is_quoted:
+			directories.append(os.path.dirname(including_path))
+			directories += quote_paths
+		directories += paths
+
+		for directory in directories:
+			candidate = os.path.normpath(os.path.join(directory, name))
+			if os.path.isfile(in_root(self.root, candidate)):
+				return candidate.replace(os.sep, "/")
+
+		return None
+
+	def direct_headers(self, source, command):
+		"""
+		Returns the project headers a source includes directly, in order
+
+		param: source    The source path
+		param: command   Its compile command (for the '-I' paths)
+		"""
+		quote_paths, paths = include_paths(command)
+		rv = list()
+		for is_quoted, name in self.directives(source):
+			header = self.resolve(name, is_quoted, source, quote_paths, paths)
+			if header is not None:
+				rv.append(header)
+
+		return rv
+
+	def headers(self, source, command):
+		"""
+		Returns the project headers a source includes, directly or not
+
+		param: source    The source path
+		param: command   Its compile command (for the '-I' paths)
+		"""
+		quote_paths, paths = include_paths(command)
+		key_paths = (tuple(quote_paths), tuple(paths))
+
+		rv = set()
+		pending = [source]
+		while pending:
+			path = pending.pop()
+			try:
+				found = self.directives(path)
+			except OSError:
+				continue
+			for is_quoted, name in found:
+				key = (name, is_quoted, os.path.dirname(path), key_paths)
+				if key not in self._resolved:
+					self._resolved[key] = self.resolve(name, is_quoted, path, quote_paths, paths)
+				header = self._resolved[key]
+				if header is not None and header not in rv:
+					rv.add(header)
+					pending.append(header)
+
+		return sorted(rv)
+
+	def save(self):
+		"""
+		Writes the cache when new files were parsed
+		"""
+		if self.cache_path is None or not self._changed:
+			return
+
+		# Forget the hashes that no file has anymore
+		used = set(entry["hash"] for entry in self._files.values())
+		hashes = {digest: includes for digest, includes in self._by_hash.items() if digest in used}
+		with AtomicWriter(self.cache_path) as f:
+			json.dump({"files": self._files, "hashes": hashes}, f)
+		self._changed = False
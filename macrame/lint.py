@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+"""
+Static analysis
+
+Runs an analyzer (clang-tidy, cppcheck or flint) on every translation
+unit of a port and target, in parallel, with the include paths and
+definitions of its compile command (see compiledb.compile_entries).
+
+The results are cached per unit in tmp/<port>/<target>/lint/<analyzer>.json.
+The key of a unit is the hash of its source, of the project headers it
+includes (see includes.IncludeScanner), of the analyzer command and
+version and of the analyzer configuration files. A unit whose key did not
+change is not analyzed again: its recorded output is shown.
+
+The diagnostics of all the units are written, without duplicates, in
+'diagnostics.json' and 'diagnostics.sarif' of the lint directory.
+"""
+
+import os
+import json
+import hashlib
+import shutil
+import subprocess
+from .core import process
+from .core.exceptions import UserInputError
+from .core.utils import AtomicWriter
+from .core.utils import read_json
+from .core.utils import run_command2
+from .diagnostics import format_diagnostics
+from .diagnostics import merge_diagnostics
+from .diagnostics import write_reports
+from .includes import IncludeScanner
+
+ANALYZERS = ("clang-tidy", "cppcheck", "flint")
+
+# Configuration files of the analyzers, relative to the project
+CONFIG_FILES = {
+	"clang-tidy": [".clang-tidy"],
+	"cppcheck": ["cppcheck-suppressions.txt"],
+	"flint": ["std.lnt", "options.lnt"],
+}
+
+# Options of the compile commands that take a value and do not concern the analysis
+_SKIPPED_WITH_VALUE = ("-o", "-MF", "-MT", "-MQ")
+
+# The same without a value
+_SKIPPED = ("-c", "-MD", "-MMD", "-MP")
+
+
+def preprocessor_options(arguments):
+	"""
+	Finds the include paths and definitions of a compile command
+
+	param: arguments   The compile command (list)
+
+	Returns a list of tuples (option, value) with option '-I', '-D', '-U',
+	'-isystem', '-iquote', '-include' or '-std'
+	"""
+	rv = list()
+	index = 1
+	while index < len(arguments):
+		arg = arguments[index]
+		if arg.startswith("-std="):
+			rv.append(("-std", arg[len("-std="):]))
+		for option in ("-isystem", "-iquote", "-include", "-I", "-D", "-U"):
+			if arg == option and index + 1 < len(arguments):
+				rv.append((option, arguments[index + 1]))
+				index += 1
+				break
+			if arg.startswith(option) and len(arg) > len(option) and option in ("-I", "-D", "-U"):
+				rv.append((option, arg[len(option):]))
+				break
+		index += 1
+
+	return rv
+
+
+def compiler_options(arguments, source):
+	"""
+	The options of a compile command without the compiler, the source and the outputs
+
+	param: arguments   The compile command (list)
+	param: source      The source path
+	"""
+	rv = list()
+	index = 1
+	while index < len(arguments):
+		arg = arguments[index]
+		if arg in _SKIPPED_WITH_VALUE:
+			index += 2
+			continue
+		if arg not in _SKIPPED and arg != source and not arg.startswith("-Wa,"):
+			rv.append(arg)
+		index += 1
+
+	return rv
+
+
+def analyzer_command(analyzer, entry, extra_args=()):
+	"""
+	Composes the analyzer command of a unit
+
+	param: analyzer     One of ANALYZERS
+	param: entry        The compilation database entry of the unit
+	param: extra_args   Options of the user, given to the analyzer
+
+	Returns the argument list
+	"""
+	source = entry["file"]
+	arguments = entry["arguments"]
+	if analyzer == "clang-tidy":
+		options = compiler_options(arguments, source)
+		return ["clang-tidy", "--quiet"] + list(extra_args) + [source, "--"] + options
+
+	options = preprocessor_options(arguments)
+	if analyzer == "cppcheck":
+		rv = [
+			"cppcheck", "--quiet", "--enable=warning,style,performance,portability",
+			"--template={file}:{line}:{column}: {severity}: {message} [{id}]"]
+		if os.path.isfile("cppcheck-suppressions.txt"):
+			rv.append("--suppressions-list=cppcheck-suppressions.txt")
+		for option, value in options:
+			if option == "-std":
+				rv.append(f"--std={value}")
+			elif option in ("-I", "-isystem", "-iquote"):
+				rv += ["-I", value]
+			elif option == "-include":
+				rv.append(f"--include={value}")
+			else:
+				rv.append(f"{option}{value}")
+		return rv + list(extra_args) + [source]
+
+	if analyzer == "flint":
+		# One module (-u), no banner (-b), one line per message in the GCC format
+		rv = ["flint", "-b", "-u", "-width(0)", "-format=%f:%l:%c: %t: %m [-e%n]"]
+		rv += [f for f in CONFIG_FILES["flint"] if os.path.isfile(f)]
+		for option, value in options:
+			if option in ("-I", "-isystem", "-iquote"):
+				rv.append(f"-i{value}")
+			elif option == "-D":
+				rv.append(f"-d{value}")
+			elif option == "-U":
+				rv.append(f"-u{value}")
+		return rv + list(extra_args) + [source]
+
+	raise UserInputError(f"Unknown analyzer '{analyzer}'. Please use one of: {', '.join(ANALYZERS)}")
+
+
+class _ContentHashes:
+	"""
+	Hashes of file contents, each file read once
+	"""
+
+	def __init__(self):
+		self._hashes = dict()
+
+	def __call__(self, path):
+		if path not in self._hashes:
+			try:
+				with open(path, "rb") as f:
+					self._hashes[path] = hashlib.sha1(f.read()).hexdigest()
+			except OSError:
+				self._hashes[path] = "missing"
+		return self._hashes[path]
+
+
+class Linter:
+	"""
+	Analyzes the translation units of a port and target
+	"""
+
+	def __init__(self, analyzer, directory, extra_args=()):
+		"""
+		param: analyzer     One of ANALYZERS
+		param: directory    Where the cache and the reports are written (tmp/<port>/<target>/lint)
+		param: extra_args   Options of the user, given to the analyzer
+		"""
+		if analyzer not in ANALYZERS:
+			raise UserInputError(f"Unknown analyzer '{analyzer}'. Please use one of: {', '.join(ANALYZERS)}")
+		self.analyzer = analyzer
+		self.directory = directory
+		self.extra_args = list(extra_args)
+		self.cache_path = os.path.join(directory, f"{analyzer}.json")
+		self._hash = _ContentHashes()
+
+	def _config_key(self):
+		"""
+		Hash of the analyzer version and of its configuration files
+		"""
+		version = run_command2(f"{self.analyzer} --version") or ""
+		state = [version] + self.extra_args
+		for path in CONFIG_FILES[self.analyzer]:
+			state.append(f"{path} {self._hash(path)}")
+
+		return hashlib.sha1("\n".join(state).encode()).hexdigest()
+
+	def unit_key(self, entry, command, config_key, scanner):
+		"""
+		Hash of everything the analysis of a unit depends on
+
+		param: entry        The compilation database entry of the unit
+		param: command      The analyzer command (list)
+		param: config_key   See _config_key
+		param: scanner      The includes.IncludeScanner
+		"""
+		source = entry["file"]
+		state = [config_key, json.dumps(command), f"{source} {self._hash(source)}"]
+		for header in scanner.headers(source, " ".join(entry["arguments"])):
+			state.append(f"{header} {self._hash(header)}")
+
+		return hashlib.sha1("\n".join(state).encode()).hexdigest()
+
+	def _cache(self):
+		"""
+		The results of the previous runs {source: {"key", "returncode", "output"}}
+		"""
+		return read_json(self.cache_path)
+
+	def run(self, entries, jobs=None, use_cache=True):
+		"""
+		Analyzes the units
+
+		param: entries     The compilation database entries (see compiledb.compile_entries)
+		param: jobs        How many analyzers run at once or None for all CPUs
+		param: use_cache   False to analyze every unit again
+
+		Returns the exit code: 0 if the analyzer succeeded on every unit
+		"""
+		if shutil.which(self.analyzer) is None:
+			raise UserInputError(f"'{self.analyzer}' was not found. Please install it")
+
+		scanner = IncludeScanner()
+		config_key = self._config_key()
+		cache = self._cache() if use_cache else dict()
+		results = dict()
+		pending = list()
+		for entry in entries:
+			source = entry["file"]
+			command = analyzer_command(self.analyzer, entry, self.extra_args)
+			key = self.unit_key(entry, command, config_key, scanner)
+			cached = cache.get(source)
+			if cached is not None and cached.get("key") == key:
+				results[source] = cached
+			else:
+				pending.append((source, command, key))
+		scanner.save()
+
+		outputs = process.run_all(
+			[command for _, command, _ in pending],
+			max_jobs=jobs or os.cpu_count() or 1,
+			capture=True,
+			stdin=subprocess.DEVNULL)
+		for (source, _, key), result in zip(pending, outputs):
+			if isinstance(result, Exception):
+				raise UserInputError(f"'{self.analyzer}' could not run: {result}")
+			results[source] = {"key": key, "returncode": result.returncode, "output": result.output}
+
+		# The units that were removed are forgotten
+		with AtomicWriter(self.cache_path) as f:
+			json.dump(results, f, indent=1, sort_keys=True)
+
+		rv = 0
+		for entry in entries:
+			result = results[entry["file"]]
+			if result["output"].strip():
+				print(result["output"], end="" if result["output"].endswith("\n") else "\n")
+			if result["returncode"] != 0:
+				rv = 1
+
+		outputs = [(source, result["output"]) for source, result in sorted(results.items())]
+		records = merge_diagnostics(outputs)
+		write_reports(records, self.directory, tool=self.analyzer)
+		print(format_diagnostics(records), end="")
+		cached = len(entries) - len(pending)
+		print(f"{self.analyzer}: {len(entries)} units, {len(pending)} analyzed, {cached} cached")
+
+		return rv
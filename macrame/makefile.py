@@ -5,25 +5,100 @@ Make and makefile manager
 """
 
 import os
+import sys
+import json
+import time
+import shlex
+import hashlib
+import contextlib
 from abc import ABC
 from abc import abstractmethod
 from .core.exceptions import UserInputError
+from .core.jobserver import Jobserver
+from .core.utils import in_root
 from .core.utils import run_command
+from .core.utils import run_command2
 from .core.utils import listPortNames
 from .resource import get_abs_resourse_path
+from .diagnostics import collect_diagnostics
+from .diagnostics import find_outputs
+from .diagnostics import format_diagnostics
+from .diagnostics import job_outputs
+from .diagnostics import write_reports
+from .gitversion import generate_version_header
+from .includes import IncludeScanner
+from .pch import PrecompiledHeader
+from .pch import select_headers
+from .scheduler import BuildHistory
+from .scheduler import Job
+from .scheduler import Scheduler
+from .scheduler import instantiate
+from .size import SizeStore
+from .unity import is_excluded
+from .unity import plan_batches
+from .unity import write_unity_files
+from .size import take_snapshot
 
+# Default of the port arguments: the selected port
+USE_PORT = object()
 
-def is_makefile_exist():
+# Directories whose contents make the source lists (headers are in the dependency files)
+LAYOUT_DIRECTORIES = ["src", "port", "tests"]
+
+
+def is_makefile_exist(directory=None):
 	"""
 	Checks is a local Makefile exists in the current working directory
+
+	param: directory   The project directory or None for the current one
 	"""
 	rv = False
-	if os.path.isfile("Makefile"):
+	if os.path.isfile(os.path.join(directory or ".", "Makefile")):
 		rv = True
 
 	return rv
 
 
+def _tree_state(directory, root=None):
+	"""
+	Modification times of a directory tree
+
+	Adding, removing or renaming a file changes the time of its directory.
+
+	param: directory   The directory, relative to the project
+	param: root        The project directory or None for the current one
+	"""
+	rv = list()
+	for parent_path, dirnames, _ in os.walk(in_root(root, directory)):
+		dirnames.sort()
+		relative = parent_path if root is None else os.path.relpath(parent_path, root)
+		rv.append(f"{relative} {os.stat(parent_path).st_mtime_ns}")
+	return rv
+
+
+def _compile_jobs(values, prefix, outdir, label, aux):
+	"""
+	Composes the compile jobs of the sources of a makefile
+
+	param: values   The queried variables and templates (e.g. 'C_SRCs' and 'COMPILE.CC')
+	param: prefix   Prefix of the variable names ('' or 'TEST_')
+	param: outdir   The directory of the objects
+	param: label    Prefix shown in the output
+	param: aux      Files that the objects also depend on
+	"""
+	rv = list()
+	for kind, extension in (("AS", ".s"), ("CC", ".c"), ("CXX", ".cpp")):
+		sources = values[f"{prefix}{kind}_SRCs" if kind != "CC" else f"{prefix}C_SRCs"].split()
+		for source in sorted(set(sources)):
+			if not source.endswith(extension):
+				continue
+			output = f"{outdir}{source[:-len(extension)]}.o"
+			command = instantiate(values[f"{prefix}COMPILE.{kind}"], [source], output)
+			rv.append(Job(kind, label, output, [source], command, aux))
+
+	return rv
+
+
 class BuildManager(ABC):
 	"""
 	Abstract for managing the builds
@@ -53,70 +128,513 @@ class MakefileBuildManager(BuildManager):
 	Manages the way that Make is called
 	"""
 
-	def __init__(self, port_name=None, use_local_makefile=True):
+	def __init__(self, port_name=None, use_local_makefile=True, target="dbg", directory=None):
 		"""
 		Initialization
 
 		param: port_name   The name of the port.
 		param: use_local_makefile   True to select local makefile. False to select static makefile.
+		param: target   The build configuration (dbg or rel).
+		param: directory   The project directory or None for the current one.
+		                   The make commands run there. The paths stay relative to it.
 		"""
+		self.directory = directory
 		# Select makefile
 		if port_name == "":
 			self.port_name = None
 		else:
 			self.port_name = port_name
 
+		self.target = target
+
 		# Decide upon local or remote makefile
 		self.makefile_path = get_abs_resourse_path("Makefile/Makefile")
-		if is_makefile_exist() is True and use_local_makefile is True:
+		if is_makefile_exist(directory) is True and use_local_makefile is True:
 			self.makefile_path = "Makefile"
 
 		# List ports
-		self.ports = listPortNames()
+		self.ports = listPortNames(directory)
+
+		# Seconds spent in every step of the last build (see phase)
+		self.phases = dict()
+
+		# The diagnostics of the last build (see report_diagnostics)
+		self.diagnostics = list()
+
+		# The objects of the jobs of the last build or None when make composed them alone
+		self.objects = None
+
+		# The queried compiler environments per variables (see compiler_environment)
+		self._environments = dict()
 
 		# Validation
 		if self.port_name is not None and self.ports is None:
 			raise UserInputError(f"Port name '{self.port_name}' is not available")
 
-	def build(self):
+	@property
+	def port(self):
 		"""
-		Builds the project
+		The port that is built when none is selected is the first available
 		"""
-		cmd = None
+		rv = None
 		if self.ports is None:
-			cmd = f"make -f {self.makefile_path}"
-		elif self.port_name is None and self.ports is not None:
-			cmd = f"make -f {self.makefile_path} PORT_NAME={self.ports[0]}"
+			pass
+		elif self.port_name is None:
+			rv = self.ports[0]
 		elif self.port_name in self.ports:
-			cmd = f"make -f {self.makefile_path} PORT_NAME={self.port_name}"
+			rv = self.port_name
 		else:
 			raise UserInputError(f"Port name '{self.port_name}' was not found in available ports")
 
-		rv = run_command(cmd)
+		return rv
+
+	@property
+	def bin_outdir(self):
+		"""
+		Directory of the build artifacts (BIN_OUTDIR of the makefile)
+		"""
+		if self.port is None:
+			return "bin"
+		return os.path.join("bin", self.port, self.target)
+
+	@property
+	def tmp_outdir(self):
+		"""
+		Directory of the intermediate files of the port and target
+		"""
+		if self.port is None:
+			return "tmp"
+		return os.path.join("tmp", self.port, self.target)
+
+	@property
+	def obj_outdir(self):
+		"""
+		Directory of the objects (OBJ_OUTDIR of the makefile)
+		"""
+		return os.path.join(self.tmp_outdir, "obj")
+
+	@property
+	def history_path(self):
+		"""
+		The measurements of the previous builds (see scheduler.BuildHistory)
+		"""
+		return os.path.join(self.tmp_outdir, "history.json")
+
+	@property
+	def elf_path(self):
+		"""
+		The path of the linked program
+		"""
+		project_name = os.path.basename(os.path.abspath(self.directory or os.getcwd()))
+		return os.path.join(self.bin_outdir, f"{project_name}.elf")
+
+	def make_command(self, goal=None, variables=None, makefile=None, port=USE_PORT):
+		"""
+		Composes the make command line
+
+		param: goal        The make goal or None for the default one
+		param: variables   Dictionary of extra make variables
+		param: makefile    The makefile or None for the selected one
+		param: port        The port name or None for no port. The selected one by default.
+		"""
+		if port is USE_PORT:
+			port = self.port
+		macrame = shlex.quote(f"{sys.executable} -m macrame")
+		cmd = f"make -f {makefile or self.makefile_path} MACRAME={macrame}"
+		if port is not None:
+			cmd += f" PORT_NAME={port}"
+		cmd += f" TARGET={self.target}"
+		for name, value in (variables or dict()).items():
+			cmd += f" {name}={shlex.quote(str(value))}"
+		if goal is not None:
+			cmd += f" {goal}"
+
+		return cmd
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		"""
+		Measures a step of the build, its time is added in self.phases
+
+		param: name   The step name (e.g. 'make')
+		"""
+		start = time.monotonic()
+		try:
+			yield
+		finally:
+			self.phases[name] = self.phases.get(name, 0.0) + time.monotonic() - start
+
+	def fingerprint(self, files, variables):
+		"""
+		Hash of everything the jobs are generated from (see jobs)
+
+		It changes when a makefile, the toolchain or the layout (a source
+		directory) changes, so the generated files can skip the queries.
+
+		param: files       The makefiles and other files the commands come from
+		param: variables   Dictionary of extra make variables
+		"""
+		state = [
+			self.makefile_path, self.target, str(self.port), json.dumps(variables or dict(), sort_keys=True)]
+		for directory in LAYOUT_DIRECTORIES:
+			if os.path.isdir(in_root(self.directory, directory)):
+				state += _tree_state(directory, self.directory)
+		for path in files:
+			try:
+				stat = os.stat(in_root(self.directory, path))
+				state.append(f"{path} {stat.st_mtime_ns} {stat.st_size}")
+			except OSError:
+				state.append(f"{path} missing")
+
+		return hashlib.sha1("\n".join(state).encode()).hexdigest()
+
+	def query(self, *names, goal="printvars", makefile=None, port=USE_PORT, variables=None):
+		"""
+		Reads the values of makefile variables
+
+		param: names      The variable names
+		param: goal       'printvars' for values or 'printtemplates' for command templates
+		param: makefile   The makefile or None for the selected one
+		param: port       The port name or None for no port. The selected one by default.
+		param: variables  Dictionary of extra make variables
+
+		Returns a dictionary {name: value}
+		"""
+		variables = dict(variables or dict(), VARS=" ".join(names))
+		cmd = self.make_command(goal, variables, makefile=makefile, port=port)
+		output = run_command2(f"{cmd} --no-print-directory -s", cwd=self.directory) or ""
+
+		rv = dict.fromkeys(names, "")
+		for line in output.splitlines():
+			name, separator, value = line.partition("=")
+			if separator and name in rv:
+				rv[name] = value.strip()
 
 		return rv
 
+	def compiler_environment(self, variables=None):
+		"""
+		The variables that the makefiles export for the compiler (e.g. CCACHE_DIR)
+
+		They are queried once per manager and variables.
+
+		param: variables   Dictionary of extra make variables
+
+		Returns a dictionary {name: value} of the ones that are set
+		"""
+		key = json.dumps(variables or dict(), sort_keys=True)
+		if key not in self._environments:
+			exported = self.query("CCACHE_DIR", "CCACHE_SLOPPINESS", variables=variables)
+			self._environments[key] = {name: value for name, value in exported.items() if value}
+		return self._environments[key]
+
+	def jobs(self, variables=None):
+		"""
+		Composes the compile and link jobs of the program and of the unit test runner
+
+		The commands are the makefile ones ('printtemplates'), so the
+		objects are the same that make would produce.
+
+		param: variables   Dictionary of extra make variables
+
+		Returns the list of jobs or None if the makefile does not provide the templates
+		"""
+		templates = ["COMPILE.AS", "COMPILE.CC", "COMPILE.CXX", "LINK"]
+		names = [
+			"PROJ_NAME", "BIN_OUTDIR", "OBJ_OUTDIR", "AUX", "AS_SRCs", "C_SRCs", "CXX_SRCs",
+			"TESTSMK_FILEPATH", "MACRAME", "RUN_TESTS"]
+		values = self.query(*names, variables=variables)
+		values.update(self.query(*templates, goal="printtemplates", variables=variables))
+		if any(values[name] == "" for name in templates + ["PROJ_NAME", "OBJ_OUTDIR"]):
+			return None
+
+		label = f"[{self.port or values['PROJ_NAME']}]"
+		aux = values["AUX"].split()
+		objects = _compile_jobs(values, "", values["OBJ_OUTDIR"], label, aux)
+		elf_path = f"{values['BIN_OUTDIR']}{values['PROJ_NAME']}.elf"
+		link = Job("LD", label, elf_path, [job.output for job in objects], "")
+		link.command = instantiate(values["LINK"], link.inputs, link.output)
+		rv = objects + [link]
+
+		# Bin, hex and symbols (the stamp of the makefile rule)
+		stem = f"{values['BIN_OUTDIR']}{values['PROJ_NAME']}"
+		stamp = f"{values['OBJ_OUTDIR']}{values['PROJ_NAME']}.converted"
+		products = [f"{stem}.bin", f"{stem}.hex", f"{stem}.sym"]
+		command = (
+			f"{values['MACRAME']} convert {link.output} "
+			f"--bin {products[0]} --hex {products[1]} --sym {products[2]} && touch {stamp}")
+		rv.append(Job("OC", label, stamp, [link.output], command, products=products))
+
+		has_tests = os.path.isdir(in_root(self.directory, "tests")) and values["TESTSMK_FILEPATH"]
+		if has_tests and values["RUN_TESTS"] != "no":
+			test_port = None if self.port is None else "posix"
+			test_values = self.query(
+				"TEST_OUTDIR", "TEST_RUNNER", "BIN_OUTDIR", "TEST_AS_SRCs", "TEST_C_SRCs", "TEST_CXX_SRCs",
+				"AUX", makefile=values["TESTSMK_FILEPATH"], port=test_port, variables=variables)
+			test_values.update(self.query(
+				"TEST_COMPILE.AS", "TEST_COMPILE.CC", "TEST_COMPILE.CXX", "TEST_LINK",
+				goal="printtemplates", makefile=values["TESTSMK_FILEPATH"], port=test_port,
+				variables=variables))
+			if test_values["TEST_LINK"] and test_values["TEST_OUTDIR"]:
+				aux = test_values["AUX"].split()
+				objects = _compile_jobs(test_values, "TEST_", test_values["TEST_OUTDIR"], "[TEST]", aux)
+				output = test_values["TEST_RUNNER"]
+				if not output:
+					output = f"{test_values['BIN_OUTDIR']}{values['PROJ_NAME']}_runTests"
+				link = Job("LD", "[TEST]", output, [job.output for job in objects], "")
+				link.command = instantiate(test_values["TEST_LINK"], link.inputs, link.output)
+				rv += objects + [link]
+
+		for job in rv:
+			if not job.is_compile:
+				for dep in rv:
+					if dep.output in job.inputs:
+						job.deps.append(dep)
+						dep.consumers.append(job)
+
+		return rv
+
+	def test_runner(self, variables=None):
+		"""
+		Finds the unit test runner of the target
+
+		The tests are built for the host (the posix port when the project has ports).
+
+		param: variables   Dictionary of extra make variables (e.g. COVERAGE=yes)
+
+		Returns a tuple (tests.mk path, runner path, objects directory, runner options)
+		or None if the project has no tests
+		"""
+		if not os.path.isdir(in_root(self.directory, "tests")):
+			return None
+		testsmk_path = self.query("TESTSMK_FILEPATH", variables=variables)["TESTSMK_FILEPATH"]
+		if not testsmk_path:
+			return None
+
+		test_port = None if self.port is None else "posix"
+		values = self.query(
+			"TEST_RUNNER", "TEST_OUTDIR", "TEST_ARGS",
+			makefile=testsmk_path, port=test_port, variables=variables)
+		if not values["TEST_RUNNER"]:
+			return None
+
+		runner_args = shlex.split(values["TEST_ARGS"])
+		return testsmk_path, values["TEST_RUNNER"], values["TEST_OUTDIR"], runner_args
+
+	def build_tests(self, testsmk_path, variables=None, jobs=None):
+		"""
+		Builds the unit test runner
+
+		param: testsmk_path   The tests makefile (see test_runner)
+		param: variables      Dictionary of extra make variables
+		param: jobs           Number of parallel make jobs or None for a serial build
+
+		Returns the exit code
+		"""
+		test_port = None if self.port is None else "posix"
+		cmd = self.make_command("testRunner", variables, makefile=testsmk_path, port=test_port)
+		cmd = shlex.split(cmd)
+		if jobs is not None:
+			cmd += [f"-j{jobs}", "--output-sync=target"]
+		env = dict(os.environ)
+		env.pop("MAKELEVEL", None)
+
+		return run_command(cmd, env=env, cwd=self.directory)
+
+	def prepare_pch(self, variables=None):
+		"""
+		Builds the precompiled headers of the port and target
+
+		param: variables   Dictionary of extra make variables
+
+		Returns a tuple (variables with PCH_CC/PCH_CXX, exit code)
+		"""
+		variables = dict(variables or dict())
+		jobs = self.jobs(variables)
+		if jobs is None:
+			return variables, 0
+
+		scanner = IncludeScanner(root=self.directory)
+		templates = self.query("COMPILE.CC", "COMPILE.CXX", goal="printtemplates", variables=variables)
+		for kind in ("CC", "CXX"):
+			compiles = [job for job in jobs if job.kind == kind and job.label != "[TEST]"]
+			headers = select_headers(compiles, scanner)
+			if not headers:
+				continue
+			pch = PrecompiledHeader(self.obj_outdir, kind, templates[f"COMPILE.{kind}"], root=self.directory)
+			rv = pch.build(headers)
+			if rv != 0:
+				return variables, rv
+			variables[f"PCH_{kind}"] = pch.header_path
+
+		scanner.save()
+		return variables, 0
+
+	def prepare_unity(self, count, variables=None):
+		"""
+		Writes the unity files of the port and target
+
+		The source lists of the makefile (C_SRCs, CXX_SRCs) are replaced
+		by the unity files and the sources matching UNITY_EXCLUDE.
+
+		param: count       The number of unity files per language
+		param: variables   Dictionary of extra make variables
+
+		Returns the variables with the new source lists
+		"""
+		if self.target != "rel":
+			raise UserInputError("Unity builds are only available for the 'rel' target")
+
+		variables = dict(variables or dict())
+		values = self.query("C_SRCs", "CXX_SRCs", "UNITY_EXCLUDE", "OBJ_OUTDIR", variables=variables)
+		excluded = values["UNITY_EXCLUDE"].split()
+		history = BuildHistory(in_root(self.directory, self.history_path))
+		directory = os.path.join(self.tmp_outdir, "unity")
+
+		for name, variable, extension in (("cc", "C_SRCs", ".c"), ("cxx", "CXX_SRCs", ".cpp")):
+			sources = values[variable].split()
+			batched = [s for s in sources if s.endswith(extension) and not is_excluded(s, excluded)]
+			alone = [s for s in sources if s not in batched]
+
+			# Balance by the compile times of the previous builds, or else by size
+			weights = dict()
+			for source in batched:
+				obj_path = f"{values['OBJ_OUTDIR']}{source[:-len(extension)]}.o"
+				weights[source] = history.get(obj_path, "duration")
+			if None in weights.values():
+				weights = {source: os.path.getsize(in_root(self.directory, source)) for source in batched}
+
+			batches = plan_batches(batched, weights, count)
+			unity_files = write_unity_files(directory, name, extension, batches, root=self.directory)
+			variables[variable] = " ".join(unity_files + alone)
+
+		return variables
+
+	def build(
+			self, variables=None, jobs=None, max_load=None, explain=False, pch=False, unity=None,
+			env=None):
+		"""
+		Builds the project
+
+		With parallel jobs, the objects and the programs are built by the
+		scheduler of macrame, longest path first, and make completes the rest.
+		The jobs of a parent make jobserver are joined, otherwise macrame is
+		the jobserver of the make processes.
+
+		param: variables   Dictionary of extra make variables
+		param: jobs        Number of parallel jobs or None for a serial build
+		param: max_load    No new job starts while the load average is above it
+		param: explain     Print why every job runs (uses the scheduler)
+		param: pch         Precompile the most included headers
+		param: unity       Number of unity files per language or None for no unity build
+		param: env         The environment of the commands or None for the one of the process
+		"""
+		rv = 0
+		self.phases = dict()
+		self.objects = None
+		build_jobs = None
+		requested = variables
+		if explain and jobs is None:
+			jobs = 1
+		with self.phase("prepare"):
+			if unity is not None:
+				variables = self.prepare_unity(unity, variables)
+			if pch:
+				variables, rv = self.prepare_pch(variables)
+		if rv != 0:
+			return rv
+		cmd = self.make_command(variables=variables)
+		env = dict(env or os.environ)
+
+		# Join the jobserver of a parent make or serve the child makes
+		jobserver = Jobserver.inherit(env.get("MAKEFLAGS", ""))
+		if jobserver is not None:
+			# The tokens of the parent limit the jobs
+			jobs = os.cpu_count() or 1
+		elif jobs is not None:
+			jobserver = Jobserver.create(jobs)
+
+		with jobserver or contextlib.nullcontext():
+			if jobs is not None:
+				cmd += " --output-sync=target"
+				if max_load is not None:
+					cmd += f" -l{max_load}"
+				with self.phase("schedule"):
+					build_jobs = self.jobs(variables)
+					if build_jobs is not None:
+						generate_version_header(path=self.directory or ".")
+						# The source lists of the preparation do not change it
+						job_env = dict(env, **self.compiler_environment(requested))
+						history = BuildHistory(in_root(self.directory, self.history_path))
+						scheduler = Scheduler(
+							build_jobs, history, max_jobs=jobs, env=job_env, max_load=max_load, jobserver=jobserver,
+							scanner=IncludeScanner(root=self.directory), explain=explain, root=self.directory)
+						rv = scheduler.run()
+
+			pass_fds = ()
+			if jobserver is not None:
+				env["MAKEFLAGS"] = jobserver.makeflags()
+				pass_fds = jobserver.pass_fds
+				# The makefiles read the dependencies only at the top level
+				env.pop("MAKELEVEL", None)
+			if rv == 0:
+				with self.phase("make"):
+					rv = run_command(shlex.split(cmd), env=env, pass_fds=pass_fds, cwd=self.directory)
+
+		with self.phase("report"):
+			outputs = None
+			if build_jobs is not None:
+				outputs = job_outputs(build_jobs)
+				self.objects = [job.output for job in build_jobs if job.is_compile]
+			self.diagnostics = self.report_diagnostics(outputs)
+			if rv == 0 and os.path.isfile(in_root(self.directory, self.elf_path)):
+				self.record_size()
+
+		return rv
+
+	def report_diagnostics(self, outputs=None):
+		"""
+		Writes the diagnostics of the port and target and prints their summary
+
+		param: outputs   The '.err' files of the build (see diagnostics.job_outputs)
+		                 or None to search the object and program directories.
+		                 The makefiles are not queried again for them.
+
+		Returns the records (see diagnostics.collect_diagnostics)
+		"""
+		if outputs is None:
+			outputs = find_outputs([self.obj_outdir], [self.bin_outdir], root=self.directory)
+
+		records = collect_diagnostics(outputs, root=self.directory)
+		write_reports(records, in_root(self.directory, self.tmp_outdir))
+		print(format_diagnostics(records), end="")
+
+		return records
+
+	def record_size(self):
+		"""
+		Records the size snapshot of the linked program
+		"""
+		self.size_store().record(take_snapshot(in_root(self.directory, self.elf_path)))
+
+	def size_store(self):
+		"""
+		The size snapshots of the port and target
+		"""
+		directory = in_root(self.directory, os.path.join(self.tmp_outdir, "size"))
+		return SizeStore(directory, root=self.directory)
+
 	def clean(self):
 		"""
 		Cleans the project's generated files
 		"""
-		rv = run_command(f"make -f {self.makefile_path} clean")
+		rv = run_command(["make", "-f", self.makefile_path, "clean"], cwd=self.directory)
 		return rv
 
 	def run(self):
 		"""
 		Executes the program under development
 		"""
-		cmd = None
-		if self.ports is None:
-			cmd = f"make -f {self.makefile_path} run"
-		elif self.port_name is None and self.ports is not None:
-			cmd = f"make -f {self.makefile_path} PORT_NAME={self.ports[0]} run"
-		elif self.port_name in self.ports:
-			cmd = f"make -f {self.makefile_path} PORT_NAME={self.port_name} run"
-		else:
-			raise UserInputError(f"Port name '{self.port_name}' was not found in available ports")
-
-		rv = run_command(cmd)
+		rv = run_command(shlex.split(self.make_command("run")), cwd=self.directory)
 
 		return rv
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+"""
+Build matrix
+
+Every port is built for every target ('mac build --all-ports --targets
+dbg,rel'), each one by a 'mac build' process of its own. The processes
+share one jobserver, so the whole matrix runs within one budget of
+parallel jobs: a build starts when a token is free and its compiles take
+the tokens that the other builds do not use.
+
+The output of every build goes to tmp/<port>/<target>/build.log. The unit
+tests are built for the host whatever the port, so they run in only one
+build per target.
+"""
+
+import os
+import sys
+from .core.jobserver import Jobserver
+from .tasks import Task
+from .tasks import format_summary
+from .tasks import run_tasks
+
+# The port whose builds run the unit tests, when available
+TEST_PORT = "posix"
+
+
+class Cell(Task):
+	"""
+	One build of the matrix
+	"""
+
+	def __init__(self, port, target, run_tests=True):
+		"""
+		param: port        The port name or None for a project without ports
+		param: target      The build configuration (dbg or rel)
+		param: run_tests   False to skip the unit tests
+		"""
+		if port is None:
+			super().__init__(target, None, os.path.join("tmp", target, "build.log"))
+		else:
+			super().__init__(f"{port}/{target}", None, os.path.join("tmp", port, target, "build.log"))
+		self.port = port
+		self.target = target
+		self.run_tests = run_tests
+
+
+def plan_cells(ports, targets):
+	"""
+	Lists the builds of the matrix
+
+	The unit tests of a target run in the posix build, or else in the
+	build of the first port.
+
+	param: ports     The port names or None for a project without ports
+	param: targets   The targets
+
+	Returns the list of Cell
+	"""
+	rv = list()
+	for target in targets:
+		if not ports:
+			rv.append(Cell(None, target))
+			continue
+		test_port = TEST_PORT if TEST_PORT in ports else ports[0]
+		rv += [Cell(port, target, run_tests=port == test_port) for port in ports]
+
+	return rv
+
+
+def build_matrix(cells, arguments=(), jobs=None):
+	"""
+	Builds the cells of the matrix concurrently
+
+	param: cells       The builds (see plan_cells)
+	param: arguments   Extra 'mac build' arguments (e.g. ['-b', 'ninja'])
+	param: jobs        The total number of parallel jobs or None for all CPUs
+
+	Returns the exit code: 0 if all the builds succeeded
+	"""
+	for cell in cells:
+		cell.command = [sys.executable, "-m", "macrame", "build", "-t", cell.target] + list(arguments)
+		if cell.port is not None:
+			cell.command += ["-p", cell.port]
+		if not cell.run_tests:
+			cell.command.append("--no-tests")
+
+	jobserver = Jobserver.inherit()
+	if jobserver is None:
+		jobserver = Jobserver.create(jobs or os.cpu_count() or 1)
+	with jobserver:
+		run_tasks(cells, jobserver)
+
+	print()
+	print(format_summary(cells), end="")
+
+	return 0 if all(cell.returncode == 0 for cell in cells) else 1
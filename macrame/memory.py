@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+
+"""
+Stack usage and static RAM analysis
+
+The compiler writes the stack usage of every function (-fstack-usage) in a
+'.su' file and its call graph (-fcallgraph-info=su) in a '.ci' file next to
+each object. Those are combined in a worst case call depth estimate and
+with the static RAM (.data/.bss) of the linked ELF in one memory report.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from .core.elf import ElfFile
+from .core.elf import SHF_ALLOC
+from .core.elf import SHF_WRITE
+from .core.elf import SHT_NOBITS
+
+# Node and edge lines of the VCG call graph
+_CI_NODE_REGEX = re.compile(r'^node: \{ title: "([^"]+)" label: "([^"]*)"')
+_CI_EDGE_REGEX = re.compile(r'^edge: \{ sourcename: "([^"]+)" targetname: "([^"]+)"')
+_CI_STACK_REGEX = re.compile(r'\\n(\d+) bytes \((\w+(?:,\w+)*)\)')
+
+
+def parse_stack_usage(path):
+	"""
+	Parses a '.su' file
+
+	Lines look like 'src/main.c:15:5:main	16	static'
+
+	Returns a dictionary {function: (bytes, qualifiers)}
+	"""
+	rv = dict()
+	with open(path, "r", encoding="utf-8", errors="replace") as f:
+		for line in f:
+			fields = line.rstrip("\n").split("\t")
+			if len(fields) != 3:
+				continue
+			location, size, qualifiers = fields
+			function = location.rsplit(":", 1)[-1]
+			rv[function] = (int(size), qualifiers)
+
+	return rv
+
+
+def parse_call_graph(path):
+	"""
+	Parses a '.ci' file
+
+	Returns a tuple (stack, edges):
+	- stack: {function: (bytes, qualifiers)} of the functions defined in the unit
+	- edges: {caller: set of callees}
+	"""
+	stack = dict()
+	edges = dict()
+	with open(path, "r", encoding="utf-8", errors="replace") as f:
+		for line in f:
+			match = _CI_NODE_REGEX.match(line)
+			if match:
+				usage = _CI_STACK_REGEX.search(match.group(2))
+				if usage:
+					stack[match.group(1)] = (int(usage.group(1)), usage.group(2))
+				continue
+			match = _CI_EDGE_REGEX.match(line)
+			if match:
+				edges.setdefault(match.group(1), set()).add(match.group(2))
+
+	return stack, edges
+
+
+def _parse_unit(paths):
+	"""
+	Parses the stack usage of a translation unit
+
+	The call graph holds the same stack usage as the '.su' file, with
+	static functions named uniquely ('file:function'), so it is
+	preferred when available.
+	"""
+	su_path, ci_path = paths
+	if ci_path is None:
+		return parse_stack_usage(su_path), dict()
+
+	return parse_call_graph(ci_path)
+
+
+def collect_stack_usage(obj_outdir, jobs=None):
+	"""
+	Collects the stack usage and the call graph of all the objects
+
+	The files are parsed in parallel.
+
+	param: obj_outdir   The directory of the objects (OBJ_OUTDIR)
+	param: jobs         Number of parallel workers or None for all CPUs
+
+	Returns a tuple (stack, edges) merged for the whole program
+	"""
+	units = list()
+	for parent_path, _, filenames in os.walk(obj_outdir):
+		for filename in filenames:
+			if filename.endswith(".su"):
+				su_path = os.path.join(parent_path, filename)
+				ci_path = su_path[:-3] + ".ci"
+				units.append((su_path, ci_path if os.path.isfile(ci_path) else None))
+
+	stack = dict()
+	edges = dict()
+	if not units:
+		return stack, edges
+
+	workers = jobs or os.cpu_count() or 1
+	chunksize = max(1, len(units) // (4 * workers))
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for unit_stack, unit_edges in executor.map(_parse_unit, units, chunksize=chunksize):
+			# Static functions may share a name, keep the worst one
+			for function, usage in unit_stack.items():
+				if function not in stack or usage[0] > stack[function][0]:
+					stack[function] = usage
+			for caller, callees in unit_edges.items():
+				edges.setdefault(caller, set()).update(callees)
+
+	return stack, edges
+
+
+class CallDepth:
+	"""
+	Worst case stack depth of the call graph
+	"""
+
+	def __init__(self, stack, edges):
+		"""
+		param: stack   {function: (bytes, qualifiers)}
+		param: edges   {caller: set of callees}
+		"""
+		self.stack = stack
+		self.edges = edges
+		self._depth = dict()
+		self._path = dict()
+		self.recursive = set()
+		self.unknown = set()
+		self.dynamic = set(f for f, (_, q) in stack.items() if q != "static")
+
+	def depth(self, function):
+		"""
+		Returns the worst case stack depth in bytes from a function
+
+		Recursive cycles are counted once. Callees with unknown stack
+		usage (e.g. library functions) count as zero.
+		"""
+		self._visit(function, list())
+		return self._depth[function]
+
+	def path(self, function):
+		"""
+		Returns the call chain that gives the worst case depth
+		"""
+		self.depth(function)
+		rv = list()
+		while function is not None:
+			rv.append(function)
+			function = self._path.get(function)
+		return rv
+
+	def roots(self):
+		"""
+		Returns the functions that are not called by any other function
+		"""
+		called = set()
+		for caller, callees in self.edges.items():
+			called.update(c for c in callees if c != caller)
+		return sorted(f for f in self.stack if f not in called)
+
+	def _visit(self, function, chain):
+		"""
+		Depth first search with memoization
+		"""
+		if function in self._depth:
+			return
+		if function in chain:
+			self.recursive.update(chain[chain.index(function):])
+			return
+
+		if function in self.stack:
+			own = self.stack[function][0]
+		else:
+			own = 0
+			self.unknown.add(function)
+
+		chain.append(function)
+		worst = 0
+		worst_callee = None
+		for callee in sorted(self.edges.get(function, ())):
+			self._visit(callee, chain)
+			depth = self._depth.get(callee, 0)
+			if depth > worst:
+				worst = depth
+				worst_callee = callee
+		chain.pop()
+
+		self._depth[function] = own + worst
+		self._path[function] = worst_callee
+
+
+def static_ram(elf_path):
+	"""
+	Returns the sizes of the writable allocated sections of an ELF
+
+	Returns a dictionary {section: (size, is_bss)}
+	"""
+	rv = dict()
+	with ElfFile(elf_path) as elf:
+		for section in elf.sections:
+			if section.flags & SHF_ALLOC and section.flags & SHF_WRITE and section.size:
+				rv[section.name] = (section.size, section.type == SHT_NOBITS)
+
+	return rv
+
+
+def memory_report(port, obj_outdir, elf_path, ram_size=None, top=10, jobs=None):
+	"""
+	Composes the memory report of a port
+
+	param: port         The port name (only for the title)
+	param: obj_outdir   The directory with the '.su' and '.ci' files
+	param: elf_path     The linked program
+	param: ram_size     The RAM size in bytes or None if unknown
+	param: top          How many entry points to list
+	param: jobs         Number of parallel workers
+
+	Returns a tuple (text, dictionary) with the report
+	"""
+	stack, edges = collect_stack_usage(obj_outdir, jobs=jobs)
+	graph = CallDepth(stack, edges)
+
+	entries = list()
+	for root in graph.roots():
+		entries.append((graph.depth(root), root))
+	entries.sort(reverse=True)
+
+	sections = static_ram(elf_path)
+	data = sum(size for size, is_bss in sections.values() if not is_bss)
+	bss = sum(size for size, is_bss in sections.values() if is_bss)
+	worst_stack = entries[0][0] if entries else 0
+	total = data + bss + worst_stack
+
+	report = {
+		"port": port,
+		"data": data,
+		"bss": bss,
+		"sections": {name: size for name, (size, _) in sections.items()},
+		"stack": worst_stack,
+		"total": total,
+		"ram_size": ram_size,
+		"entries": [{"function": f, "stack": d, "path": graph.path(f)} for d, f in entries[:top]],
+		"recursive": sorted(graph.recursive),
+		"unknown": sorted(graph.unknown),
+		"dynamic": sorted(graph.dynamic),
+	}
+
+	txt = f"Memory report of '{port}'\n\n"
+	txt += f"  .data:          {data:8d} bytes\n"
+	txt += f"  .bss:           {bss:8d} bytes\n"
+	txt += f"  Stack (worst):  {worst_stack:8d} bytes\n"
+	txt += f"  Total:          {total:8d} bytes"
+	if ram_size:
+		txt += f" / {ram_size} ({100 * total // ram_size}%)"
+	txt += "\n\n"
+
+	if not stack:
+		txt += "No stack usage information was found\n"
+	else:
+		txt += "Worst case stack per entry point:\n"
+		for entry in report["entries"]:
+			txt += f"  {entry['stack']:8d}  {' > '.join(entry['path'])}\n"
+	if graph.recursive:
+		txt += "\nRecursive (counted once): " + ", ".join(sorted(graph.recursive)) + "\n"
+	if graph.dynamic:
+		txt += "\nDynamic stack usage: " + ", ".join(sorted(graph.dynamic)) + "\n"
+
+	return txt, report
@@ -0,0 +1,547 @@
+#!/usr/bin/env python
+
+"""
+Build metrics
+
+Every 'mac build' appends a record in an SQLite database of the project
+(tmp/metrics.sqlite): the total time and the time of every step of the
+build (see MakefileBuildManager.phase), how many objects were rebuilt,
+the ccache hits and misses and the flash and RAM that the program uses.
+
+	builds(id, time, commit_hash, port, target, backend, returncode, duration,
+	       rebuilt, objects, cache_hits, cache_misses, flash, ram)
+	phases(build_id, name, duration)
+
+A build is compared with the median of the previous successful builds of
+its port, target and backend (the rolling baseline, WINDOW builds). The
+time is only compared with the builds of the same kind: a no-op build
+with no-op builds, a full build with full builds.
+
+The last build of every port and target can be exported in the
+OpenMetrics text format, for a node exporter textfile collector. Every
+family is a gauge so that the Prometheus text parser reads it as well.
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import statistics
+from .core.elf import ElfFile
+from .core.elf import SHF_ALLOC
+from .core.elf import SHF_WRITE
+from .core.elf import SHT_NOBITS
+from .core.utils import AtomicWriter
+from .core.utils import in_root
+from .gitversion import recorded_commit
+
+DATABASE_PATH = os.path.join("tmp", "metrics.sqlite")
+OPENMETRICS_PATH = os.path.join("tmp", "metrics.prom")
+
+# Number of previous builds in the baseline
+WINDOW = 10
+
+# Fewest previous builds that make a baseline
+MIN_BASELINE = 3
+
+# The regressions that are flagged: (metric, True if a higher value is worse, tolerance in %)
+CHECKS = (
+	("duration", True, 25.0),
+	("cache_hit_rate", False, 20.0),
+	("flash", True, 0.5),
+	("ram", True, 0.5),
+)
+
+# Seconds that a writer waits for a concurrent build (e.g. 'mac build --all-ports')
+_LOCK_TIMEOUT = 30
+
+# Seconds that the modification times of the files may lag behind the clock
+_CLOCK_SLACK = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+	id INTEGER PRIMARY KEY,
+	time REAL NOT NULL,
+	commit_hash TEXT,
+	port TEXT,
+	target TEXT NOT NULL,
+	backend TEXT NOT NULL,
+	returncode INTEGER NOT NULL,
+	duration REAL NOT NULL,
+	rebuilt INTEGER,
+	objects INTEGER,
+	cache_hits INTEGER,
+	cache_misses INTEGER,
+	flash INTEGER,
+	ram INTEGER
+);
+CREATE TABLE IF NOT EXISTS phases (
+	build_id INTEGER NOT NULL REFERENCES builds(id),
+	name TEXT NOT NULL,
+	duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS builds_configuration ON builds(port, target, backend, id);
+"""
+
+_COLUMNS = (
+	"id", "time", "commit_hash", "port", "target", "backend", "returncode", "duration",
+	"rebuilt", "objects", "cache_hits", "cache_misses", "flash", "ram")
+
+
+def firmware_usage(elf_path):
+	"""
+	The flash and RAM that a program uses
+
+	The flash holds the allocated sections with contents (the code, the
+	constants and the initial values of the data), the RAM the writable
+	allocated sections (the data and the bss).
+
+	Returns (flash bytes, RAM bytes)
+	"""
+	flash = 0
+	ram = 0
+	with ElfFile(elf_path) as elf:
+		for section in elf.sections:
+			if not section.flags & SHF_ALLOC:
+				continue
+			if section.type != SHT_NOBITS:
+				flash += section.size
+			if section.flags & SHF_WRITE:
+				ram += section.size
+
+	return flash, ram
+
+
+def read_stats_log(path):
+	"""
+	Reads a ccache statistics log (CCACHE_STATSLOG, ccache 4)
+
+	Every compilation appends a '# <file>' line and the names of its counters.
+
+	Returns (hits, misses) or None if no compilation wrote the log
+	"""
+	hits = 0
+	misses = 0
+	try:
+		with open(path, encoding="utf-8", errors="replace") as f:
+			for line in f:
+				counter = line.strip()
+				if counter in ("direct_cache_hit", "preprocessed_cache_hit"):
+					hits += 1
+				elif counter == "cache_miss":
+					misses += 1
+	except OSError:
+		return None
+
+	return hits, misses
+
+
+def count_outputs(paths, since):
+	"""
+	Counts the outputs of the jobs of a build
+
+	param: paths   The outputs (see MakefileBuildManager.objects)
+	param: since   Time (seconds since the epoch) of the start of the build
+
+	Returns (outputs written since then, outputs)
+	"""
+	rebuilt = 0
+	for path in paths:
+		try:
+			if os.stat(path).st_mtime >= since:
+				rebuilt += 1
+		except OSError:
+			pass
+
+	return rebuilt, len(paths)
+
+
+def count_objects(directories, since):
+	"""
+	Counts the objects of directories
+
+	param: directories   The object directories
+	param: since         Time (seconds since the epoch) of the start of the build
+
+	Returns (objects written since then, objects)
+	"""
+	rebuilt = 0
+	objects = 0
+	for directory in directories:
+		for parent_path, _, filenames in os.walk(directory):
+			for filename in filenames:
+				if not filename.endswith(".o"):
+					continue
+				objects += 1
+				try:
+					if os.stat(os.path.join(parent_path, filename)).st_mtime >= since:
+						rebuilt += 1
+				except OSError:
+					pass
+
+	return rebuilt, objects
+
+
+def build_kind(record):
+	"""
+	The kind of a build: 'noop', 'full' or 'incremental'
+	"""
+	if not record.get("rebuilt"):
+		return "noop"
+	if record["rebuilt"] == record.get("objects"):
+		return "full"
+	return "incremental"
+
+
+def cache_hit_rate(record):
+	"""
+	The part of the compilations that ccache served or None
+	"""
+	hits = record.get("cache_hits")
+	misses = record.get("cache_misses")
+	if hits is None or misses is None or hits + misses == 0:
+		return None
+	return hits / (hits + misses)
+
+
+def _value(record, metric):
+	if metric == "cache_hit_rate":
+		return cache_hit_rate(record)
+	return record.get(metric)
+
+
+def find_regressions(records, window=WINDOW, checks=CHECKS):
+	"""
+	Compares the last build with the rolling baseline
+
+	param: records   The builds of a configuration, oldest first
+	param: window    The number of previous builds in the baseline
+	param: checks    See CHECKS
+
+	Returns a list of tuples (metric, value, baseline, change in %)
+	"""
+	if not records or records[-1]["returncode"] != 0:
+		return list()
+	last = records[-1]
+	previous = [record for record in records[:-1] if record["returncode"] == 0][-window:]
+
+	rv = list()
+	for metric, higher_is_worse, tolerance in checks:
+		value = _value(last, metric)
+		baseline = previous
+		if metric == "duration":
+			baseline = [record for record in previous if build_kind(record) == build_kind(last)]
+		values = [v for v in (_value(record, metric) for record in baseline) if v is not None]
+		if value is None or len(values) < MIN_BASELINE:
+			continue
+		median = statistics.median(values)
+		if median == 0:
+			continue
+		change = 100 * (value - median) / median
+		if (change > tolerance) if higher_is_worse else (change < -tolerance):
+			rv.append((metric, value, median, change))
+
+	return rv
+
+
+class BuildRecorder:
+	"""
+	Measures a build and appends its record
+
+		recorder = BuildRecorder(manager, "make")
+		rv = manager.build(variables, env=recorder.env)
+		recorder.record(rv)
+
+	When ccache is enabled, its compilations log their counters in the
+	temporary directory of the port and target (CCACHE_STATSLOG), so the
+	hit rate is that of the build alone. The commit is the one that the
+	version header recorded and the objects are those of the jobs of the
+	build: the makefiles are not queried again.
+	"""
+
+	def __init__(self, manager, backend, path=DATABASE_PATH):
+		"""
+		param: manager   The MakefileBuildManager of the build, not started yet
+		param: backend   The build tool ('make' or 'ninja')
+		param: path      The database
+		"""
+		self.manager = manager
+		self.backend = backend
+		self.store = MetricsStore(path)
+		# The environment of the build
+		self.env = None
+		self.stats_log = None
+		if shutil.which("ccache") is not None and not os.environ.get("CCACHE_DISABLE"):
+			self.stats_log = os.path.abspath(
+				in_root(manager.directory, os.path.join(manager.tmp_outdir, "ccache-stats.log")))
+			# ccache appends to the log but does not create its directory
+			os.makedirs(os.path.dirname(self.stats_log), exist_ok=True)
+			try:
+				os.remove(self.stats_log)
+			except FileNotFoundError:
+				pass
+			self.env = dict(os.environ, CCACHE_STATSLOG=self.stats_log)
+		# The file times come from a coarse clock that lags a little behind
+		self.start = time.time() - _CLOCK_SLACK
+		self.clock = time.monotonic()
+
+	def record(self, returncode):
+		"""
+		Appends the record of the finished build
+
+		param: returncode   The exit code of the build
+
+		Returns the record
+		"""
+		manager = self.manager
+		record = {
+			"time": time.time(),
+			"commit_hash": recorded_commit(path=manager.directory or "."),
+			"port": manager.port,
+			"target": manager.target,
+			"backend": self.backend,
+			"returncode": returncode,
+			"duration": time.monotonic() - self.clock,
+			"phases": dict(manager.phases),
+			"cache_hits": None,
+			"cache_misses": None,
+			"flash": None,
+			"ram": None,
+		}
+		if manager.objects is not None:
+			record["rebuilt"], record["objects"] = count_outputs(
+				[in_root(manager.directory, path) for path in manager.objects], self.start)
+		else:
+			record["rebuilt"], record["objects"] = count_objects(
+				[in_root(manager.directory, manager.obj_outdir)], self.start)
+		if self.stats_log is not None:
+			counters = read_stats_log(self.stats_log)
+			if counters is not None:
+				record["cache_hits"], record["cache_misses"] = counters
+		elf_path = in_root(manager.directory, manager.elf_path)
+		if returncode == 0 and os.path.isfile(elf_path):
+			record["flash"], record["ram"] = firmware_usage(elf_path)
+
+		record["id"] = self.store.append(record)
+		return record
+
+
+class MetricsStore:
+	"""
+	The build records of a project
+	"""
+
+	def __init__(self, path=DATABASE_PATH):
+		"""
+		param: path   The SQLite database
+		"""
+		self.path = path
+
+	def _connect(self):
+		"""
+		Opens the database and creates its tables
+		"""
+		directory = os.path.dirname(self.path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		connection = sqlite3.connect(self.path, timeout=_LOCK_TIMEOUT)
+		connection.row_factory = sqlite3.Row
+		connection.executescript(_SCHEMA)
+		return connection
+
+	def append(self, record):
+		"""
+		Appends a build record
+
+		param: record   The values of the columns and the phase times {"phases": {name: seconds}}
+
+		Returns the id of the record
+		"""
+		columns = [column for column in _COLUMNS if column != "id"]
+		connection = self._connect()
+		try:
+			with connection:
+				cursor = connection.execute(
+					f"INSERT INTO builds ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+					[record.get(column) for column in columns])
+				build_id = cursor.lastrowid
+				connection.executemany(
+					"INSERT INTO phases (build_id, name, duration) VALUES (?, ?, ?)",
+					[(build_id, name, duration) for name, duration in record.get("phases", dict()).items()])
+		finally:
+			connection.close()
+
+		return build_id
+
+	def configurations(self):
+		"""
+		The recorded (port, target, backend) tuples
+		"""
+		if not os.path.isfile(self.path):
+			return list()
+		connection = self._connect()
+		try:
+			rows = connection.execute(
+				"SELECT DISTINCT port, target, backend FROM builds ORDER BY port, target, backend").fetchall()
+		finally:
+			connection.close()
+
+		return [tuple(row) for row in rows]
+
+	def builds(self, port, target, backend, limit=None):
+		"""
+		The records of a configuration, oldest first
+
+		param: limit   The number of most recent records or None for all
+
+		Returns a list of records (see append)
+		"""
+		if not os.path.isfile(self.path):
+			return list()
+		connection = self._connect()
+		try:
+			rows = connection.execute(
+				f"SELECT {', '.join(_COLUMNS)} FROM builds WHERE port IS ? AND target = ? AND backend = ?"
+				" ORDER BY id DESC LIMIT ?",
+				(port, target, backend, -1 if limit is None else limit)).fetchall()
+			rv = [dict(row) for row in reversed(rows)]
+			for record in rv:
+				phases = connection.execute(
+					"SELECT name, duration FROM phases WHERE build_id = ? ORDER BY rowid", (record["id"],))
+				record["phases"] = dict(phases)
+		finally:
+			connection.close()
+
+		return rv
+
+
+def format_builds(records):
+	"""
+	Formats the records of a configuration as a table
+	"""
+	txt = f"{'Date':<19} {'Commit':<7} {'Result':>6} {'Time':>8} "
+	txt += f"{'Rebuilt':>9} {'Hits':>5} {'Flash':>9} {'RAM':>9}\n"
+	for record in records:
+		date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["time"]))
+		commit = (record["commit_hash"] or "-")[:7]
+		result = "ok" if record["returncode"] == 0 else "failed"
+		rebuilt = f"{record['rebuilt']}/{record['objects']}" if record["objects"] is not None else "-"
+		rate = cache_hit_rate(record)
+		rate = f"{100 * rate:.0f}%" if rate is not None else "-"
+		flash = record["flash"] if record["flash"] is not None else "-"
+		ram = record["ram"] if record["ram"] is not None else "-"
+		txt += f"{date:<19} {commit:<7} {result:>6} {record['duration']:7.2f}s "
+		txt += f"{rebuilt:>9} {rate:>5} {flash:>9} {ram:>9}\n"
+
+	return txt
+
+
+def format_phases(records):
+	"""
+	Formats the median time of every step of the records
+	"""
+	phases = dict()
+	for record in records:
+		for name, duration in record["phases"].items():
+			phases.setdefault(name, list()).append(duration)
+
+	return ", ".join(f"{name} {statistics.median(values):.2f}s" for name, values in phases.items())
+
+
+def format_regressions(regressions):
+	"""
+	Formats the regressions (see find_regressions)
+	"""
+	txt = ""
+	for metric, value, baseline, change in regressions:
+		if metric == "duration":
+			value, baseline = f"{value:.2f}s", f"{baseline:.2f}s"
+		elif metric == "cache_hit_rate":
+			value, baseline = f"{100 * value:.0f}%", f"{100 * baseline:.0f}%"
+		txt += f"  {metric:<15} {value:>10}  baseline {baseline:>10}  {change:+.1f}%\n"
+
+	return txt
+
+
+def _labels(labels):
+	"""
+	Formats the labels of a sample
+	"""
+	def escape(value):
+		return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+	return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def to_openmetrics(project, latest):
+	"""
+	Converts the last builds to the OpenMetrics text format
+
+	param: project   The project name
+	param: latest    A list of tuples (last record, regressions) of the configurations
+
+	Returns the text
+	"""
+	families = {
+		"macrame_build_timestamp_seconds": ("seconds", "Time of the last build", list()),
+		"macrame_build_success": (None, "1 if the last build succeeded", list()),
+		"macrame_build_duration_seconds": ("seconds", "Time of the last build", list()),
+		"macrame_build_phase_duration_seconds": (
+			"seconds", "Time of every step of the last build", list()),
+		"macrame_build_rebuilt_objects": (None, "Objects rebuilt by the last build", list()),
+		"macrame_build_objects": (None, "Objects of the program and of the unit tests", list()),
+		"macrame_build_cache_hit_ratio": (
+			"ratio", "Compilations of the last build served by ccache", list()),
+		"macrame_firmware_flash_bytes": ("bytes", "Flash used by the program", list()),
+		"macrame_firmware_ram_bytes": ("bytes", "Static RAM used by the program", list()),
+		"macrame_build_regression": (
+			None, "1 if the metric regressed against the rolling baseline", list()),
+	}
+
+	def add(name, labels, value):
+		if value is not None:
+			families[name][2].append((labels, value))
+
+	for record, regressions in latest:
+		labels = {
+			"project": project,
+			"port": record["port"] or "",
+			"target": record["target"],
+			"backend": record["backend"]}
+		add("macrame_build_timestamp_seconds", labels, record["time"])
+		add("macrame_build_success", labels, int(record["returncode"] == 0))
+		add("macrame_build_duration_seconds", labels, record["duration"])
+		for phase, duration in record["phases"].items():
+			add("macrame_build_phase_duration_seconds", dict(labels, phase=phase), duration)
+		add("macrame_build_rebuilt_objects", labels, record["rebuilt"])
+		add("macrame_build_objects", labels, record["objects"])
+		add("macrame_build_cache_hit_ratio", labels, cache_hit_rate(record))
+		add("macrame_firmware_flash_bytes", labels, record["flash"])
+		add("macrame_firmware_ram_bytes", labels, record["ram"])
+		regressed = set(metric for metric, _, _, _ in regressions)
+		for metric, _, _ in CHECKS:
+			add("macrame_build_regression", dict(labels, metric=metric), int(metric in regressed))
+
+	txt = ""
+	for name, (unit, description, samples) in families.items():
+		if not samples:
+			continue
+		txt += f"# TYPE {name} gauge\n"
+		if unit is not None:
+			txt += f"# UNIT {name} {unit}\n"
+		txt += f"# HELP {name} {description}.\n"
+		for labels, value in samples:
+			txt += f"{name}{_labels(labels)} {value}\n"
+	txt += "# EOF\n"
+
+	return txt
+
+
+def write_openmetrics(path, project, latest):
+	"""
+	Writes the OpenMetrics file (see to_openmetrics)
+
+	It is replaced at once, so a collector never reads half of it.
+	"""
+	with AtomicWriter(path) as f:
+		f.write(to_openmetrics(project, latest))
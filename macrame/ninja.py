@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+"""
+Ninja build manager
+
+The compile and link commands of the makefiles ('printtemplates') are
+written once in a 'build.ninja' under tmp/<port>/<target>/. Ninja keeps
+the header dependencies in its binary log ('deps = gcc') instead of the
+'.d' files that make includes, so incremental and no-op builds are fast.
+
+Evaluating the makefiles is the slow part, so 'build.ninja' is only
+regenerated when the layout (a source directory), a makefile or the
+'toolchain.toml' changes.
+"""
+
+import os
+import json
+import shutil
+from .core.exceptions import UserInputError
+from .core.utils import AtomicWriter
+from .core.utils import in_root
+from .core.utils import run_command
+from .diagnostics import job_outputs
+from .gitversion import generate_version_header
+from .makefile import MakefileBuildManager
+
+
+def escape(path):
+	"""
+	Escapes a path for a ninja build statement
+	"""
+	return path.replace("$", "$$").replace(" ", "$ ").replace(":", "$:")
+
+
+class NinjaBuildManager(MakefileBuildManager):
+	"""
+	Builds the program with ninja
+	"""
+
+	@property
+	def ninja_path(self):
+		"""
+		The generated 'build.ninja'
+		"""
+		return os.path.join(self.tmp_outdir, "build.ninja")
+
+	def _cache_path(self):
+		"""
+		Where the fingerprint of the generation is kept
+		"""
+		return self.ninja_path + ".json"
+
+	def is_up_to_date(self, variables=None):
+		"""
+		True if 'build.ninja' does not need to be generated again
+		"""
+		cache = self._cache()
+		if not os.path.isfile(in_root(self.directory, self.ninja_path)) or not cache:
+			return False
+
+		return cache.get("fingerprint") == self.fingerprint(cache.get("files", list()), variables)
+
+	def generate(self, variables=None):
+		"""
+		Writes 'build.ninja' from the makefile commands
+
+		Returns True if its content changed
+		"""
+		jobs = self.jobs(variables)
+		if jobs is None:
+			raise UserInputError(
+				f"The makefile '{self.makefile_path}' does not provide the command templates")
+
+		txt = "# Generated by macrame. Do not edit.\n\n"
+		txt += "ninja_required_version = 1.3\n"
+		txt += f"builddir = {escape(self.tmp_outdir)}\n\n"
+		# The output of the compiler is kept for the diagnostics report (see diagnostics.py)
+		captured = "$cmd > $err 2>&1; rv=$$?; [ ! -s $err ] || cat $err; exit $$rv"
+		txt += f"rule cc\n  command = {captured}\n  description = $desc\n"
+		txt += "  deps = gcc\n  depfile = $depfile\n\n"
+		txt += f"rule ld\n  command = {captured}\n  description = $desc\n\n"
+		txt += "rule convert\n  command = $cmd\n  description = $desc\n  restat = 1\n\n"
+
+		files = set()
+		defaults = list()
+		runner = None
+		for job in jobs:
+			files.update(job.aux)
+			inputs = " ".join(escape(p) for p in job.inputs)
+			outputs = " ".join(escape(p) for p in [job.output] + job.products)
+			if job.is_compile:
+				txt += f"build {outputs}: cc {inputs}\n"
+				txt += f"  depfile = {escape(job.output[:-2])}.Td\n"
+			else:
+				txt += f"build {outputs}: {'convert' if job.kind == 'OC' else 'ld'} {inputs}\n"
+				defaults.append(outputs)
+				if job.label == "[TEST]" and job.kind == "LD":
+					runner = job.output
+			if job.kind != "OC":
+				txt += f"  err = {escape(job.log_path)}\n"
+			txt += f"  cmd = {job.command.replace('$', '$$')}\n"
+			txt += f"  desc = {job.label} {job.kind:4}{job.name}\n\n"
+
+		txt += f"default {' '.join(defaults)}\n"
+
+		# The options of the runner (TEST_ARGS of tests.mk)
+		runner_args = list()
+		if runner is not None:
+			found = self.test_runner(variables)
+			if found is not None:
+				runner_args = found[3]
+
+		files.add("toolchain.toml")
+		files = sorted(files)
+		with AtomicWriter(in_root(self.directory, self.ninja_path)) as f:
+			f.write(txt)
+		with AtomicWriter(in_root(self.directory, self._cache_path())) as cache:
+			json.dump({
+				"fingerprint": self.fingerprint(files, variables),
+				"files": files,
+				"runner": runner,
+				"runner_args": runner_args,
+				"outputs": job_outputs(jobs),
+				"objects": [job.output for job in jobs if job.is_compile]}, cache)
+
+		return f.changed
+
+	def _cache(self):
+		"""
+		The generation cache or an empty dictionary
+		"""
+		try:
+			with open(in_root(self.directory, self._cache_path()), "r", encoding="utf-8") as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return dict()
+
+	def build(
+			self, variables=None, jobs=None, max_load=None, explain=False, pch=False, unity=None,
+			env=None):
+		"""
+		Builds the project with ninja and runs the unit tests
+
+		param: variables   Dictionary of extra make variables
+		param: jobs        Number of parallel jobs or None for the ninja default
+		param: max_load    No new job starts while the load average is above it
+		param: explain     Print why every job runs ('ninja -d explain')
+		param: pch         Precompile the most included headers
+		param: unity       Number of unity files per language or None for no unity build
+		param: env         The environment of the commands or None for the one of the process
+		"""
+		if shutil.which("ninja") is None:
+			raise UserInputError("'ninja' was not found. Please install it or use the make backend")
+
+		self.phases = dict()
+		self.objects = None
+		with self.phase("prepare"):
+			generate_version_header(path=self.directory or ".")
+			if unity is not None:
+				variables = self.prepare_unity(unity, variables)
+			rv = 0
+			if pch:
+				variables, rv = self.prepare_pch(variables)
+		if rv != 0:
+			return rv
+		if not self.is_up_to_date(variables):
+			with self.phase("generate"):
+				self.generate(variables)
+
+		cmd = ["ninja", "-f", self.ninja_path]
+		if jobs is not None:
+			cmd += ["-j", str(jobs)]
+		if max_load is not None:
+			cmd += ["-l", str(max_load)]
+		if explain:
+			cmd += ["-d", "explain"]
+		with self.phase("ninja"):
+			rv = run_command(cmd, env=env, cwd=self.directory)
+
+		cache = self._cache()
+		runner = cache.get("runner")
+		if rv == 0 and runner is not None and os.path.isfile(in_root(self.directory, runner)):
+			with self.phase("tests"):
+				cmd = [f"./{runner}"] + cache.get("runner_args", ["-c"])
+				rv = run_command(cmd, env=env, cwd=self.directory)
+
+		with self.phase("report"):
+			self.diagnostics = self.report_diagnostics(cache.get("outputs"))
+			self.objects = cache.get("objects")
+			if rv == 0 and os.path.isfile(in_root(self.directory, self.elf_path)):
+				self.record_size()
+
+		return rv
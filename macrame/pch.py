@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""
+Precompiled headers
+
+The headers that most translation units of a language include directly
+(e.g. 'port/board.h' that pulls the CMSIS and vendor headers) are put in
+one header per language, which is precompiled with the very same flags
+as the objects into OBJ_OUTDIR/pch/. The makefile then injects it in
+every compile ('-include', see PCH_CC and PCH_CXX in compiler.mk).
+
+The precompiled header is built again only when its header list, its
+command or one of the headers it includes changes.
+"""
+
+import os
+import json
+from .core.utils import AtomicWriter
+from .core.utils import in_root
+from .core.utils import run_command
+from .gitversion import HEADER_PATH
+from .scheduler import instantiate
+from .scheduler import read_depfile
+
+# Share of the translation units that must include a header directly
+MIN_SHARE = 0.5
+
+# Headers that change too often to be precompiled
+EXCLUDED_HEADERS = [HEADER_PATH.replace(os.sep, "/")]
+
+# Language of the precompiled header per kind of job
+HEADER_LANGUAGES = {
+	"CC": "c-header",
+	"CXX": "c++-header",
+}
+
+
+def select_headers(jobs, scanner, min_share=MIN_SHARE):
+	"""
+	Selects the headers that most compiles include directly
+
+	Only direct includes are taken, so every header still sees the
+	headers it relies on. They keep the order of their first use.
+
+	param: jobs        The compile jobs of one language
+	param: scanner     An includes.IncludeScanner
+	param: min_share   Share of the jobs that must include a header
+
+	Returns the list of header paths
+	"""
+	counts = dict()
+	order = list()
+	for job in jobs:
+		source = job.inputs[0]
+		direct = set()
+		for header in scanner.direct_headers(source, job.command):
+			if header in direct:
+				continue
+			direct.add(header)
+			counts[header] = counts.get(header, 0) + 1
+			if header not in order:
+				order.append(header)
+
+	minimum = max(2, min_share * len(jobs))
+	return [h for h in order if counts[h] >= minimum and h not in EXCLUDED_HEADERS]
+
+
+class PrecompiledHeader:
+	"""
+	The precompiled header of a language
+	"""
+
+	def __init__(self, obj_outdir, kind, template, root=None):
+		"""
+		param: obj_outdir   The directory of the objects (OBJ_OUTDIR)
+		param: kind         'CC' or 'CXX'
+		param: template     The compile command template of the language
+		param: root         The project directory or None for the current one.
+		                    The compiler runs there and the paths are relative to it.
+		"""
+		self.root = root
+		self.kind = kind
+		self.template = template
+		self.stem = os.path.join(obj_outdir, "pch", kind.lower())
+
+	@property
+	def header_path(self):
+		"""
+		The header injected in the compiles
+		"""
+		return f"{self.stem}.h"
+
+	@property
+	def gch_path(self):
+		"""
+		The precompiled header, found by the compiler next to the header
+		"""
+		return f"{self.header_path}.gch"
+
+	def command(self):
+		"""
+		The command that precompiles the header
+		"""
+		source = f"-x {HEADER_LANGUAGES[self.kind]} {self.header_path}"
+		command = instantiate(self.template, [source], f"{self.stem}.o")
+		return f"{command} && mv -f {self.stem}.o {self.gch_path} && mv -f {self.stem}.Td {self.stem}.d"
+
+	def is_stale(self, headers):
+		"""
+		True if the precompiled header must be built again
+		"""
+		try:
+			with open(in_root(self.root, f"{self.stem}.json"), "r", encoding="utf-8") as f:
+				state = json.load(f)
+			gch_mtime = os.stat(in_root(self.root, self.gch_path)).st_mtime_ns
+		except (OSError, ValueError):
+			return True
+
+		if state != {"headers": headers, "command": self.command()}:
+			return True
+		for path in read_depfile(in_root(self.root, f"{self.stem}.d")) or [self.header_path]:
+			try:
+				if os.stat(in_root(self.root, path)).st_mtime_ns > gch_mtime:
+					return True
+			except OSError:
+				return True
+
+		return False
+
+	def build(self, headers):
+		"""
+		Writes the header and precompiles it when needed
+
+		param: headers   The headers to precompile
+
+		Returns the exit code of the compiler (0 when nothing was needed)
+		"""
+		with AtomicWriter(in_root(self.root, self.header_path)) as f:
+			f.write("/* Generated by macrame. Do not edit. */\n\n")
+			for header in headers:
+				f.write(f"#include \"{os.path.relpath(header, os.path.dirname(self.header_path))}\"\n")
+
+		if not self.is_stale(headers):
+			return 0
+
+		print(f"PCH {self.header_path}: " + ", ".join(headers), flush=True)
+		rv = run_command(self.command(), cwd=self.root)
+		if rv == 0:
+			with AtomicWriter(in_root(self.root, f"{self.stem}.json")) as f:
+				json.dump({"headers": headers, "command": self.command()}, f)
+
+		return rv
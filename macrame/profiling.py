@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""
+Profiling of the posix program
+
+Runs the linked program under 'perf record' or 'valgrind --tool=callgrind'
+with the 'commands' file of the project as its input, keeps the raw
+profile under tmp/<port>/<target>/ ('perf.data' or 'callgrind.out') and
+summarizes the functions with the highest cost:
+
+	Self        Inclusive   Function
+	  41.2%        41.2%    parse_line
+	   3.0%        96.1%    main
+
+The self cost is the one of the function's own code, the inclusive cost
+also counts the functions it calls. The raw profiles can be opened with
+'perf report' or 'kcachegrind' for more.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+from .core import process
+from .core.exceptions import UserInputError
+
+PROFILERS = ("perf", "callgrind")
+
+# The raw profile of each profiler, in tmp/<port>/<target>/
+PROFILE_FILENAMES = {"perf": "perf.data", "callgrind": "callgrind.out"}
+
+# The input of the program, at the project root
+COMMANDS_FILENAME = "commands"
+
+# perf report: children% self% [x] symbol
+_PERF_REGEX = re.compile(
+	r"^\s*(?P<inclusive>[\d.]+)%\s+(?P<self>[\d.]+)%\s+\[.\]\s+(?P<name>.+?)\s*$")
+
+# callgrind: compressed names '(id) name' or '(id)'
+_NAME_REGEX = re.compile(r"^\((?P<id>\d+)\)(?:\s+(?P<name>.*))?$")
+
+
+def profile_command(profiler, program, output):
+	"""
+	Composes the command that records the profile of a program
+
+	param: profiler   One of PROFILERS
+	param: program    The program path
+	param: output     The raw profile path
+	"""
+	program = os.path.join(".", program)
+	if profiler == "perf":
+		return ["perf", "record", "--call-graph", "dwarf", "--quiet", "--output", output, "--", program]
+	if profiler == "callgrind":
+		return ["valgrind", "--tool=callgrind", "--quiet", f"--callgrind-out-file={output}", program]
+
+	raise UserInputError(f"Unknown profiler '{profiler}'. Please use one of: {', '.join(PROFILERS)}")
+
+
+def parse_callgrind(text):
+	"""
+	Adds up the costs of the functions of a callgrind profile
+
+	Only the first event (instructions, 'Ir') is counted. The inclusive
+	cost of a function is its own cost plus the cost of its calls, so
+	recursive functions are counted more than once.
+
+	Returns a tuple ({function: [self, inclusive]}, total)
+	"""
+	names = dict()
+	costs = dict()
+	positions = 1
+	total = None
+	function = None
+	in_call = False
+
+	def name(value):
+		match = _NAME_REGEX.match(value.strip())
+		if match is None:
+			return value.strip()
+		if match.group("name"):
+			names[match.group("id")] = match.group("name")
+		return names.get(match.group("id"), value.strip())
+
+	for line in text.splitlines():
+		if not line:
+			continue
+		if line.startswith("positions:"):
+			positions = len(line.split(":", 1)[1].split())
+		elif line.startswith(("summary:", "totals:")):
+			total = int(line.split(":", 1)[1].split()[0])
+		elif line.startswith("fn="):
+			function = name(line[3:])
+			costs.setdefault(function, [0, 0])
+		elif line.startswith("cfn="):
+			# Defines the compressed name of the called function
+			name(line[4:])
+		elif line.startswith("calls="):
+			in_call = True
+		elif line[0] in "0123456789+-*" and function is not None:
+			fields = line.split()
+			cost = int(fields[positions]) if len(fields) > positions else 0
+			costs[function][1] += cost
+			if in_call:
+				in_call = False
+			else:
+				costs[function][0] += cost
+
+	if total is None:
+		total = sum(cost[0] for cost in costs.values())
+
+	return costs, total
+
+
+def parse_perf_report(text):
+	"""
+	Reads the functions of 'perf report --stdio --children'
+
+	Returns a tuple ({function: [self %, inclusive %]}, 100.0)
+	"""
+	costs = dict()
+	for line in text.splitlines():
+		match = _PERF_REGEX.match(line)
+		if match is not None:
+			cost = costs.setdefault(match.group("name"), [0.0, 0.0])
+			cost[0] += float(match.group("self"))
+			cost[1] = max(cost[1], float(match.group("inclusive")))
+
+	return costs, 100.0
+
+
+def hotspots(costs, top=20):
+	"""
+	The functions with the highest self cost
+
+	Returns a list of tuples (function, self, inclusive)
+	"""
+	entries = sorted(costs.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+	return [(name, cost[0], cost[1]) for name, cost in entries[:top]]
+
+
+def format_hotspots(entries, total):
+	"""
+	Formats the hotspots as a table of shares of the total cost
+	"""
+	def share(cost):
+		return f"{100 * cost / total:6.1f}%" if total else "     -"
+
+	txt = f"{'Self':>7}  {'Inclusive':>9}  Function\n"
+	for name, self_cost, inclusive_cost in entries:
+		txt += f"{share(self_cost):>7}  {share(inclusive_cost):>9}  {name}\n"
+
+	return txt
+
+
+def profile(profiler, program, directory, top=20):
+	"""
+	Profiles a program and prints its hotspots
+
+	The program reads the 'commands' file when the project has one,
+	otherwise the input of this process.
+
+	param: profiler    One of PROFILERS
+	param: program     The program path
+	param: directory   Where the raw profile is kept (tmp/<port>/<target>)
+	param: top         The number of functions shown
+
+	Returns the exit code of the program
+	"""
+	tool = "valgrind" if profiler == "callgrind" else profiler
+	if shutil.which(tool) is None:
+		raise UserInputError(f"'{tool}' was not found. Please install it")
+	if not os.path.isfile(program):
+		raise UserInputError(f"The program '{program}' does not exist. Please build it first")
+
+	os.makedirs(directory, exist_ok=True)
+	output = os.path.join(directory, PROFILE_FILENAMES[profiler])
+	command = profile_command(profiler, program, output)
+	if os.path.isfile(COMMANDS_FILENAME):
+		with open(COMMANDS_FILENAME, "rb") as stdin:
+			rv = process.run(command, stdin=stdin).returncode
+	else:
+		rv = process.run(command).returncode
+
+	if not os.path.isfile(output):
+		raise UserInputError(f"{profiler} did not write a profile (exit code {rv})")
+
+	if profiler == "perf":
+		report = process.run(
+			["perf", "report", "--input", output, "--stdio", "--children", "--sort", "symbol", "-g", "none"],
+			capture=True, stderr=False, stdin=subprocess.DEVNULL)
+		costs, total = parse_perf_report(report.output)
+	else:
+		with open(output, "r", encoding="utf-8", errors="replace") as f:
+			costs, total = parse_callgrind(f.read())
+
+	print()
+	print(format_hotspots(hotspots(costs, top), total), end="")
+	print(f"Profile: '{output}'")
+
+	return rv
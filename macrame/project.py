@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+"""
+Python API of macrame
+
+	from macrame.project import Project
+
+	result = Project("path/to/project").build(port="posix", target="rel", jobs=8)
+	for diagnostic in result.diagnostics:
+		print(diagnostic["file"], diagnostic["line"], diagnostic["message"])
+	for artifact in result.artifacts:
+		print(artifact.path, artifact.status)
+
+A Project keeps no global state, does not change the working directory
+and never exits the process, so builds of different projects can run
+concurrently from threads of one process. The errors of the user (e.g.
+an unknown port) raise core.exceptions.UserInputError.
+
+The builds are the ones of 'mac build' (scheduler, precompiled headers,
+unity files), run in the project directory. They print their progress
+like the command does, so the output of a BuildResult is empty: the
+artifacts and the diagnostics hold what the compilers reported. The
+output of the other commands is captured.
+"""
+
+import os
+import time
+import shlex
+import subprocess
+from .core import process
+from .core.exceptions import UserInputError
+from .makefile import MakefileBuildManager
+from .core.utils import listPortNames
+from .size import take_snapshot
+
+# Artifact status
+BUILT = "built"
+UP_TO_DATE = "up to date"
+
+
+class Artifact:
+	"""
+	A file that a build produced or kept
+	"""
+
+	def __init__(self, path, status, finished=None, diagnostics=""):
+		"""
+		param: path          The path relative to the project
+		param: status        BUILT or UP_TO_DATE
+		param: finished      Seconds from the start of the build to its writing or None
+		param: diagnostics   The compiler output of it (its '.err' file)
+		"""
+		self.path = path
+		self.status = status
+		self.finished = finished
+		self.diagnostics = diagnostics
+
+	def __repr__(self):
+		return f"Artifact({self.path!r}, {self.status!r})"
+
+
+class Result:
+	"""
+	The outcome of a command on a project
+	"""
+
+	def __init__(self, returncode, duration, output):
+		"""
+		param: returncode   The exit code of the command
+		param: duration     Its wall time in seconds
+		param: output       Its standard output and error
+		"""
+		self.returncode = returncode
+		self.duration = duration
+		self.output = output
+
+	@property
+	def ok(self):
+		"""
+		True if the command succeeded
+		"""
+		return self.returncode == 0
+
+
+class BuildResult(Result):
+	"""
+	The outcome of a build
+	"""
+
+	def __init__(
+			self, port, target, returncode, duration, output, artifacts, diagnostics=(), size=None):
+		"""
+		param: port          The port that was built or None
+		param: target        The target that was built
+		param: artifacts     The objects and programs (list of Artifact)
+		param: diagnostics   The compiler diagnostics, without duplicates (see diagnostics.py)
+		param: size          The size snapshot of the program (see size.take_snapshot) or None
+		"""
+		super().__init__(returncode, duration, output)
+		self.port = port
+		self.target = target
+		self.artifacts = artifacts
+		self.diagnostics = list(diagnostics)
+		self.size = size
+
+	@property
+	def rebuilt(self):
+		"""
+		The artifacts written by the build
+		"""
+		return [a for a in self.artifacts if a.status == BUILT]
+
+
+def _artifact_times(directory, paths):
+	"""
+	Modification times of the files below some directories
+
+	param: directory   The project directory
+	param: paths       The directories relative to it
+
+	Returns {relative path: mtime}
+	"""
+	rv = dict()
+	for path in paths:
+		for parent_path, _, filenames in os.walk(os.path.join(directory, path)):
+			for filename in filenames:
+				if filename.endswith((".o", ".elf", ".bin", ".hex", ".sym", ".gch")):
+					full_path = os.path.join(parent_path, filename)
+					rv[os.path.relpath(full_path, directory)] = os.stat(full_path).st_mtime
+
+	return rv
+
+
+def _read_text(path):
+	"""
+	The content of a text file or '' if missing
+	"""
+	try:
+		with open(path, "r", encoding="utf-8", errors="replace") as f:
+			return f.read().strip()
+	except OSError:
+		return ""
+
+
+class Project:
+	"""
+	A macrame project
+	"""
+
+	def __init__(self, path=".", use_local_makefile=True):
+		"""
+		param: path                 The project directory
+		param: use_local_makefile   False to use the makefiles of macrame
+		"""
+		self.path = os.path.abspath(path)
+		self.use_local_makefile = use_local_makefile
+
+	@property
+	def name(self):
+		"""
+		The project name (its directory name)
+		"""
+		return os.path.basename(self.path)
+
+	@property
+	def ports(self):
+		"""
+		The port names or None
+		"""
+		return listPortNames(self.path)
+
+	def manager(self, port=None, target="dbg"):
+		"""
+		The MakefileBuildManager of a port and target
+		"""
+		return MakefileBuildManager(
+			port_name=port or "",
+			use_local_makefile=self.use_local_makefile,
+			target=target,
+			directory=self.path)
+
+	def _run(self, cmd, env=None):
+		"""
+		Runs a command in the project directory and captures its output
+
+		Returns a Result
+		"""
+		result = process.run(
+			shlex.split(cmd), cwd=self.path, env=env, capture=True, stdin=subprocess.DEVNULL)
+		return Result(result.returncode, result.wall, result.output)
+
+	@staticmethod
+	def _environment(env):
+		"""
+		The environment of the commands, never the one of a sub-make
+		"""
+		env = dict(env or os.environ)
+		env.pop("MAKELEVEL", None)
+		env.pop("MAKEFLAGS", None)
+		return env
+
+	def build(
+			self, port=None, target="dbg", jobs=None, variables=None, env=None, max_load=None, pch=False,
+			unity=None):
+		"""
+		Builds the project
+
+		param: port        The port name or None for the first one
+		param: target      The build configuration (dbg or rel)
+		param: jobs        Number of parallel jobs or None for a serial build
+		param: variables   Dictionary of extra make variables
+		param: env         The environment or None for the one of the process
+		param: max_load    No new job starts while the load average is above it
+		param: pch         Precompile the most included headers
+		param: unity       Number of unity files per language or None for no unity build
+
+		Returns a BuildResult
+		"""
+		manager = self.manager(port, target)
+		outdirs = [manager.obj_outdir, manager.bin_outdir]
+		before = _artifact_times(self.path, outdirs)
+
+		start = time.time()
+		returncode = manager.build(
+			variables, jobs, max_load=max_load, pch=pch, unity=unity, env=self._environment(env))
+		duration = time.time() - start
+
+		artifacts = list()
+		for path, mtime in sorted(_artifact_times(self.path, outdirs).items()):
+			if before.get(path) == mtime:
+				artifact = Artifact(path, UP_TO_DATE)
+			else:
+				artifact = Artifact(path, BUILT, finished=max(0.0, mtime - start))
+			err_path = os.path.join(self.path, os.path.splitext(path)[0] + ".err")
+			if path.endswith(".elf"):
+				err_path = os.path.join(self.path, path + ".err")
+			artifact.diagnostics = _read_text(err_path)
+			artifacts.append(artifact)
+
+		size = None
+		elf_path = os.path.join(self.path, manager.elf_path)
+		if returncode == 0 and os.path.isfile(elf_path):
+			size = take_snapshot(elf_path)
+
+		return BuildResult(
+			manager.port, target, returncode, duration, "", artifacts, manager.diagnostics, size)
+
+	def test(self, port=None, target="dbg", jobs=None, variables=None, env=None):
+		"""
+		Builds and runs the unit tests
+
+		param: port        The port name or None for the first one
+		param: target      The build configuration (dbg or rel)
+		param: jobs        Number of parallel make jobs or None for a serial build
+		param: variables   Dictionary of extra make variables (e.g. COVERAGE=yes)
+		param: env         The environment or None for the one of the process
+
+		Returns a Result with the output of the build and of the runner
+		"""
+		manager = self.manager(port, target)
+		found = manager.test_runner(variables)
+		if found is None:
+			raise UserInputError("The project has no unit tests (a 'tests' directory)")
+		testsmk_path, runner, _, runner_args = found
+
+		env = self._environment(env)
+		test_port = None if manager.port is None else "posix"
+		cmd = manager.make_command("testRunner", variables, makefile=testsmk_path, port=test_port)
+		if jobs is not None:
+			cmd += f" -j{jobs} --output-sync=target"
+		result = self._run(cmd, env=env)
+		if not result.ok:
+			return result
+
+		tests = self._run(shlex.join([os.path.join(".", runner)] + runner_args), env=env)
+		return Result(tests.returncode, result.duration + tests.duration, result.output + tests.output)
+
+	def run(self, port=None, target="dbg", env=None):
+		"""
+		Runs the program of a port and target ('make run')
+
+		Returns a Result
+		"""
+		return self._run(self.manager(port, target).make_command("run"), env=self._environment(env))
+
+	def size(self, port=None, target="dbg"):
+		"""
+		The size snapshot of the built program (see size.take_snapshot) or None if it is not built
+		"""
+		manager = self.manager(port, target)
+		elf_path = os.path.join(self.path, manager.elf_path)
+		return take_snapshot(elf_path) if os.path.isfile(elf_path) else None
+
+	def clean(self):
+		"""
+		Cleans the generated files
+
+		Returns a Result
+		"""
+		manager = self.manager()
+		return self._run(f"make -f {manager.makefile_path} clean")
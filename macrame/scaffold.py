@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+Project scaffolding
+
+A new project is instantiated from the template (static/new_project).
+The files are reflinked where the file system supports it, or else
+copied in parallel (see core.utils.copy_files), in a staging directory
+next to the destination:
+
+	.macrame-new-XXXXXXXX/   the files being copied
+	project/                 created by a rename once all are there
+
+so an error or an interrupt never leaves half a project behind. When the
+destination already exists (e.g. the current directory with its '.git'),
+the staging directory is made inside it and its entries are renamed in
+place. They are few, and moved back if one of the renames fails.
+
+Only the selected ports may be instantiated. The posix port is kept for
+the unit tests, and a thirdparty package is only copied when the
+Makefile of a selected port refers to it.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+from .core.exceptions import UserInputError
+from .core.utils import copy_files
+from .core.utils import get_umask
+from .core.utils import listPortNames
+from .resource import get_abs_resourse_path
+
+# The port that builds the unit tests
+TEST_PORT = "posix"
+
+STAGING_PREFIX = ".macrame-new-"
+
+_THIRDPARTY_REFERENCE = re.compile(r"thirdparty/([^/\s\\]+)")
+
+
+def template_path():
+	"""
+	The directory of the project template
+	"""
+	return get_abs_resourse_path("new_project")
+
+
+def select_ports(template, ports=None):
+	"""
+	Validates the selected ports
+
+	param: template   The template directory
+	param: ports      The port names or None for all of them
+
+	Returns the sorted port names to instantiate
+	"""
+	available = listPortNames(template) or list()
+	if ports is None:
+		return available
+
+	for port in ports:
+		if port not in available:
+			raise UserInputError(f"Port '{port}' is not available. Options are: {', '.join(available)}")
+	rv = set(ports)
+	if TEST_PORT in available and os.path.isdir(os.path.join(template, "tests")):
+		rv.add(TEST_PORT)
+
+	return sorted(rv)
+
+
+def template_files(template, ports):
+	"""
+	Lists the files of the template that a project with these ports needs
+
+	param: template   The template directory
+	param: ports      The port names (see select_ports)
+
+	Returns the paths relative to the template, sorted
+	"""
+	available = listPortNames(template) or list()
+	excluded = [os.path.join("port", port) for port in available if port not in ports]
+
+	# The thirdparty packages that the selected ports use
+	packages = set()
+	for port in ports:
+		makefile = os.path.join(template, "port", port, "Makefile")
+		if os.path.isfile(makefile):
+			with open(makefile, "r", encoding="utf-8") as f:
+				packages.update(_THIRDPARTY_REFERENCE.findall(f.read()))
+	thirdparty = os.path.join(template, "thirdparty")
+	if os.path.isdir(thirdparty):
+		excluded += [
+			os.path.join("thirdparty", package) for package in os.listdir(thirdparty)
+			if package not in packages]
+
+	rv = list()
+	for parent_path, dirnames, filenames in os.walk(template):
+		relative = os.path.relpath(parent_path, template)
+		if relative == ".":
+			relative = ""
+		dirnames[:] = [d for d in dirnames if os.path.join(relative, d) not in excluded]
+		rv += [os.path.join(relative, f) for f in filenames]
+
+	return sorted(rv)
+
+
+def _check_destination(destination, paths):
+	"""
+	Refuses a destination with files of its own or with an entry of the template
+	"""
+	entries = os.listdir(destination)
+	if any(not entry.startswith(".") for entry in entries):
+		raise UserInputError(f"Directory '{destination}' is not empty")
+
+	names = set(path.split(os.sep)[0] for path in paths)
+	conflicts = sorted(names.intersection(entries))
+	if conflicts:
+		raise UserInputError(f"Directory '{destination}' already has: {', '.join(conflicts)}")
+
+
+def _move_entries(staging, destination):
+	"""
+	Renames the entries of the staging directory in the destination, all or none
+	"""
+	moved = list()
+	try:
+		for name in sorted(os.listdir(staging)):
+			os.rename(os.path.join(staging, name), os.path.join(destination, name))
+			moved.append(name)
+	except BaseException:
+		for name in moved:
+			os.rename(os.path.join(destination, name), os.path.join(staging, name))
+		raise
+
+
+def create_project(destination, ports=None, link=False, jobs=None, template=None):
+	"""
+	Instantiates a new project
+
+	param: destination   The project directory: missing or without visible files
+	param: ports         The port names or None for all of them
+	param: link          Hard link the files instead of copying them. The project
+	                     then shares them with the template: for throwaway projects.
+	param: jobs          The number of copy threads or None for all CPUs
+	param: template      The template directory or None for the one of macrame
+
+	Returns the number of files per copy method (see core.utils.copy_files)
+	"""
+	template = template or template_path()
+	destination = os.path.abspath(destination)
+	paths = template_files(template, select_ports(template, ports))
+
+	exists = os.path.isdir(destination)
+	if exists:
+		_check_destination(destination, paths)
+		parent = destination
+	elif os.path.exists(destination):
+		raise UserInputError(f"'{destination}' is not a directory")
+	else:
+		parent = os.path.dirname(destination)
+		if not os.path.isdir(parent):
+			raise UserInputError(f"The directory '{parent}' does not exist")
+
+	staging = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=parent)
+	try:
+		counts = copy_files(template, staging, paths, link=link, jobs=jobs)
+		if exists:
+			_move_entries(staging, destination)
+		else:
+			# mkdtemp makes it private
+			os.chmod(staging, 0o777 & ~get_umask())
+			os.rename(staging, destination)
+			staging = None
+	finally:
+		if staging is not None:
+			shutil.rmtree(staging, ignore_errors=True)
+
+	return counts
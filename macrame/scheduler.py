@@ -0,0 +1,673 @@
+#!/usr/bin/env python
+
+"""
+Critical path first scheduling of the compile and link jobs
+
+Every job knows its consumers (objects feed the program or the unit test
+runner). Jobs are started by the longest remaining path to the end of the
+build, using the durations recorded in previous builds, so the biggest
+translation units start first and the build time approaches the critical
+path.
+"""
+
+import os
+import sys
+import json
+import heapq
+import hashlib
+import select
+import time
+import subprocess
+from .core import process
+from .core.utils import AtomicWriter
+from .core.utils import in_root
+
+# Kinds of jobs that compile a source to an object
+COMPILE_KINDS = ("AS", "CC", "CXX")
+
+# Placeholders that the 'printtemplates' make target puts in place of '$<', '$^' and '$@'
+TEMPLATE_IN = "@MACRAME_IN@"
+TEMPLATE_OUT = "@MACRAME_OUT@"
+
+# Estimates used before anything is recorded
+DEFAULT_SECONDS_PER_BYTE = 0.00002
+DEFAULT_LINK_SECONDS = 1.0
+
+# Weight of a new duration in the recorded average
+HISTORY_WEIGHT = 0.5
+
+# Share of the available memory that the jobs may use
+MEMORY_BUDGET_RATIO = 0.9
+
+# Peak memory estimate (bytes) of a job never measured
+DEFAULT_RSS = 256 * 1024 * 1024
+
+# Seconds between two checks of the jobs where processes can not be waited for by descriptor
+POLL_SECONDS = 0.01
+
+if sys.stdout.isatty():
+	_BLACK, _RED, _GREEN, _BLUE = "\033[0;30m", "\033[0;31m", "\033[0;32m", "\033[0;34m"
+	_RESET = "\033[0m"
+else:
+	_BLACK = _RED = _GREEN = _BLUE = _RESET = ""
+
+
+def instantiate(template, inputs, output):
+	"""
+	Fills a command template from the makefile
+
+	param: template   Command with the placeholders of '$<'/'$^' and '$@'
+	param: inputs     List of input paths
+	param: output     The output path. For objects the '.o' is part of
+	                  the template, so related files ('.Td', '.lst') follow.
+	"""
+	if output.endswith(".o") and TEMPLATE_OUT + ".o" in template:
+		output = output[:-2]
+	return template.replace(TEMPLATE_IN, " ".join(inputs)).replace(TEMPLATE_OUT, output)
+
+
+def available_memory():
+	"""
+	Returns the memory available for new processes in bytes or None if unknown
+	"""
+	try:
+		with open("/proc/meminfo", "r", encoding="utf-8") as f:
+			for line in f:
+				if line.startswith("MemAvailable:"):
+					return int(line.split()[1]) * 1024
+	except (OSError, ValueError, IndexError):
+		pass
+
+	return None
+
+
+def read_depfile(path):
+	"""
+	Reads the prerequisites of a make dependency file ('.d')
+
+	Returns the list of prerequisites of the first rule or None if the file is missing
+	"""
+	if not os.path.isfile(path):
+		return None
+
+	with open(path, "r", encoding="utf-8", errors="replace") as f:
+		content = f.read().replace("\\\n", " ")
+
+	first_rule = content.split("\n", 1)[0]
+	_, _, prerequisites = first_rule.partition(": ")
+	return [p.replace("\\ ", " ") for p in prerequisites.replace("\\ ", "\0").split() if p]
+
+
+def write_depfile(path, target, prerequisites):
+	"""
+	Writes a make dependency file like 'gcc -MMD -MP' does
+
+	param: path            The dependency file
+	param: target          The object
+	param: prerequisites   The source followed by its headers
+	"""
+	def escape(p):
+		return p.replace(" ", "\\ ")
+
+	txt = f"{escape(target)}: {' '.join(escape(p) for p in prerequisites)}\n"
+	for header in prerequisites[1:]:
+		txt += f"\n{escape(header)}:\n"
+
+	with AtomicWriter(path) as f:
+		f.write(txt)
+
+
+class Job:
+	"""
+	A command that produces an output from inputs
+	"""
+
+	def __init__(self, kind, label, output, inputs, command, aux=(), products=()):
+		"""
+		param: kind      'AS', 'CC', 'CXX', 'LD' (link) or 'OC' (conversion)
+		param: label     Prefix shown in the output (e.g. '[posix]' or '[TEST]')
+		param: output    The produced file (or a stamp)
+		param: inputs    The files read (the source or the objects)
+		param: command   The shell command
+		param: aux       Files that the output also depends on (the makefiles)
+		param: products  Other files produced, the job runs again when one is missing
+		"""
+		self.kind = kind
+		self.label = label
+		self.output = output
+		self.inputs = list(inputs)
+		self.command = command
+		self.aux = list(aux)
+		self.products = list(products)
+		self.deps = list()
+		self.consumers = list()
+		self.stale = False
+		self.reason = None
+		self.priority = 0.0
+		self.duration = None
+		self.rss = None
+		self.returncode = None
+		self.process = None
+		self.pidfd = None
+		self.usage_fd = None
+		self.start_time = None
+
+	@property
+	def is_compile(self):
+		"""
+		True if the job compiles a source to an object
+		"""
+		return self.kind in COMPILE_KINDS
+
+	@property
+	def command_hash(self):
+		"""
+		Short hash of the command line, recorded to detect changed flags
+		"""
+		return hashlib.sha1(self.command.encode()).hexdigest()[:16]
+
+	@property
+	def depfile(self):
+		"""
+		The make dependency file of a compile
+		"""
+		return self.output[:-2] + ".d"
+
+	@property
+	def log_path(self):
+		"""
+		Where the output of the compiler is kept ('.err' like the makefile)
+		"""
+		if self.is_compile:
+			return self.output[:-2] + ".err"
+		return self.output + ".err"
+
+	def headers(self, scanner=None, root=None):
+		"""
+		The headers of a compile
+
+		They are read from the dependency file or, when it is missing,
+		found by the include scanner.
+
+		param: scanner   An includes.IncludeScanner or None
+		param: root      The project directory the paths are relative to or None for the current one
+
+		Returns the list of headers or None if unknown
+		"""
+		if not self.is_compile:
+			return list()
+
+		rv = read_depfile(in_root(root, self.depfile))
+		if rv is not None:
+			return [p for p in rv if p not in self.inputs]
+		if scanner is not None:
+			return scanner.headers(self.inputs[0], self.command)
+		return None
+
+	def prerequisites(self, scanner=None, root=None):
+		"""
+		The files the output depends on, headers included
+		"""
+		return self.inputs + self.aux + (self.headers(scanner, root) or list())
+
+	def explain(self, scanner=None, history=None, root=None):
+		"""
+		Decides if the job must run, like make does, and why
+
+		Without a dependency file, an object is stale unless the include
+		scanner finds its headers. Then an approximate dependency file is
+		written, with the time of the object, so that make agrees.
+
+		A job also runs when its command line differs from the one of the
+		previous build (e.g. other make variables).
+
+		param: scanner   An includes.IncludeScanner or None
+		param: history   The BuildHistory with the previous command hashes or None
+		param: root      The project directory the paths are relative to or None for the current one
+
+		Returns a tuple (cause, file) or None if the job is up to date
+		"""
+		for path in [self.output] + self.products:
+			if not os.path.isfile(in_root(root, path)):
+				return "missing output", path
+		for dep in self.deps:
+			if dep.stale:
+				return "rebuilt input", dep.output
+
+		headers = self.headers(scanner, root)
+		if headers is None:
+			return "missing dependency file", self.depfile
+
+		output_mtime = os.stat(in_root(root, self.output)).st_mtime_ns
+		causes = (("newer source", self.inputs), ("newer makefile", self.aux), ("newer header", headers))
+		for cause, paths in causes:
+			for path in paths:
+				try:
+					if os.stat(in_root(root, path)).st_mtime_ns > output_mtime:
+						return cause, path
+				except OSError:
+					return "missing prerequisite", path
+
+		if history is not None:
+			previous = history.get(self.output, "command")
+			if previous is not None and previous != self.command_hash:
+				return "changed command", None
+
+		depfile = in_root(root, self.depfile)
+		if self.is_compile and not os.path.isfile(depfile):
+			write_depfile(depfile, self.output, self.inputs + headers)
+			os.utime(depfile, ns=(output_mtime, output_mtime))
+
+		return None
+
+	@property
+	def name(self):
+		"""
+		The file shown for the job
+		"""
+		return self.inputs[0] if self.is_compile or self.kind == "OC" else self.output
+
+	def __lt__(self, other):
+		return self.output < other.output
+
+
+class BuildHistory:
+	"""
+	Measurements of the previous builds per output
+
+	Stored as JSON in the intermediate directory of the port and target.
+	"""
+
+	def __init__(self, path):
+		"""
+		param: path   The JSON file
+		"""
+		self.path = path
+		self.records = dict()
+		if os.path.isfile(path):
+			try:
+				with open(path, "r", encoding="utf-8") as f:
+					self.records = json.load(f)
+			except ValueError:
+				self.records = dict()
+
+	def get(self, output, key):
+		"""
+		Returns a recorded value of an output or None
+		"""
+		return self.records.get(output, dict()).get(key)
+
+	def record(self, output, key, value, average=True):
+		"""
+		Records a value of an output
+
+		param: average   Blend with the previous value to smooth out noise
+		"""
+		previous = self.get(output, key)
+		if average and previous is not None:
+			value = HISTORY_WEIGHT * value + (1 - HISTORY_WEIGHT) * previous
+		self.records.setdefault(output, dict())[key] = value
+
+	def save(self):
+		"""
+		Writes the history file
+		"""
+		with AtomicWriter(self.path) as f:
+			json.dump(self.records, f, indent=1, sort_keys=True)
+
+
+class Scheduler:
+	"""
+	Runs the stale jobs in parallel, critical path first
+
+	A job is started only while the predicted peak memory of the running
+	jobs fits in the memory budget and the load average is under the cap.
+	One job is always allowed, so a build never stalls.
+	"""
+
+	def __init__(
+			self, jobs, history, max_jobs=1, env=None, max_load=None, memory_budget=None,
+			jobserver=None, scanner=None, explain=False, root=None):
+		"""
+		param: jobs            The jobs with their dependencies set
+		param: history         The BuildHistory
+		param: max_jobs        Maximum number of parallel processes
+		param: env             Environment of the processes or None
+		param: max_load        No job is started while the load average is above it. None for no cap.
+		param: memory_budget   Memory for the jobs in bytes. None for a share of the available memory.
+		param: jobserver       A core.jobserver.Jobserver to take a token from for every job
+		                       after the first
+		param: scanner         An includes.IncludeScanner for the objects without dependency files
+		param: explain         Print why every job runs
+		param: root            The project directory or None for the current one.
+		                       The jobs run there and their paths are relative to it.
+		"""
+		self.jobs = jobs
+		self.history = history
+		self.max_jobs = max(1, max_jobs)
+		self.env = env
+		self.max_load = max_load
+		if memory_budget is None:
+			available = available_memory()
+			memory_budget = None if available is None else int(available * MEMORY_BUDGET_RATIO)
+		self.memory_budget = memory_budget
+		self.jobserver = jobserver
+		self.scanner = scanner
+		self.explain = explain
+		self.root = root
+		self._cached_sizes = dict()
+		self._cached_rate = None
+		self._cached_rss = dict()
+
+	def estimate(self, job):
+		"""
+		Estimated duration of a job in seconds
+
+		Jobs never measured are estimated from the size of their source
+		and headers, using the measured rate of the other jobs.
+		"""
+		duration = self.history.get(job.output, "duration")
+		if duration is not None:
+			return duration
+		if not job.is_compile:
+			return DEFAULT_LINK_SECONDS
+
+		return self._rate() * self._unit_size(job)
+
+	def _unit_size(self, job):
+		"""
+		Size in bytes of the source of a compile and its headers
+		"""
+		if job not in self._cached_sizes:
+			paths = job.inputs + (job.headers(self.scanner, self.root) or list())
+			self._cached_sizes[job] = sum(_size(in_root(self.root, p)) for p in paths)
+		return self._cached_sizes[job]
+
+	def _rate(self):
+		"""
+		Median compile seconds per byte of translation unit of the measured jobs
+		"""
+		if self._cached_rate is None:
+			rates = list()
+			for job in self.jobs:
+				duration = self.history.get(job.output, "duration")
+				if job.is_compile and duration is not None and self._unit_size(job):
+					rates.append(duration / self._unit_size(job))
+			rates.sort()
+			self._cached_rate = rates[len(rates) // 2] if rates else DEFAULT_SECONDS_PER_BYTE
+		return self._cached_rate
+
+	def predict_rss(self, job):
+		"""
+		Predicted peak memory of a job in bytes
+
+		Jobs never measured are predicted as the median of the measured
+		jobs of the same language.
+		"""
+		rss = self.history.get(job.output, "rss")
+		if rss is not None:
+			return rss
+
+		if job.kind not in self._cached_rss:
+			known = sorted(
+				self.history.get(j.output, "rss") for j in self.jobs
+				if j.kind == job.kind and self.history.get(j.output, "rss") is not None)
+			self._cached_rss[job.kind] = known[len(known) // 2] if known else DEFAULT_RSS
+
+		return self._cached_rss[job.kind]
+
+	def _admit(self, ready, running):
+		"""
+		Selects the next job to start
+
+		The ready job with the highest priority that fits in the memory
+		budget is selected. Every job but the first needs a jobserver token.
+
+		param: ready     Heap of (-priority, job)
+		param: running   The running jobs {pid: job}
+
+		Returns the job (removed from ready) or None to wait
+		"""
+		if not ready:
+			return None
+
+		if running:
+			if len(running) >= self.max_jobs:
+				return None
+			if self.max_load is not None and os.getloadavg()[0] >= self.max_load:
+				return None
+
+		used = sum(self.predict_rss(job) for job in running.values())
+		for entry in sorted(ready):
+			job = entry[1]
+			fits = self.memory_budget is None or used + self.predict_rss(job) <= self.memory_budget
+			if not running or fits:
+				if running and self.jobserver is not None and not self.jobserver.acquire():
+					return None
+				ready.remove(entry)
+				heapq.heapify(ready)
+				return job
+
+		return None
+
+	def plan(self):
+		"""
+		Marks the stale jobs and computes their priorities
+
+		The priority of a job is the longest estimated path from its
+		start to the end of the build.
+
+		Returns the stale jobs
+		"""
+		for job in _topological(self.jobs):
+			job.reason = job.explain(self.scanner, self.history, self.root)
+			job.stale = job.reason is not None
+
+		for job in reversed(_topological(self.jobs)):
+			tail = max((c.priority for c in job.consumers if c.stale), default=0.0)
+			job.priority = self.estimate(job) + tail
+
+		return [job for job in self.jobs if job.stale]
+
+	def run(self):
+		"""
+		Runs the stale jobs
+
+		Returns 0 on success or the exit code of the first failed job
+		"""
+		stale = self.plan()
+		if self.explain:
+			print(explain_text(stale), end="", flush=True)
+		waiting = {job: sum(1 for dep in job.deps if dep.stale) for job in stale}
+		ready = [(-job.priority, job) for job, count in waiting.items() if count == 0]
+		heapq.heapify(ready)
+
+		running = dict()
+		rv = 0
+		while ready or running:
+			while rv == 0:
+				job = self._admit(ready, running)
+				if job is None:
+					break
+				running[self._start(job)] = job
+
+			if not running:
+				break
+
+			pid, status = self._wait(running)
+			job = running.pop(pid)
+			if self.jobserver is not None:
+				while self.jobserver.held > max(0, len(running) - 1):
+					self.jobserver.release()
+			self._finish(job, os.waitstatus_to_exitcode(status), self._peak_memory(job))
+			if job.returncode != 0:
+				rv = rv or job.returncode
+				continue
+
+			for consumer in job.consumers:
+				if consumer in waiting:
+					waiting[consumer] -= 1
+					if waiting[consumer] == 0:
+						heapq.heappush(ready, (-consumer.priority, consumer))
+
+		self.history.save()
+		if self.scanner is not None:
+			self.scanner.save()
+		return rv
+
+	def _start(self, job):
+		"""
+		Starts the process of a job
+
+		Returns the process id
+		"""
+		os.makedirs(os.path.dirname(in_root(self.root, job.output)) or ".", exist_ok=True)
+		with open(in_root(self.root, job.log_path), "w", encoding="utf-8") as log:
+			# Through the launcher of core.process, that measures the peak memory of the job alone
+			job.process, job.usage_fd = process.launch(
+				job.command,
+				stdout=log,
+				stderr=subprocess.STDOUT,
+				env=self.env,
+				cwd=self.root)
+		job.start_time = time.monotonic()
+		try:
+			job.pidfd = os.pidfd_open(job.process.pid)
+		except (AttributeError, OSError):
+			job.pidfd = None
+		return job.process.pid
+
+	@staticmethod
+	def _wait(running):
+		"""
+		Waits until a job exits
+
+		Only the processes of the jobs are waited for (not any child like
+		os.wait), so other threads of the process keep their own.
+
+		param: running   The running jobs {pid: job}
+
+		Returns a tuple (pid, wait status)
+		"""
+		while True:
+			for pid in running:
+				done, status = os.waitpid(pid, os.WNOHANG)
+				if done:
+					return pid, status
+			fds = [job.pidfd for job in running.values() if job.pidfd is not None]
+			if len(fds) == len(running):
+				select.select(fds, [], [])
+			else:
+				time.sleep(POLL_SECONDS)
+
+	@staticmethod
+	def _peak_memory(job):
+		"""
+		The peak memory of the process of a job that exited, in bytes, or None if unknown
+		"""
+		if job.usage_fd is None:
+			return None
+		usage = process.read_usage(job.usage_fd, job.command)
+		job.usage_fd = None
+		return None if usage is None else usage.max_rss
+
+	def _finish(self, job, returncode, rss):
+		"""
+		Completes a job that exited
+
+		param: job          The job
+		param: returncode   The exit code of its process
+		param: rss          The peak memory of the process and its children in bytes or None
+		"""
+		job.duration = time.monotonic() - job.start_time
+		job.rss = rss
+		job.returncode = returncode
+		job.process.returncode = returncode
+		if job.pidfd is not None:
+			os.close(job.pidfd)
+			job.pidfd = None
+
+		with open(in_root(self.root, job.log_path), "r", encoding="utf-8", errors="replace") as log:
+			output = log.read()
+
+		if returncode == 0 and job.is_compile:
+			# Like the makefile rules: keep the dependencies and touch the object
+			stem = in_root(self.root, job.output[:-2])
+			os.replace(stem + ".Td", stem + ".d")
+			os.utime(in_root(self.root, job.output))
+
+		txt = f"{_BLACK}{job.label} {_BLUE}{job.kind:4}{_RESET}{job.name} "
+		if returncode == 0:
+			txt += f"{_GREEN}OK{_RESET}"
+			self.history.record(job.output, "duration", job.duration)
+			if job.rss is not None:
+				self.history.record(job.output, "rss", job.rss, average=False)
+			self.history.record(job.output, "command", job.command_hash, average=False)
+		else:
+			txt += f"{_RED}FAIL\n\n{_RESET}"
+		if output:
+			txt += f"\n{output}"
+		print(txt, flush=True)
+
+
+def explain_text(jobs):
+	"""
+	Lists why the stale jobs run and the most frequent causes
+
+	param: jobs   The stale jobs (with their reason set)
+	"""
+	if not jobs:
+		return "Nothing to rebuild\n"
+
+	txt = ""
+	causes = dict()
+	triggers = dict()
+	for job in jobs:
+		cause, path = job.reason
+		causes[cause] = causes.get(cause, 0) + 1
+		detail = f"{cause} '{path}'" if path else cause
+		txt += f"{job.label} {job.kind:4}{job.name}: {detail}\n"
+		if path and cause != "rebuilt input":
+			triggers[path] = triggers.get(path, 0) + 1
+
+	txt += "\nRebuilds per cause:\n"
+	for cause, count in sorted(causes.items(), key=lambda item: (-item[1], item[0])):
+		txt += f"  {count:6d}  {cause}\n"
+	if triggers:
+		txt += "\nMost frequent triggers:\n"
+		for path, count in sorted(triggers.items(), key=lambda item: (-item[1], item[0]))[:10]:
+			txt += f"  {count:6d}  {path}\n"
+	txt += "\n"
+
+	return txt
+
+
+def _size(path):
+	"""
+	Size of a file or zero
+	"""
+	try:
+		return os.path.getsize(path)
+	except OSError:
+		return 0
+
+
+def _topological(jobs):
+	"""
+	Orders jobs so that every job comes after its dependencies
+	"""
+	rv = list()
+	visited = set()
+
+	def visit(job):
+		if job in visited:
+			return
+		visited.add(job)
+		for dep in job.deps:
+			visit(dep)
+		rv.append(job)
+
+	for job in jobs:
+		visit(job)
+
+	return rv
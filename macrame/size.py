@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+"""
+Symbol level firmware size snapshots and their differences
+"""
+
+import os
+import json
+import time
+from .core.elf import ElfFile
+from .core.elf import SHF_ALLOC
+from .core.elf import STT_SECTION
+from .core.elf import STT_FILE
+from .core.utils import run_command2
+
+HISTORY_FILENAME = "history.jsonl"
+LATEST_FILENAME = "latest.json"
+
+
+def take_snapshot(elf_path):
+	"""
+	Reads the sizes of all the symbols of an ELF file
+
+	Symbols are grouped by the allocated section they live in.
+	Symbols with the same name (e.g. static functions of different
+	translation units) are accumulated.
+
+	param: elf_path   The path of the ELF file
+
+	Returns a dictionary {'sections': {section: {symbol: size}}, 'totals': {section: size}}
+	"""
+	sections = dict()
+	totals = dict()
+	with ElfFile(elf_path) as elf:
+		for section in elf.sections:
+			if section.flags & SHF_ALLOC and section.size:
+				totals[section.name] = section.size
+
+		for symbol in elf.symbols():
+			if symbol.size == 0 or symbol.section not in totals:
+				continue
+			if symbol.type in (STT_SECTION, STT_FILE):
+				continue
+			symbols = sections.setdefault(symbol.section, dict())
+			symbols[symbol.name] = symbols.get(symbol.name, 0) + symbol.size
+
+	return {"sections": sections, "totals": totals}
+
+
+def diff_snapshots(old, new):
+	"""
+	Compares two snapshots
+
+	param: old   The reference snapshot
+	param: new   The current snapshot
+
+	Returns a dictionary {section: [(symbol, old size, new size), ...]}
+	holding only the symbols that changed, the biggest growth first.
+	"""
+	rv = dict()
+	section_names = set(old["sections"]) | set(new["sections"])
+	for section in section_names:
+		old_symbols = old["sections"].get(section, dict())
+		new_symbols = new["sections"].get(section, dict())
+		changes = list()
+		for symbol in set(old_symbols) | set(new_symbols):
+			old_size = old_symbols.get(symbol, 0)
+			new_size = new_symbols.get(symbol, 0)
+			if old_size != new_size:
+				changes.append((symbol, old_size, new_size))
+		if changes:
+			changes.sort(key=lambda change: (change[1] - change[2], change[0]))
+			rv[section] = changes
+
+	return rv
+
+
+def format_diff(old, new, changes, top=10):
+	"""
+	Formats a size difference as a human readable report
+
+	param: old       The reference snapshot
+	param: new       The current snapshot
+	param: changes   The result of diff_snapshots()
+	param: top       How many growers and shrinkers to list per section
+	"""
+	txt = ""
+	section_names = sorted(set(old["totals"]) | set(new["totals"]))
+	for section in section_names:
+		old_total = old["totals"].get(section, 0)
+		new_total = new["totals"].get(section, 0)
+		section_changes = changes.get(section, list())
+		if old_total == new_total and not section_changes:
+			continue
+
+		txt += f"{section}: {new_total - old_total:+d} bytes ({old_total} -> {new_total})\n"
+		growers = [c for c in section_changes if c[2] > c[1]][:top]
+		shrinkers = [c for c in reversed(section_changes) if c[2] < c[1]][:top]
+		for symbol, old_size, new_size in growers + shrinkers:
+			txt += f"  {new_size - old_size:+8d}  {symbol}\n"
+
+	if txt == "":
+		txt = "No size changes\n"
+
+	return txt
+
+
+class SizeStore:
+	"""
+	Saved size snapshots of a port and target
+
+	Snapshots are saved per git commit in '<directory>/<commit>.json'.
+	Every recorded snapshot also appends its section totals in the
+	'history.jsonl' file so that trends can be shown.
+	"""
+
+	def __init__(self, directory, root=None):
+		"""
+		param: directory   Where the snapshots are stored
+		param: root        The project directory (its git repository) or None for the current one
+		"""
+		self.directory = directory
+		self.root = root
+
+	def record(self, snapshot):
+		"""
+		Saves a snapshot for the current commit and appends it in the history
+
+		param: snapshot   The snapshot to save
+		"""
+		os.makedirs(self.directory, exist_ok=True)
+		commit = get_commit_hash("HEAD", cwd=self.root)
+
+		snapshot_names = [LATEST_FILENAME]
+		if commit is not None:
+			snapshot_names.append(f"{commit}.json")
+		for name in snapshot_names:
+			with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+				json.dump(snapshot, f)
+
+		record = {
+			"time": int(time.time()),
+			"commit": commit,
+			"totals": snapshot["totals"]
+		}
+		with open(os.path.join(self.directory, HISTORY_FILENAME), "a", encoding="utf-8") as f:
+			f.write(json.dumps(record, sort_keys=True) + "\n")
+
+	def load(self, ref):
+		"""
+		Loads a saved snapshot
+
+		param: ref   A snapshot file path or a git reference
+
+		Returns the snapshot or None if it was never saved
+		"""
+		path = ref
+		if not os.path.isfile(path):
+			commit = get_commit_hash(ref, cwd=self.root)
+			if commit is None:
+				return None
+			path = os.path.join(self.directory, f"{commit}.json")
+			if not os.path.isfile(path):
+				return None
+
+		with open(path, "r", encoding="utf-8") as f:
+			return json.load(f)
+
+	def history(self):
+		"""
+		Returns the recorded section totals, oldest first
+		"""
+		rv = list()
+		path = os.path.join(self.directory, HISTORY_FILENAME)
+		if os.path.isfile(path):
+			with open(path, "r", encoding="utf-8") as f:
+				rv = [json.loads(line) for line in f if line.strip()]
+
+		return rv
+
+
+def get_commit_hash(ref, cwd=None):
+	"""
+	Resolves a git reference to a commit hash
+
+	param: ref   The git reference
+	param: cwd   A directory of the repository or None for the current one
+
+	Returns None if this is not a repository or the reference is unknown
+	"""
+	rv = run_command2(f"git rev-parse --verify --quiet {ref}^{{commit}}", cwd=cwd)
+	if rv is not None:
+		rv = rv.strip()
+		if rv == "":
+			rv = None
+
+	return rv
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Concurrent build processes
+
+Runs whole builds (e.g. one per port or per workspace member) as child
+processes that share one jobserver. The first process runs on the slot
+of macrame and every other one on a token, so the builds and their
+parallel jobs stay within one budget. A process starts once the tasks it
+depends on have succeeded.
+"""
+
+import os
+import time
+import select
+import subprocess
+
+
+class Task:
+	"""
+	A build process
+	"""
+
+	def __init__(self, name, command, log_path, cwd=None, deps=()):
+		"""
+		param: name       The name shown in the output
+		param: command    The argument list of the process
+		param: log_path   The file of its output
+		param: cwd        Its working directory or None for the current one
+		param: deps       The tasks that must succeed first
+		"""
+		self.name = name
+		self.command = command
+		self.log_path = log_path
+		self.cwd = cwd
+		self.deps = list(deps)
+		self.returncode = None
+		self.duration = None
+
+	@property
+	def status(self):
+		"""
+		'OK', 'FAILED' or 'SKIPPED' (not run)
+		"""
+		if self.returncode is None:
+			return "SKIPPED"
+		if self.returncode == 0:
+			return "OK"
+		return "FAILED"
+
+
+def run_tasks(tasks, jobserver, env=None, on_finish=None):
+	"""
+	Runs the tasks concurrently
+
+	Tasks whose dependencies failed are skipped.
+
+	param: tasks       The tasks, in the order they should start
+	param: jobserver   The core.jobserver.Jobserver that the processes share
+	param: env         The environment or None for the current one
+	param: on_finish   Called with every task that ended
+	"""
+	env = dict(env or os.environ, MAKEFLAGS=jobserver.makeflags())
+	# The makefiles read the dependencies only at the top level
+	env.pop("MAKELEVEL", None)
+	pending = list(tasks)
+	running = dict()
+	skipped = list()
+
+	while pending or running:
+		# Skip the tasks of the failed ones, and then the tasks of those
+		for task in list(pending):
+			if any(dep.returncode not in (None, 0) or dep in skipped for dep in task.deps):
+				pending.remove(task)
+				skipped.append(task)
+				print(f"Skipped {task.name}", flush=True)
+
+		ready = [t for t in pending if all(dep.returncode == 0 for dep in t.deps)]
+		while ready and (not running or jobserver.acquire()):
+			task = ready.pop(0)
+			pending.remove(task)
+			log_directory = os.path.dirname(task.log_path)
+			if log_directory:
+				os.makedirs(log_directory, exist_ok=True)
+			with open(task.log_path, "w", encoding="utf-8") as log:
+				process = subprocess.Popen(
+					task.command, stdout=log, stderr=subprocess.STDOUT, cwd=task.cwd, env=env,
+					pass_fds=jobserver.pass_fds)
+			running[process] = (task, time.monotonic())
+			print(f"Building {task.name}", flush=True)
+
+		if not running:
+			break
+
+		# Wake up for a free token or else for the end of a build
+		if ready:
+			select.select([jobserver.read_fd], [], [], 0.1)
+		else:
+			time.sleep(0.1)
+
+		for process in [p for p in running if p.poll() is not None]:
+			task, start = running.pop(process)
+			task.returncode = process.returncode
+			task.duration = time.monotonic() - start
+			if jobserver.held > max(0, len(running) - 1):
+				jobserver.release()
+			if on_finish is not None:
+				on_finish(task)
+			status = task.status if task.returncode == 0 else f"{task.status} ({task.log_path})"
+			print(f"Built {task.name}: {status}", flush=True)
+
+	for task in pending:
+		print(f"Skipped {task.name}", flush=True)
+
+
+def format_summary(tasks):
+	"""
+	Formats the results of the tasks as a table
+	"""
+	width = max([len("Build")] + [len(task.name) for task in tasks])
+	txt = f"{'Build':<{width}}  {'Status':<7} {'Time (s)':>8}  Log\n"
+	for task in tasks:
+		duration = "-" if task.duration is None else f"{task.duration:.1f}"
+		txt += f"{task.name:<{width}}  {task.status:<7} {duration:>8}  {task.log_path}\n"
+
+	return txt
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+Unit test runner
+
+Runs the CppUTest runner of the project ('tests.mk'). The test groups can
+be split in shards that run as concurrent processes:
+
+	groups = list_groups("bin/posix/dbg/blinky_runTests")
+	rv = run_tests("bin/posix/dbg/blinky_runTests", shards=4)
+
+Every shard runs its groups with '-sg' (exact group names) and its output
+is printed when it finishes.
+"""
+
+import os
+import subprocess
+from .core import process
+from .core.exceptions import UserInputError
+
+
+def list_groups(runner):
+	"""
+	Lists the test groups of a runner ('-lg')
+
+	Returns the group names
+	"""
+	result = process.run([runner, "-lg"], capture=True, stderr=False, stdin=subprocess.DEVNULL)
+	if result.returncode != 0:
+		raise UserInputError(f"The test groups of '{runner}' could not be listed")
+
+	return result.output.split()
+
+
+def plan_shards(groups, shards):
+	"""
+	Distributes the groups to the shards
+
+	Returns the list of group lists (no empty shard)
+	"""
+	rv = [groups[index::shards] for index in range(shards)]
+	return [shard for shard in rv if shard]
+
+
+def run_tests(runner, shards=1, args=("-c",)):
+	"""
+	Runs the tests
+
+	param: runner   The test runner program
+	param: shards   The number of concurrent processes
+	param: args     The options of the runner
+
+	Returns the exit code: 0 if every test passed
+	"""
+	runner = os.path.join(".", runner)
+	if shards <= 1:
+		return process.run([runner] + list(args)).returncode
+
+	commands = list()
+	for groups in plan_shards(list_groups(runner), shards):
+		command = [runner] + list(args)
+		for group in groups:
+			command += ["-sg", group]
+		commands.append(command)
+
+	rv = 0
+	for index, result in enumerate(process.run_all(commands, capture=True, stdin=subprocess.DEVNULL)):
+		if isinstance(result, Exception):
+			raise UserInputError(f"'{runner}' could not run: {result}")
+		print(f"[shard {index + 1}/{len(commands)}]")
+		print(result.output, end="")
+		if result.returncode != 0:
+			rv = 1
+
+	return rv
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Unity (jumbo) builds
+
+The sources of a language are batched in a few unity files that include
+them, so every batch compiles as one translation unit: the headers are
+parsed once per batch and the compiler sees more code to inline.
+
+Sources that do not compile together (e.g. static functions with the
+same name) are listed in the UNITY_EXCLUDE make variable and compiled
+individually.
+"""
+
+import os
+import fnmatch
+from .core.utils import AtomicWriter
+from .core.utils import in_root
+
+
+def plan_batches(sources, weights, count):
+	"""
+	Splits sources in balanced batches
+
+	The heaviest source goes to the lightest batch first (longest
+	processing time first). The sources of a batch keep their order.
+
+	param: sources   The source paths
+	param: weights   {source: weight} (e.g. compile time or size)
+	param: count     The number of batches
+
+	Returns the list of batches (lists of sources)
+	"""
+	count = max(1, min(count, len(sources)))
+	batches = [list() for _ in range(count)]
+	loads = [0] * count
+
+	for source in sorted(sources, key=lambda s: (-weights.get(s, 0), s)):
+		index = loads.index(min(loads))
+		batches[index].append(source)
+		loads[index] += weights.get(source, 0)
+
+	return [sorted(batch) for batch in batches if batch]
+
+
+def is_excluded(source, patterns):
+	"""
+	True if a source matches one of the UNITY_EXCLUDE patterns
+	"""
+	return any(fnmatch.fnmatch(source, pattern) for pattern in patterns)
+
+
+def write_unity_files(directory, name, extension, batches, root=None):
+	"""
+	Writes the unity files of a language
+
+	Files are only rewritten when their content changes, so unchanged
+	batches are not compiled again.
+
+	param: directory   Where the unity files are written
+	param: name        File name prefix (e.g. 'cc')
+	param: extension   The source extension (e.g. '.c')
+	param: batches     The batches of sources
+	param: root        The project directory the paths are relative to or None for the current one
+
+	Returns the list of unity file paths
+	"""
+	rv = list()
+	for index, batch in enumerate(batches):
+		path = os.path.join(directory, f"{name}_{index}{extension}").replace(os.sep, "/")
+		with AtomicWriter(in_root(root, path)) as f:
+			f.write("/* Generated by macrame. Do not edit. */\n\n")
+			for source in batch:
+				f.write(f"#include \"{os.path.relpath(source, directory)}\"\n")
+		rv.append(path)
+
+	# Batches of a previous, bigger split
+	index = len(batches)
+	while os.path.isfile(in_root(root, os.path.join(directory, f"{name}_{index}{extension}"))):
+		os.remove(in_root(root, os.path.join(directory, f"{name}_{index}{extension}")))
+		index += 1
+
+	return rv
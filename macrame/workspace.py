@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+"""
+Workspaces of projects
+
+A 'macrame-workspace.toml' at the root of a repository lists its member
+projects:
+
+	[workspace]
+	ccache_dir = "tmp/ccache"
+
+	[[member]]
+	path = "libs/hal"
+
+	[[member]]
+	path = "apps/blinky"
+	depends = ["libs/hal"]
+	port = "posix"
+
+'mac workspace build' runs the make of every member from one macrame
+process, so there is no interpreter start and no argument parsing per
+project. The makes share one jobserver (one budget of parallel jobs) and
+one ccache directory. Members start as soon as the members they depend on
+are built, so independent members build concurrently.
+"""
+
+import os
+import shlex
+import toml
+from .core.exceptions import UserInputError
+from .core.jobserver import Jobserver
+from .core.utils import egrep
+from .configuration.config import Tool
+from .makefile import MakefileBuildManager
+from .tasks import Task
+from .tasks import format_summary
+from .tasks import run_tasks
+
+MANIFEST_NAME = "macrame-workspace.toml"
+
+# The shared ccache directory, relative to the workspace root
+DEFAULT_CCACHE_DIR = os.path.join("tmp", "ccache")
+
+
+def find_manifest(directory=None):
+	"""
+	Finds the workspace manifest in a directory or its parents
+
+	param: directory   Where the search starts or None for the working directory
+
+	Returns the manifest path or None
+	"""
+	directory = os.path.abspath(directory or os.getcwd())
+	while True:
+		path = os.path.join(directory, MANIFEST_NAME)
+		if os.path.isfile(path):
+			return path
+		parent = os.path.dirname(directory)
+		if parent == directory:
+			return None
+		directory = parent
+
+
+class Member:
+	"""
+	A project of the workspace
+	"""
+
+	def __init__(self, root, path, depends=(), port=None, target=None):
+		"""
+		param: root      The workspace root directory
+		param: path      The project directory, relative to the root
+		param: depends   The paths of the members built first
+		param: port      The port name or None for the first one
+		param: target    The target or None for the one of the command
+		"""
+		self.root = root
+		self.path = os.path.normpath(path)
+		self.depends = [os.path.normpath(p) for p in depends]
+		self.port = port
+		self.target = target
+
+	@property
+	def directory(self):
+		"""
+		The absolute project directory
+		"""
+		return os.path.join(self.root, self.path)
+
+
+class Workspace:
+	"""
+	The member projects of a manifest
+	"""
+
+	def __init__(self, manifest_path):
+		"""
+		param: manifest_path   The 'macrame-workspace.toml'
+		"""
+		self.manifest_path = os.path.abspath(manifest_path)
+		self.root = os.path.dirname(self.manifest_path)
+		try:
+			manifest = toml.load(self.manifest_path)
+		except (OSError, ValueError) as e:
+			raise UserInputError(f"Could not read the workspace manifest '{manifest_path}': {e}") from e
+
+		settings = manifest.get("workspace", dict())
+		self.ccache_dir = os.path.join(self.root, settings.get("ccache_dir", DEFAULT_CCACHE_DIR))
+		self.members = list()
+		for entry in manifest.get("member", list()):
+			if "path" not in entry:
+				raise UserInputError(f"A member of '{manifest_path}' has no 'path'")
+			self.members.append(Member(
+				self.root,
+				entry["path"],
+				depends=entry.get("depends", list()),
+				port=entry.get("port"),
+				target=entry.get("target")))
+
+		self.validate()
+
+	@classmethod
+	def find(cls, directory=None):
+		"""
+		Loads the workspace of a directory or its parents
+		"""
+		path = find_manifest(directory)
+		if path is None:
+			raise UserInputError(f"No '{MANIFEST_NAME}' was found in the directory or its parents")
+		return cls(path)
+
+	def validate(self):
+		"""
+		Checks the member directories and their dependencies
+		"""
+		paths = [member.path for member in self.members]
+		for member in self.members:
+			if not os.path.isdir(member.directory):
+				raise UserInputError(f"The member directory '{member.path}' does not exist")
+			for dep in member.depends:
+				if dep not in paths:
+					raise UserInputError(f"Member '{member.path}' depends on '{dep}' that is not a member")
+
+		# Dependency cycles
+		done = set()
+		while len(done) < len(self.members):
+			ready = [
+				m.path for m in self.members
+				if m.path not in done and all(d in done for d in m.depends)]
+			if not ready:
+				cycle = ", ".join(m.path for m in self.members if m.path not in done)
+				raise UserInputError(f"The dependencies of the members are circular: {cycle}")
+			done.update(ready)
+
+	def build(self, target="dbg", jobs=None, use_local_makefile=True):
+		"""
+		Builds all the members
+
+		param: target               The target of the members that do not set one
+		param: jobs                 The total number of parallel jobs or None for all CPUs
+		param: use_local_makefile   False to use the makefiles of macrame
+
+		Returns the exit code: 0 if all the members were built
+		"""
+		tasks = dict()
+		managers = dict()
+		for member in self.members:
+			manager = MakefileBuildManager(
+				port_name=member.port or "",
+				use_local_makefile=use_local_makefile,
+				target=member.target or target,
+				directory=member.directory)
+			command = shlex.split(manager.make_command()) + ["--output-sync=target"]
+			log_path = os.path.join(member.directory, manager.tmp_outdir, "build.log")
+			managers[member.path] = manager
+			tasks[member.path] = Task(member.path, command, log_path, cwd=member.directory)
+		for member in self.members:
+			tasks[member.path].deps = [tasks[dep] for dep in member.depends]
+
+		def record_size(task):
+			manager = managers[task.name]
+			if task.returncode == 0 and os.path.isfile(os.path.join(task.cwd, manager.elf_path)):
+				manager.record_size()
+
+		env = dict(os.environ, CCACHE_DIR=self.ccache_dir, CCACHE_BASEDIR=self.root)
+		jobserver = Jobserver.inherit()
+		if jobserver is None:
+			jobserver = Jobserver.create(jobs or os.cpu_count() or 1)
+		with jobserver:
+			run_tasks(list(tasks.values()), jobserver, env=env, on_finish=record_size)
+
+		print()
+		print(format_summary(list(tasks.values())), end="")
+
+		return 0 if all(task.returncode == 0 for task in tasks.values()) else 1
+
+	def clean(self, use_local_makefile=True):
+		"""
+		Cleans the generated files of all the members
+
+		Returns the exit code: 0 if all the members were cleaned
+		"""
+		rv = 0
+		for member in self.members:
+			print(f"[{member.path}]", flush=True)
+			manager = MakefileBuildManager(use_local_makefile=use_local_makefile, directory=member.directory)
+			rv = manager.clean() or rv
+
+		return rv
+
+	def todo(self, keywords, whole_words=False):
+		"""
+		Lists the todo keywords of all the members
+		"""
+		rv = 0
+		for member in self.members:
+			print(f"[{member.path}]", flush=True)
+			for keyword in keywords:
+				rv = egrep(keyword, whole_words=whole_words, cwd=member.directory) or rv
+
+		return rv
+
+	def tool(self):
+		"""
+		Checks the tools of the members ('tools.toml')
+
+		Returns 1 if a tool is missing or has the wrong version
+		"""
+		rv = 0
+		checked = dict()
+		for member in self.members:
+			path = os.path.join(member.directory, "tools.toml")
+			if not os.path.isfile(path):
+				continue
+			print(f"[{member.path}]")
+			for entry in toml.load(path).get("Tool", list()):
+				tool = Tool(entry)
+				# Members often require the same tools
+				key = str(tool)
+				if key not in checked:
+					checked[key] = tool.check()
+				requirement = f"{entry.get('name')} {entry.get('compare')} {entry.get('version')}"
+				print(f"{requirement}: {'OK' if checked[key] else 'FAILED'}")
+				if not checked[key]:
+					rv = 1
+
+		return rv
@@ -57,6 +57,7 @@ setup(
 	download_url=f"https://github.com/TediCreations/{packageName}/archive/" + about['__version__'] + '.tar.gz',
 	keywords=['build', 'make', 'util'],
 	install_requires=dependencies,
+	python_requires='>=3.9',
 	package_data={'macrame': ["../" + filepath for filepath in list_all_files_recursively('static/')]},
 	include_package_data=True,
 	entry_points={
@@ -71,6 +72,9 @@ setup(
 		'Topic :: Software Development :: Build Tools',
 		'License :: OSI Approved :: MIT License',
 		'Programming Language :: Python :: 3',
-		'Programming Language :: Python :: 3.6',
+		'Programming Language :: Python :: 3.9',
+		'Programming Language :: Python :: 3.10',
+		'Programming Language :: Python :: 3.11',
+		'Programming Language :: Python :: 3.12',
 	],
 )
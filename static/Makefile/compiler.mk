@@ -4,7 +4,8 @@
 #    Ccache
 #
 
-export CCACHE_DIR=/tmp/ccache/makefile/$(PROJ_NAME)
+# Shared by the projects of a workspace when set in the environment
+export CCACHE_DIR ?= /tmp/ccache/makefile/$(PROJ_NAME)
 CCACHE=ccache
 
 ################################################################################
@@ -38,6 +39,27 @@ CPPFLAGS += -MT $@ -MMD -MP -MF $(@:%.o=%.Td)
 # Generate listing
 CPPFLAGS += -Wa,-a,-ad,-alms=$(@:%.o=%.lst)
 
+# Stack usage (.su) and call graph (.ci) of every function for 'mac memory'
+STACK_USAGE ?= no
+ifeq ($(STACK_USAGE),yes)
+  CPPFLAGS += -fstack-usage -fcallgraph-info=su
+endif
+
+# Precompiled headers per language, injected by 'mac build --pch'
+PCH_CC  ?=
+PCH_CXX ?=
+PCH_CFLAGS   :=
+PCH_CXXFLAGS :=
+ifneq ($(PCH_CC),)
+  PCH_CFLAGS   := -include $(PCH_CC) -Winvalid-pch -fpch-preprocess
+endif
+ifneq ($(PCH_CXX),)
+  PCH_CXXFLAGS := -include $(PCH_CXX) -Winvalid-pch -fpch-preprocess
+endif
+ifneq ($(PCH_CC)$(PCH_CXX),)
+  export CCACHE_SLOPPINESS := pch_defines,time_macros
+endif
+
 # Debug/Release flags
 ifeq ($(TARGET),dbg)
   CPPFLAGS+=-g3 -Og -gdwarf-2 -DDEBUG
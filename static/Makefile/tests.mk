@@ -73,6 +73,24 @@ TEST_CFLAGS     += $(CFLAGS)
 TEST_CXXFLAGS   += $(CXXFLAGS)
 TEST_LDFLAGS    += $(LDFLAGS)
 
+#.................................................
+#    Coverage
+
+# 'yes' builds the test objects with coverage instrumentation (see 'mac test --coverage')
+COVERAGE ?= no
+
+ifeq ($(COVERAGE),yes)
+  TEST_OUTDIR    := $(patsubst %/test/,%/coverage/,$(TEST_OUTDIR))
+  TEST_RUNNER    := $(BIN_OUTDIR)$(PROJ_NAME)_coverage
+  TEST_CPPFLAGS  += --coverage
+  TEST_LDFLAGS   += --coverage
+else
+  TEST_RUNNER    := $(BIN_OUTDIR)$(PROJ_NAME)_runTests
+endif
+
+# Options of the test runner
+TEST_ARGS ?= -c
+
 #.................................................
 #    Toolchain
 
@@ -93,9 +111,9 @@ TEST_LINK        ?= $(TEST_LD)     $^ -o $@ $(TEST_CPPFLAGS) $(TEST_LDFLAGS)
 
 ifdef TESTS_EXIST
 .PHONY: runCppUtest
-runCppUtest: $(BIN_OUTDIR)$(PROJ_NAME)_runTests
+runCppUtest: $(TEST_RUNNER)
 	@$(ECHO_E) $(BLACK)"[TEST] "$(BLUE)"CppUTest"$(RESET)
-	@./$< -c
+	@./$< $(TEST_ARGS)
 else
 .PHONY: runCppUtest
 runCppUtest:
@@ -104,17 +122,20 @@ runCppUtest:
 endif
 
 # Build test program
-$(BIN_OUTDIR)$(PROJ_NAME)_runTests: $(TEST_OBJS)
+.PHONY: testRunner
+testRunner: $(TEST_RUNNER)
+
+$(TEST_RUNNER): $(TEST_OBJS)
 	@$(ECHO_NE) $(BLACK)"[TEST] "$(BLUE)"LD  "$(RESET)"$@ "
 	@$(MKDIR_P) $(dir $@)
-	@$(TEST_LINK) 2>&1 | $(TEE) $(@:%.to=%.terr) | $(XARGS_R0) $(ECHO_E) $(RED)"FAIL\n\n"$(RESET)
+	@$(call runCaptured,$(TEST_LINK),$@.err)
 	@$(ECHO_E) $(GREEN)"OK"$(RESET)
 
 # Create test object from Assembly source code
 $(TEST_OUTDIR)%.o: %.s $(TEST_OUTDIR)%.d $(AUX)
 	@$(ECHO_NE) $(BLACK)"[TEST] "$(BLUE)"AS  "$(RESET)"$< "
 	@$(MKDIR_P) $(dir $@)
-	@$(TEST_COMPILE.AS) 2>&1 | $(TEE) $(@:%.to=%.terr) | $(XARGS_R0) $(ECHO_E) $(RED)"FAIL\n\n"$(RESET)
+	@$(call runCaptured,$(TEST_COMPILE.AS),$(@:%.o=%.err))
 	@$(MV_F) $(@:%.o=%.Td) $(@:%.o=%.d) && $(TOUCH) $@ || { $(ECHO_E) $(RED)"FAIL\n\n"$(RESET); exit 1; }
 	@$(ECHO_E) $(GREEN)"OK"$(RESET)
 
@@ -122,7 +143,7 @@ $(TEST_OUTDIR)%.o: %.s $(TEST_OUTDIR)%.d $(AUX)
 $(TEST_OUTDIR)%.o: %.c $(TEST_OUTDIR)%.d $(AUX)
 	@$(ECHO_NE) $(BLACK)"[TEST] "$(BLUE)"CC  "$(RESET)"$< "
 	@$(MKDIR_P) $(dir $@)
-	@$(TEST_COMPILE.CC) 2>&1 | $(TEE) $(@:%.to=%.terr) | $(XARGS_R0) $(ECHO_E) $(RED)"FAIL\n\n"$(RESET)
+	@$(call runCaptured,$(TEST_COMPILE.CC),$(@:%.o=%.err))
 	@$(MV_F) $(@:%.o=%.Td) $(@:%.o=%.d) && $(TOUCH) $@ || { $(ECHO_E) $(RED)"FAIL\n\n"$(RESET); exit 1; }
 	@$(ECHO_E) $(GREEN)"OK"$(RESET)
 
@@ -130,7 +151,7 @@ $(TEST_OUTDIR)%.o: %.c $(TEST_OUTDIR)%.d $(AUX)
 $(TEST_OUTDIR)%.o: %.cpp $(TEST_OUTDIR)%.d $(AUX)
 	@$(ECHO_NE) $(BLACK)"[TEST] "$(BLUE)"CXX "$(RESET)"$< "
 	@$(MKDIR_P) $(dir $@)
-	@$(TEST_COMPILE.CXX) 2>&1 | $(TEE) $(@:%.to=%.terr) | $(XARGS_R0) $(ECHO_E) $(RED)"FAIL\n\n"$(RESET)
+	@$(call runCaptured,$(TEST_COMPILE.CXX),$(@:%.o=%.err))
 	@$(MV_F) $(@:%.o=%.Td) $(@:%.o=%.d) && $(TOUCH) $@ || { $(ECHO_E) $(RED)"FAIL\n\n"$(RESET); exit 1; }
 	@$(ECHO_E) $(GREEN)"OK"$(RESET)
 
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+
+import os
+import pytest
+from macrame.core import process
+
+
+@pytest.fixture(scope="session", autouse=True)
+def launcher_cache(tmp_path_factory):
+	"""
+	Builds the launcher of core.process in a temporary cache directory
+	"""
+	previous = os.environ.get("XDG_CACHE_HOME")
+	os.environ["XDG_CACHE_HOME"] = str(tmp_path_factory.mktemp("cache"))
+	process.launcher_path.cache_clear()
+	yield
+	process.launcher_path.cache_clear()
+	if previous is None:
+		del os.environ["XDG_CACHE_HOME"]
+	else:
+		os.environ["XDG_CACHE_HOME"] = previous
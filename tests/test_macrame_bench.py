@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+import shutil
+import pytest
+from macrame.bench import compare
+from macrame.bench import describe
+from macrame.bench import mann_whitney
+from macrame.bench import measure
+from macrame.core import process
+from macrame.core.exceptions import UserInputError
+
+
+class TestClass:
+
+	def test_describe(self):
+		stats = describe([1.0, 2.0, 3.0, 10.0])
+		assert stats["mean"] == 4.0
+		assert stats["median"] == 2.5
+		assert (stats["min"], stats["max"]) == (1.0, 10.0)
+		assert round(stats["stdev"], 3) == 4.082
+
+	def test_mann_whitney(self):
+		old = [1.00, 1.02, 0.99, 1.01, 1.03, 0.98, 1.00, 1.01, 0.99, 1.02]
+		new = [1.20, 1.22, 1.19, 1.21, 1.23, 1.18, 1.20, 1.21, 1.19, 1.22]
+		assert mann_whitney(new, old) < 0.001
+		assert mann_whitney(old, list(old)) > 0.9
+		assert mann_whitney([1.0] * 5, [1.0] * 5) == 1.0
+
+	def test_compare(self):
+		baseline = {"wall": [1.0, 1.01, 0.99] * 4, "cpu": [0.5] * 12, "max_rss": [1000] * 12}
+		samples = {"wall": [1.3, 1.31, 1.29] * 4, "cpu": [0.5] * 12, "max_rss": [1000] * 12}
+		results = {metric: (round(change), significant) for metric, change, _, significant in compare(samples, baseline)}
+		assert results == {"wall": (30, True), "cpu": (0, False), "max_rss": (0, False)}
+
+	def test_measure(self):
+		true = shutil.which("true")
+		samples = measure(true, runs=2, warmup=0)
+		assert len(samples["wall"]) == len(samples["cpu"]) == 2
+		if process.launcher_path() is None:
+			assert "max_rss" not in samples
+		else:
+			# The program alone, not the interpreter
+			assert max(samples["max_rss"]) < 16 * 1024 * 1024
+
+		with pytest.raises(UserInputError):
+			measure(shutil.which("false"), runs=2)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+import os
+from macrame.compiledb import CompileDatabase
+from macrame.compiledb import compile_entries
+from macrame.scheduler import Job
+
+
+class TestClass:
+
+	def test_entries(self):
+		jobs = [
+			Job("CC", "[posix]", "obj/src/a.o", ["src/a.c"], "ccache gcc -c src/a.c -o obj/src/a.o -DX='a b'"),
+			Job("LD", "[posix]", "bin/p.elf", ["obj/src/a.o"], "gcc obj/src/a.o -o bin/p.elf"),
+			Job("CC", "[TEST]", "test/src/a.o", ["src/a.c"], "g++ -c src/a.c -o test/src/a.o"),
+			Job("CXX", "[TEST]", "test/tests/t.o", ["tests/t.cpp"], "g++ -c tests/t.cpp -o test/tests/t.o"),
+		]
+		entries = compile_entries(jobs, "/project")
+		assert [e["file"] for e in entries] == ["src/a.c", "tests/t.cpp"]
+		assert entries[0]["arguments"] == ["gcc", "-c", "src/a.c", "-o", "obj/src/a.o", "-DX=a b"]
+		assert entries[0]["directory"] == "/project"
+		assert entries[0]["output"] == "obj/src/a.o"
+
+	def test_cached_entries(self, tmp_path, monkeypatch):
+		monkeypatch.chdir(tmp_path)
+		calls = list()
+
+		class Manager:
+			directory = str(tmp_path)
+			tmp_outdir = str(tmp_path / "tmp")
+			makefile_path = "Makefile"
+
+			def jobs(self, variables=None):
+				calls.append(variables)
+				return [Job("CC", "[posix]", "obj/src/a.o", ["src/a.c"], "gcc -c src/a.c -o obj/src/a.o", aux=["Makefile"])]
+
+			def fingerprint(self, files, variables):
+				return " ".join(files)
+
+		database = CompileDatabase(Manager(), str(tmp_path / "tmp" / "compile_commands.json"))
+		assert [e["file"] for e in database.entries()] == ["src/a.c"]
+		assert [e["file"] for e in database.entries()] == ["src/a.c"]
+		# The makefiles are evaluated once
+		assert len(calls) == 1
+		assert os.path.isfile(str(tmp_path / "tmp" / "compile_commands.json.cache"))
+		assert not os.path.exists("compile_commands.json")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+import io
+import shutil
+import subprocess
+import pytest
+from macrame.convert import convert
+from macrame.convert import loadable_sections
+from macrame.convert import write_binary
+from macrame.convert import write_ihex
+from macrame.core.elf import ElfFile
+from macrame.core.elf import STB_LOCAL
+from macrame.core.elf import STT_OBJECT
+from macrame.core.exceptions import UserInputError
+
+SOURCE = """
+const char message[] = "read only data";
+int counter = 42;
+static char buffer[64];
+__attribute__((weak)) int tunable = 1;
+
+static int helper(int value)
+{
+	return value + buffer[1];
+}
+
+void _start(void)
+{
+	buffer[0] = message[0];
+	counter = helper(counter);
+	for (;;);
+}
+"""
+
+# The code crosses a 64KiB boundary and the data are loaded right after
+# the read only data, with gaps between the three
+LINKER_SCRIPT = """
+ENTRY(_start)
+SECTIONS
+{
+	.text 0xfff8 : { *(.text*) }
+	.rodata 0x30000 : { *(.rodata*) }
+	.data 0x40000 : AT(0x31000) { *(.data*) }
+	.bss : { *(.bss*) }
+	/DISCARD/ : { *(.note*) *(.eh_frame*) *(.comment) }
+}
+"""
+
+
+@pytest.fixture(scope="module")
+def elf_path(tmp_path_factory):
+	"""
+	A small executable linked at fixed addresses
+	"""
+	if shutil.which("gcc") is None:
+		pytest.skip("gcc is not installed")
+
+	directory = tmp_path_factory.mktemp("elf")
+	(directory / "test.c").write_text(SOURCE)
+	(directory / "test.ld").write_text(LINKER_SCRIPT)
+	result = subprocess.run(
+		["gcc", "-O0", "-fno-pie", "-no-pie", "-nostdlib", "-static", "-ffreestanding",
+		 "-fno-asynchronous-unwind-tables", "-Wl,-T,test.ld", "-Wl,--build-id=none", "-o", "test.elf", "test.c"],
+		cwd=directory, capture_output=True, check=False)
+	if result.returncode != 0:
+		pytest.skip("gcc can not link a static executable")
+
+	return str(directory / "test.elf")
+
+
+def _parse_ihex(txt):
+	"""
+	Returns the records (type, address, data), checking their checksums
+	"""
+	rv = list()
+	for line in txt.splitlines():
+		assert line.startswith(":")
+		raw = bytes.fromhex(line[1:])
+		assert sum(raw) & 0xff == 0
+		assert raw[0] == len(raw) - 5
+		rv.append((raw[3], (raw[1] << 8) | raw[2], raw[4:-1]))
+	return rv
+
+
+class TestClass:
+
+	def test_elf_file(self, elf_path):
+		with ElfFile(elf_path) as elf:
+			assert elf.elf_class in (32, 64)
+			assert elf.section(".text").addr == 0xfff8
+			assert elf.section(".nope") is None
+			symbols = {symbol.name: symbol for symbol in elf.symbols()}
+			assert elf.entry == symbols["_start"].value
+
+			counter = symbols["counter"]
+			assert (counter.value, counter.size, counter.type, counter.section) == (0x40000, 4, STT_OBJECT, ".data")
+			assert symbols["buffer"].bind == STB_LOCAL
+			with elf.data(elf.section(".rodata").offset, 14) as data:
+				assert bytes(data) == b"read only data"
+
+			# The data are loaded after the read only data
+			assert [(lma, section.name) for lma, section in loadable_sections(elf)] == [
+				(0xfff8, ".text"), (0x30000, ".rodata"), (0x31000, ".data")]
+
+	def test_invalid(self, tmp_path):
+		(tmp_path / "empty.elf").write_bytes(b"")
+		(tmp_path / "text.elf").write_bytes(b"not an ELF file")
+		(tmp_path / "truncated.elf").write_bytes(b"\x7fELF\x02\x01\x01" + bytes(9))
+		for name in ("empty.elf", "text.elf", "truncated.elf"):
+			with pytest.raises(UserInputError):
+				ElfFile(str(tmp_path / name))
+
+	def test_binary(self, elf_path, tmp_path):
+		with ElfFile(elf_path) as elf:
+			f = io.BytesIO()
+			write_binary(elf, f)
+			image = f.getvalue()
+			with elf.data(elf.section(".text").offset, elf.section(".text").size) as text:
+				text = bytes(text)
+
+		assert len(image) == 0x31008 - 0xfff8
+		assert image[:len(text)] == text
+		# The gaps are filled with zeros
+		assert image[len(text):0x30000 - 0xfff8] == bytes(0x30000 - 0xfff8 - len(text))
+		assert image[0x30000 - 0xfff8:0x3000e - 0xfff8] == b"read only data"
+		assert image[0x31000 - 0xfff8:] == (42).to_bytes(4, "little") + (1).to_bytes(4, "little")
+
+		if shutil.which("objcopy") is not None:
+			subprocess.run(["objcopy", "-O", "binary", elf_path, str(tmp_path / "test.bin")], check=True)
+			assert image == (tmp_path / "test.bin").read_bytes()
+
+	def test_ihex(self, elf_path):
+		with ElfFile(elf_path) as elf:
+			f = io.StringIO()
+			write_ihex(elf, f)
+			entry = elf.entry
+			binary = io.BytesIO()
+			write_binary(elf, binary)
+			size = sum(section.size for _, section in loadable_sections(elf))
+
+		records = _parse_ihex(f.getvalue())
+		assert records[-1] == (0x01, 0, b"")
+
+		memory = dict()
+		upper = 0
+		for record_type, address, data in records[:-1]:
+			if record_type == 0x04:
+				upper = int.from_bytes(data, "big")
+			elif record_type == 0x00:
+				# Records never cross a 64KiB boundary
+				assert address + len(data) <= 0x10000
+				for index, byte in enumerate(data):
+					memory[(upper << 16) + address + index] = byte
+			elif record_type == 0x03:
+				assert ((data[0] << 12) | (data[2] << 8) | data[3]) == entry
+
+		# Extended linear address records for the code past 64KiB and the data
+		assert [data for record_type, _, data in records if record_type == 0x04] == [b"\x00\x01", b"\x00\x03"]
+		# Only the sections are in the records, not the gaps between them
+		assert min(memory) == 0xfff8
+		assert 0x20000 not in memory
+		assert len(memory) == size
+		image = binary.getvalue()
+		assert all(image[address - 0xfff8] == byte for address, byte in memory.items())
+
+	def test_symbols(self, elf_path, tmp_path):
+		sym_path = str(tmp_path / "test.sym")
+		assert convert(elf_path, sym_path=sym_path) == [sym_path]
+		with open(sym_path, "r", encoding="utf-8") as f:
+			lines = f.read().splitlines()
+
+		names = [line.split()[-1] for line in lines]
+		assert names == ["helper", "_start", "message", "counter", "tunable", "buffer"]
+		if shutil.which("nm") is not None:
+			expected = subprocess.run(["nm", "-n", elf_path], capture_output=True, check=True, text=True)
+			assert lines == expected.stdout.splitlines()
+
+		# Unchanged outputs are not rewritten
+		assert convert(elf_path, sym_path=sym_path) == list()
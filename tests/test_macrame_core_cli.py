@@ -0,0 +1,28 @@
+from macrame.core.cli import Command
+from macrame.core.cli import Parser
+
+
+class EchoCommand(Command):
+
+	def config(self):
+		self.subparser.add_argument('--fail', action='store_true')
+
+	def run(self, args):
+		if args.fail:
+			self.error("failed")
+		return 7 if self.getArgument("fail") is False else 0
+
+
+class TestClass:
+
+	def test_parsers_are_independent(self):
+		for _ in range(2):
+			parser = Parser("prog", "", "")
+			EchoCommand(parser, "echo")
+			assert parser.handle(["echo"]) == 7
+
+	def test_errors_do_not_exit(self, capsys):
+		parser = Parser("prog", "", "")
+		EchoCommand(parser, "echo")
+		assert parser.handle(["echo", "--fail"]) == 1
+		assert "failed" in capsys.readouterr().out
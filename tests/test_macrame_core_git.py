@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import subprocess
+import pytest
+from macrame.core.git import GitRepository
+from macrame.core.git import find_git_dir
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _git(root, *args, date=None):
+	env = dict(
+		os.environ,
+		GIT_CONFIG_NOSYSTEM="1", HOME=str(root),
+		GIT_AUTHOR_NAME="a", GIT_AUTHOR_EMAIL="a@b", GIT_COMMITTER_NAME="a", GIT_COMMITTER_EMAIL="a@b")
+	if date is not None:
+		env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"{1700000000 + date * 60} +0200"
+	return subprocess.run(
+		["git"] + list(args), cwd=root, env=env, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _commit(root, number, content=None):
+	path = os.path.join(root, "file.txt")
+	with open(path, "a", encoding="utf-8") as f:
+		f.write(content or f"line {number}\n")
+	_git(root, "add", "file.txt")
+	_git(root, "commit", "-q", "-m", f"Commit {number}\n\nBody", date=number)
+	return _git(root, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def repo(tmp_path):
+	"""
+	A repository with branches, merges and tags:
+
+	  1 - 2 (v1.0) - 3 - 6 (merge) - 8 (merge) - 9
+	       \\- 4 (lw) - 5 -/         /
+	        \\- 7 (v2.0, annotated) -/
+	"""
+	root = str(tmp_path / "repo")
+	os.makedirs(root)
+	_git(root, "init", "-q", "-b", "master")
+	_commit(root, 1, "".join(f"base line {i}\n" for i in range(500)))
+	_commit(root, 2)
+	_git(root, "tag", "v1.0")
+	_git(root, "branch", "side")
+	_git(root, "branch", "other")
+	_commit(root, 3)
+	_git(root, "checkout", "-q", "side")
+	with open(os.path.join(root, "side.txt"), "w", encoding="utf-8") as f:
+		f.write("side\n")
+	_git(root, "add", "side.txt")
+	_git(root, "commit", "-q", "-m", "Commit 4", date=4)
+	_git(root, "tag", "lw")
+	_git(root, "commit", "-q", "--allow-empty", "-m", "Commit 5", date=5)
+	_git(root, "checkout", "-q", "master")
+	_git(root, "merge", "-q", "--no-ff", "-m", "Commit 6", "side", date=6)
+	_git(root, "checkout", "-q", "other")
+	with open(os.path.join(root, "other.txt"), "w", encoding="utf-8") as f:
+		f.write("other\n")
+	_git(root, "add", "other.txt")
+	_git(root, "commit", "-q", "-m", "Commit 7", date=7)
+	_git(root, "tag", "-a", "-m", "Release 2.0", "v2.0", date=7)
+	_git(root, "checkout", "-q", "master")
+	_git(root, "merge", "-q", "--no-ff", "-m", "Commit 8", "other", date=8)
+	_commit(root, 9)
+	return root
+
+
+def _objects(root):
+	"""
+	The names of all the objects of a repository
+	"""
+	output = _git(root, "cat-file", "--batch-all-objects", "--batch-check=%(objectname)")
+	return output.split()
+
+
+def _check_objects(root):
+	"""
+	Reads every object in-process and compares it with git
+	"""
+	with GitRepository(root) as repo:
+		for sha in _objects(root):
+			object_type, content = repo.read_object(sha)
+			assert object_type == _git(root, "cat-file", "-t", sha)
+			expected = subprocess.run(
+				["git", "cat-file", object_type, sha], cwd=root, check=True, capture_output=True).stdout
+			assert content == expected
+
+
+def _delta_types(root):
+	"""
+	The pack object types of the objects of a repository
+	"""
+	rv = set()
+	with GitRepository(root) as repo:
+		for sha in _objects(root):
+			for pack in repo._get_packs():
+				offset = pack.find(sha)
+				if offset is not None:
+					rv.add((pack.data[offset] >> 4) & 7)
+	return rv
+
+
+class TestClass:
+
+	def test_find_git_dir(self, repo, tmp_path):
+		os.makedirs(os.path.join(repo, "sub", "dir"))
+		assert find_git_dir(os.path.join(repo, "sub", "dir")) == os.path.join(repo, ".git")
+		assert find_git_dir(str(tmp_path)) is None
+
+	def test_loose_objects(self, repo):
+		assert not os.listdir(os.path.join(repo, ".git", "objects", "pack"))
+		_check_objects(repo)
+
+		with GitRepository(repo) as git:
+			ref, head = git.head()
+			assert (ref, head) == ("refs/heads/master", _git(repo, "rev-parse", "HEAD"))
+			commit = git.commit(head)
+			assert commit.subject == "Commit 9"
+			assert (commit.time, commit.timezone) == (1700000000 + 9 * 60, "+0200")
+			assert commit.parents == [_git(repo, "rev-parse", "HEAD^")]
+			with pytest.raises(KeyError):
+				git.read_object("0" * 40)
+
+	def test_packed_objects(self, repo):
+		# Offset deltas (the default of repack)
+		_git(repo, "repack", "-q", "-a", "-d", "-f", "--window=10", "--depth=10")
+		assert not [d for d in os.listdir(os.path.join(repo, ".git", "objects")) if len(d) == 2]
+		assert 6 in _delta_types(repo)
+		_check_objects(repo)
+
+		# Reference deltas
+		_git(repo, "-c", "repack.useDeltaBaseOffset=false", "repack", "-q", "-a", "-d", "-f")
+		assert 7 in _delta_types(repo)
+		_check_objects(repo)
+
+	def test_packed_refs(self, repo):
+		_git(repo, "pack-refs", "--all")
+		assert not os.listdir(os.path.join(repo, ".git", "refs", "tags"))
+
+		with GitRepository(repo) as git:
+			assert git.resolve("refs/heads/side") == _git(repo, "rev-parse", "side")
+			assert git.resolve("refs/heads/nope") is None
+			tag = _git(repo, "rev-parse", "v2.0")
+			assert git.packed_refs()["refs/tags/v2.0"] == (tag, _git(repo, "rev-parse", "v2.0^{commit}"))
+			assert git.refs("refs/tags/") == {
+				"refs/tags/v1.0": _git(repo, "rev-parse", "v1.0"),
+				"refs/tags/lw": _git(repo, "rev-parse", "lw"),
+				"refs/tags/v2.0": tag}
+			assert git.tags()[_git(repo, "rev-parse", "v2.0^{commit}")] == ["v2.0"]
+
+	@pytest.mark.parametrize("version", [2, 3, 4])
+	def test_index(self, repo, version):
+		os.makedirs(os.path.join(repo, "src", "deep"))
+		for path in ("src/a.c", "src/ab.c", "src/deep/b.c", "z.txt"):
+			with open(os.path.join(repo, path), "w", encoding="utf-8") as f:
+				f.write(path)
+		_git(repo, "add", "src")
+		if version == 3:
+			# Extended flags need version 3
+			_git(repo, "add", "-N", "z.txt")
+		_git(repo, "update-index", "--index-version", str(version))
+
+		with GitRepository(repo) as git:
+			entries = git.index()
+		expected = [line.split() for line in _git(repo, "ls-files", "-s").splitlines()]
+		assert [(entry.path, entry.sha) for entry in entries] == [(line[3], line[1]) for line in expected]
+		size = os.stat(os.path.join(repo, "src", "deep", "b.c")).st_size
+		assert [entry.size for entry in entries if entry.path == "src/deep/b.c"] == [size]
+
+	@pytest.mark.parametrize("packed", [False, True])
+	def test_describe(self, repo, packed):
+		if packed:
+			_git(repo, "gc", "-q")
+		with GitRepository(repo) as git:
+			for rev in ("HEAD", "HEAD^", "HEAD^^", "side", "side^", "other", "v1.0", "master~3"):
+				sha = _git(repo, "rev-parse", f"{rev}^{{commit}}")
+				name, depth = git.describe(sha)
+				expected = _git(repo, "describe", "--tags", "--long", sha)
+				assert f"{name}-{depth}-g{git.abbreviate(sha)}" == expected
+
+			# Fewer candidates
+			expected = _git(repo, "describe", "--tags", "--long", "--candidates=1", "HEAD")
+			assert "-".join(str(value) for value in git.describe(git.head()[1], max_candidates=1)) == \
+				expected.rsplit("-", 1)[0]
+
+			first = _git(repo, "rev-list", "--max-parents=0", "HEAD")
+			assert git.describe(first) is None
+
+	def test_abbreviate(self, repo):
+		_git(repo, "gc", "-q")
+		with GitRepository(repo) as git:
+			for sha in _objects(repo):
+				assert git.abbreviate(sha) == _git(repo, "rev-parse", "--short", sha)
+				assert git.abbreviate(sha, 4) == _git(repo, "rev-parse", "--short=4", sha)
+
+	def test_close(self, repo):
+		_git(repo, "gc", "-q")
+		git = GitRepository(repo)
+		with git:
+			git.read_object(_git(repo, "rev-parse", "HEAD"))
+			packs = git._get_packs()
+			assert packs
+		assert all(pack.data.closed for pack in packs)
+
+		# Opened again when needed
+		assert git.read_object(_git(repo, "rev-parse", "HEAD"))[0] == "commit"
+		git.close()
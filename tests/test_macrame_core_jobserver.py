@@ -0,0 +1,44 @@
+import os
+from macrame.core.jobserver import Jobserver
+from macrame.core.jobserver import parse_makeflags
+
+
+class TestClass:
+
+	def test_parse_makeflags(self):
+		assert parse_makeflags(" -j4 --jobserver-auth=3,4") == ("pipe", (3, 4))
+		assert parse_makeflags("-j8 --jobserver-auth=fifo:/tmp/GMfifo1") == ("fifo", "/tmp/GMfifo1")
+		assert parse_makeflags("--jobserver-fds=5,6 -j") == ("pipe", (5, 6))
+		assert parse_makeflags("-j4 --jobserver-auth=-2,-2") is None
+		assert parse_makeflags("s") is None
+
+	def test_tokens(self):
+		with Jobserver.create(3) as jobserver:
+			assert jobserver.acquire()
+			assert jobserver.acquire()
+			assert not jobserver.acquire()
+			jobserver.release()
+			assert jobserver.held == 1
+			assert jobserver.acquire()
+
+	def test_child_makeflags(self):
+		with Jobserver.create(4) as jobserver:
+			flags = jobserver.makeflags("s -j2 --jobserver-auth=9,10")
+			assert flags == f"s -j4 --jobserver-auth={jobserver.auth}"
+
+	def test_inherit_fifo(self, tmp_path):
+		path = str(tmp_path / "fifo")
+		os.mkfifo(path)
+		reader = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+		writer = os.open(path, os.O_WRONLY)
+		os.write(writer, b"++")
+		with Jobserver.inherit(f"-j3 --jobserver-auth=fifo:{path}") as jobserver:
+			assert jobserver.pass_fds == ()
+			assert jobserver.acquire()
+			assert jobserver.acquire()
+			assert not jobserver.acquire()
+
+		# The tokens are given back
+		assert os.read(reader, 2) == b"++"
+		os.close(reader)
+		os.close(writer)
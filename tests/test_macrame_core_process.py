@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import threading
+import pytest
+from macrame.core import process
+
+
+class TestClass:
+
+	def test_capture(self):
+		result = process.run(["sh", "-c", "echo out; echo err >&2; exit 3"], capture=True)
+		assert result.returncode == 3
+		assert result.output == "out\nerr\n"
+		assert result.timed_out is False
+
+	def test_on_line(self):
+		lines = list()
+		result = process.run(["printf", "a\\nb\\nc"], on_line=lines.append)
+		assert result.returncode == 0
+		assert result.output is None
+		assert lines == ["a\n", "b\n", "c"]
+
+	def test_timeout(self):
+		result = process.run(["sleep", "10"], timeout=0.2)
+		assert result.timed_out is True
+		assert result.returncode != 0
+		assert result.wall < 5
+
+	def test_run_all(self):
+		results = process.run_all(
+			[["sh", "-c", f"sleep 0.{3 - i}; echo {i}"] for i in range(3)] + [["/nonexistent/program"]],
+			max_jobs=2,
+			capture=True)
+		assert [r.output for r in results[:3]] == ["0\n", "1\n", "2\n"]
+		assert isinstance(results[3], FileNotFoundError)
+
+	def test_max_rss(self):
+		if process.launcher_path() is None:
+			pytest.skip("no C compiler for the launcher")
+
+		# The peak memory of this interpreter is not the one of its children
+		ballast = bytearray(64 * 1024 * 1024)
+		assert process.run(["true"]).max_rss < 16 * 1024 * 1024
+		result = process.run([sys.executable, "-c", "b = bytearray(96 * 1024 * 1024)"])
+		assert result.max_rss > 96 * 1024 * 1024
+		del ballast
+
+	def test_launcher_threads(self, tmp_path, monkeypatch):
+		monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+		process.launcher_path.cache_clear()
+		paths = list()
+		threads = [threading.Thread(target=lambda: paths.append(process.launcher_path())) for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		process.launcher_path.cache_clear()
+		if paths[0] is None:
+			pytest.skip("no C compiler for the launcher")
+
+		# One build, and no temporary file left
+		assert len(set(paths)) == 1
+		assert os.listdir(os.path.join(tmp_path, "macrame")) == [os.path.basename(paths[0])]
+
+	def test_launch_error(self):
+		with pytest.raises(FileNotFoundError):
+			process.run(["/nonexistent/program"])
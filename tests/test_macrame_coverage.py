@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+from macrame.coverage import format_coverage
+from macrame.coverage import merge_reports
+from macrame.coverage import to_lcov
+from macrame.testrunner import plan_shards
+
+
+def document(count, taken):
+	return {
+		"current_working_directory": "/project",
+		"files": [
+			{"file": "src/led.c", "lines": [
+				{"line_number": 3, "count": count, "branches": [{"count": taken, "throw": False}, {"count": 0, "throw": False}]},
+				{"line_number": 4, "count": 0, "branches": []}],
+			 "functions": [{"name": "led_on", "start_line": 3, "execution_count": count}]},
+			{"file": "tests/test_led.cpp", "lines": [{"line_number": 1, "count": 1, "branches": []}]},
+			{"file": "/usr/include/stdio.h", "lines": [{"line_number": 1, "count": 1, "branches": []}]},
+		],
+	}
+
+
+class TestClass:
+
+	def test_merge(self):
+		coverage = merge_reports([document(2, 1), document(3, 2)], "/project")
+		assert list(coverage) == ["src/led.c"]
+		assert coverage["src/led.c"]["lines"] == {3: 5, 4: 0}
+		assert coverage["src/led.c"]["branches"] == {3: [3, 0]}
+		assert coverage["src/led.c"]["functions"] == {"led_on": {"line": 3, "count": 5}}
+
+	def test_lcov(self):
+		txt = to_lcov(merge_reports([document(1, 1)], "/project"))
+		assert "SF:src/led.c\n" in txt
+		assert "DA:3,1\nDA:4,0\nLF:2\nLH:1\n" in txt
+		assert "BRDA:3,0,0,1\nBRDA:3,0,1,0\nBRF:2\nBRH:1\n" in txt
+		assert "Total" in format_coverage(merge_reports([document(1, 1)], "/project"))
+
+	def test_shards(self):
+		assert plan_shards(["a", "b", "c"], 2) == [["a", "c"], ["b"]]
+		assert plan_shards(["a"], 4) == [["a"]]
@@ -0,0 +1,32 @@
+from macrame.deps import collect_dependencies
+from macrame.deps import header_fanout
+
+
+dependencies = {
+	"obj/a.o": ("a.c", ["board.h", "a.h"]),
+	"obj/b.o": ("b.c", ["board.h"]),
+	"obj/c.o": ("c.c", ["a.h", "a.h"]),
+}
+
+
+class TestClass:
+
+	def test_ranking(self):
+		entries = header_fanout(dependencies, {"obj/a.o": 1.0, "obj/b.o": 4.0})
+		assert [e["header"] for e in entries] == ["board.h", "a.h"]
+		assert entries[0] == {"header": "board.h", "units": 2, "cost": 5.0, "unmeasured": 0}
+		assert entries[1] == {"header": "a.h", "units": 2, "cost": 1.0, "unmeasured": 1}
+
+	def test_collect(self, tmp_path):
+		obj = tmp_path / "obj"
+		(obj / "src").mkdir(parents=True)
+		(obj / "pch").mkdir()
+		(obj / "src" / "a.d").write_text(f"{obj}/src/a.o: src/a.c src/../inc/a.h\n\nsrc/../inc/a.h:\n")
+		(obj / "src" / "old.d").write_text(f"{obj}/src/old.o: src/old.c\n")
+		(obj / "pch" / "c.d").write_text(f"{obj}/pch/c.h.gch: {obj}/pch/c.h {obj}/pch/../../port/board.h\n")
+
+		assert collect_dependencies(str(obj)) == {
+			f"{obj}/src/a.o": ("src/a.c", ["inc/a.h"]),
+			f"{obj}/src/old.o": ("src/old.c", list())}
+		# The stale ones are skipped
+		assert collect_dependencies(str(obj), [f"{obj}/src/./a.o"]) == {f"{obj}/src/a.o": ("src/a.c", ["inc/a.h"])}
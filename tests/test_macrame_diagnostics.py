@@ -0,0 +1,68 @@
+from macrame.diagnostics import collect_diagnostics
+from macrame.diagnostics import find_outputs
+from macrame.diagnostics import job_outputs
+from macrame.diagnostics import parse_diagnostics
+from macrame.diagnostics import to_sarif
+from macrame.scheduler import Job
+
+OUTPUT = """In file included from src/main.c:3:
+inc/board.h: In function 'helper':
+inc/board.h:12:9: warning: unused variable 'b' [-Wunused-variable]
+   12 |     int b;
+      |         ^
+src/main.c:20:5: error: 'y' undeclared (first use in this function)
+src/main.c:20:5: note: each undeclared identifier is reported only once
+"""
+
+
+class TestClass:
+
+	def test_parse(self):
+		records = parse_diagnostics(OUTPUT)
+		assert len(records) == 2
+		assert records[0]["file"] == "inc/board.h"
+		assert (records[0]["line"], records[0]["column"]) == (12, 9)
+		assert records[0]["option"] == "-Wunused-variable"
+		assert records[0]["message"] == "unused variable 'b'"
+		assert records[1]["severity"] == "error"
+		assert len(records[1]["notes"]) == 1
+
+	def test_colors_and_links(self):
+		# gcc -fdiagnostics-color -fdiagnostics-urls
+		text = (
+			"\x1b[01m\x1b[K\x1b]8;;file:///p/src/a.c\x1b\\src/a.c\x1b]8;;\x1b\\:1:2:\x1b[m\x1b[K "
+			"\x1b[01;35m\x1b[Kwarning: \x1b[m\x1b[Kunused variable 'x' "
+			"[\x1b[01;35m\x1b[K\x1b]8;;https://gcc.gnu.org/onlinedocs/gcc/Warning-Options.html\x1b\\"
+			"-Wunused-variable\x1b]8;;\x1b\\\x1b[m\x1b[K]\n")
+		records = parse_diagnostics(text)
+		assert len(records) == 1
+		assert (records[0]["file"], records[0]["line"], records[0]["column"]) == ("src/a.c", 1, 2)
+		assert records[0]["option"] == "-Wunused-variable"
+
+	def test_linker(self):
+		records = parse_diagnostics("main.c:(.text+0x5): undefined reference to `foo'\n")
+		assert records[0]["severity"] == "error" and records[0]["line"] is None
+
+	def test_duplicates_are_collapsed(self, tmp_path):
+		paths = list()
+		for name in ("a.err", "b.err"):
+			(tmp_path / name).write_text(OUTPUT.splitlines()[2] + "\n")
+			paths.append(str(tmp_path / name))
+		records = collect_diagnostics(paths)
+		assert len(records) == 1
+		assert records[0]["units"] == paths
+		assert to_sarif(records)["runs"][0]["results"][0]["ruleId"] == "-Wunused-variable"
+
+	def test_outputs(self, tmp_path):
+		compile_job = Job("CC", "[p]", "obj/src/a.o", ["src/a.c"], "")
+		link = Job("LD", "[p]", "bin/p.elf", ["obj/src/a.o"], "")
+		convert = Job("OC", "[p]", "obj/p.converted", ["bin/p.elf"], "")
+		assert job_outputs([convert, link, compile_job]) == ["bin/p.elf.err", "obj/src/a.err"]
+
+		# Without the jobs: the outputs of the removed sources are left out
+		for path in ("src/a.c", "obj/src/a.err", "obj/src/removed.err", "bin/p.elf.err"):
+			(tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+			(tmp_path / path).write_text(OUTPUT.splitlines()[2] + "\n")
+		outputs = find_outputs(["obj/"], ["bin"], root=str(tmp_path))
+		assert outputs == ["bin/p.elf.err", "obj/src/a.err"]
+		assert collect_diagnostics(outputs, root=str(tmp_path))[0]["units"] == outputs
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import subprocess
+import pytest
+from macrame.gitversion import FIELDS
+from macrame.gitversion import HEADER_PATH
+from macrame.gitversion import generate_version_header
+from macrame.gitversion import recorded_commit
+from macrame.gitversion import render_header
+from macrame.gitversion import version_fields
+
+
+def _git(root, *args, date=None):
+	env = dict(
+		os.environ,
+		GIT_CONFIG_NOSYSTEM="1", HOME=str(root),
+		GIT_AUTHOR_NAME="a", GIT_AUTHOR_EMAIL="a@b", GIT_COMMITTER_NAME="a", GIT_COMMITTER_EMAIL="a@b")
+	if date is not None:
+		env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"{1700000000 + date * 60} +0200"
+	return subprocess.run(
+		["git"] + list(args), cwd=root, env=env, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _commit(root, number):
+	with open(os.path.join(root, "file.txt"), "a", encoding="utf-8") as f:
+		f.write(f"line {number}\n")
+	_git(root, "add", "file.txt")
+	_git(root, "commit", "-q", "-m", f"Commit {number}", date=number)
+	return _git(root, "rev-parse", "HEAD")
+
+
+class TestClass:
+
+	def test_no_repository(self, tmp_path):
+		fields = version_fields(str(tmp_path))
+		assert fields["GIT_RAW_VERSION"] == ""
+		assert fields["VERSION"] == ""
+		assert set(fields) == set(name for name, _ in FIELDS)
+
+	def test_render(self):
+		txt = render_header({"VERSION": "1.2.3", "COMMIT_COMMENT": 'Say "hi"'})
+		assert '#define VERSION                                         "1.2.3"\n' in txt
+		assert '#define COMMIT_COMMENT                                  "Say \\"hi\\""\n' in txt
+		assert '#define BRANCH                                          ""\n' in txt
+		assert txt.endswith("#endif /* VERSION_H_INCLUDED */\n\n")
+
+	@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+	def test_generate(self, tmp_path):
+		root = str(tmp_path)
+		header_path = os.path.join(root, HEADER_PATH)
+		_git(root, "init", "-q", "-b", "master")
+		commit = _commit(root, 1)
+		assert generate_version_header(path=root) is True
+		assert recorded_commit(path=root) == commit
+		mtime = os.stat(header_path).st_mtime_ns
+
+		# The same repository state
+		assert generate_version_header(path=root) is False
+		assert os.stat(header_path).st_mtime_ns == mtime
+
+		commit = _commit(root, 2)
+		assert generate_version_header(path=root) is True
+		assert recorded_commit(path=root) == commit
+		with open(header_path, "r", encoding="utf-8") as f:
+			assert f'"{commit[:7]}"' in f.read()
+
+		_git(root, "tag", "v1.2")
+		assert generate_version_header(path=root) is True
+		with open(header_path, "r", encoding="utf-8") as f:
+			assert '"1.2.0"' in f.read()
@@ -0,0 +1,29 @@
+from macrame.includes import IncludeScanner
+from macrame.includes import include_paths
+from macrame.includes import parse_includes
+
+
+class TestClass:
+
+	def test_parse_includes(self):
+		data = b'#include "board.h"\n  #  include <stdint.h>\n// #include "no.h" is kept\n#define X 1\n'
+		assert parse_includes(data) == [(True, "board.h"), (False, "stdint.h")]
+
+	def test_include_paths(self):
+		command = 'gcc -c a.c -Iinc/ -I src/ -iquote q -I"/opt/cpputest/include/" -o a.o'
+		assert include_paths(command) == (["q"], ["inc/", "src/", "/opt/cpputest/include/"])
+
+	def test_headers(self, tmp_path, monkeypatch):
+		monkeypatch.chdir(tmp_path)
+		(tmp_path / "src").mkdir()
+		(tmp_path / "inc").mkdir()
+		(tmp_path / "src" / "main.c").write_text('#include "local.h"\n#include <api.h>\n#include <stdio.h>\n')
+		(tmp_path / "src" / "local.h").write_text('#include "api.h"\n')
+		(tmp_path / "inc" / "api.h").write_text('#include "local.h"\n')
+
+		scanner = IncludeScanner("tmp/includes.json")
+		assert scanner.headers("src/main.c", "gcc -Iinc/") == ["inc/api.h", "src/local.h"]
+		scanner.save()
+
+		cached = IncludeScanner("tmp/includes.json")
+		assert cached.directives("src/main.c") == [(True, "local.h"), (False, "api.h"), (False, "stdio.h")]
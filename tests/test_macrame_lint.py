@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+from macrame.lint import analyzer_command
+
+ENTRY = {
+	"directory": "/project",
+	"file": "src/main.c",
+	"output": "obj/src/main.o",
+	"arguments": [
+		"gcc", "-c", "src/main.c", "-o", "obj/src/main.o", "-Iinc/", "-I", "port/", "-DDEBUG", "-MMD", "-MF",
+		"obj/src/main.Td", "-Wa,-alms=obj/src/main.lst", "-std=c99"],
+}
+
+
+class TestClass:
+
+	def test_clang_tidy(self):
+		command = analyzer_command("clang-tidy", ENTRY, ["--checks=bugprone-*"])
+		assert command[:4] == ["clang-tidy", "--quiet", "--checks=bugprone-*", "src/main.c"]
+		assert command[4:] == ["--", "-Iinc/", "-I", "port/", "-DDEBUG", "-std=c99"]
+
+	def test_cppcheck(self):
+		command = analyzer_command("cppcheck", ENTRY)
+		assert command[-1] == "src/main.c"
+		assert command[-7:-3] == ["-I", "inc/", "-I", "port/"]
+		assert "--std=c99" in command and "-DDEBUG" in command
+
+	def test_flint(self):
+		command = analyzer_command("flint", ENTRY)
+		assert command[-4:] == ["-iinc/", "-iport/", "-dDEBUG", "src/main.c"]
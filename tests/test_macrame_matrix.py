@@ -0,0 +1,22 @@
+from macrame.matrix import plan_cells
+from macrame.tasks import format_summary
+
+
+class TestClass:
+
+	def test_tests_run_once_per_target(self):
+		cells = plan_cells(["posix", "stm32"], ["dbg", "rel"])
+		assert [cell.name for cell in cells] == ["posix/dbg", "stm32/dbg", "posix/rel", "stm32/rel"]
+		assert [cell.name for cell in cells if cell.run_tests] == ["posix/dbg", "posix/rel"]
+
+	def test_no_ports(self):
+		cells = plan_cells(None, ["dbg"])
+		assert cells[0].name == "dbg" and cells[0].run_tests
+
+	def test_summary(self):
+		cells = plan_cells(["a", "b"], ["dbg"])
+		cells[0].returncode, cells[0].duration = 0, 1.25
+		cells[1].returncode, cells[1].duration = 2, 0.5
+		lines = format_summary(cells).splitlines()
+		assert lines[1].split() == ["a/dbg", "OK", "1.2", "tmp/a/dbg/build.log"]
+		assert lines[2].split()[1] == "FAILED"
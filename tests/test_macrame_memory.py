@@ -0,0 +1,36 @@
+from macrame.memory import CallDepth
+
+
+stack = {
+	"main": (16, "static"),
+	"mid": (144, "static"),
+	"src/cg.c:leaf": (8, "static"),
+	"rec": (16, "static"),
+	"isr": (40, "dynamic,bounded"),
+}
+
+edges = {
+	"main": {"mid", "rec", "printf"},
+	"mid": {"src/cg.c:leaf"},
+	"rec": {"rec"},
+}
+
+
+class TestClass:
+
+	def test_worst_path(self):
+		graph = CallDepth(stack, edges)
+		assert graph.depth("main") == 168
+		assert graph.path("main") == ["main", "mid", "src/cg.c:leaf"]
+
+	def test_roots(self):
+		graph = CallDepth(stack, edges)
+		assert graph.roots() == ["isr", "main"]
+
+	def test_recursion_and_unknown(self):
+		graph = CallDepth(stack, edges)
+		assert graph.depth("rec") == 16
+		graph.depth("main")
+		assert graph.recursive == {"rec"}
+		assert graph.unknown == {"printf"}
+		assert graph.dynamic == {"isr"}
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import os
+from macrame.metrics import MetricsStore
+from macrame.metrics import build_kind
+from macrame.metrics import find_regressions
+from macrame.metrics import read_stats_log
+from macrame.metrics import to_openmetrics
+
+
+def _record(duration, rebuilt=10, objects=10, hits=None, misses=None, flash=1000, ram=100, returncode=0):
+	return {
+		"time": 1700000000.0, "commit_hash": None, "port": "posix", "target": "dbg", "backend": "make",
+		"returncode": returncode, "duration": duration, "rebuilt": rebuilt, "objects": objects,
+		"cache_hits": hits, "cache_misses": misses, "flash": flash, "ram": ram,
+		"phases": {"make": duration}}
+
+
+class TestClass:
+
+	def test_build_kind(self):
+		assert build_kind(_record(1.0, rebuilt=0)) == "noop"
+		assert build_kind(_record(1.0, rebuilt=10)) == "full"
+		assert build_kind(_record(1.0, rebuilt=3)) == "incremental"
+
+	def test_find_regressions(self):
+		records = [_record(10.0), _record(10.5), _record(9.5), _record(0.2, rebuilt=0)]
+		assert find_regressions(records + [_record(10.2)]) == list()
+
+		# A full build is not compared with the no-op builds
+		assert find_regressions(records + [_record(0.5, rebuilt=0)]) == list()
+
+		regressions = find_regressions(records + [_record(14.0, flash=1100)])
+		assert [(metric, round(change)) for metric, _, _, change in regressions] == [("duration", 40), ("flash", 10)]
+
+		# The failed builds are not in the baseline
+		failed = [_record(20.0, returncode=2)] * 3
+		assert find_regressions(failed + [_record(14.0)]) == list()
+
+	def test_stats_log(self, tmp_path):
+		path = os.path.join(tmp_path, "ccache-stats.log")
+		assert read_stats_log(path) is None
+
+		with open(path, "w", encoding="utf-8") as f:
+			f.write("# src/a.c\ndirect_cache_hit\n# src/b.c\ncache_miss\n# src/c.c\npreprocessed_cache_hit\n")
+		assert read_stats_log(path) == (2, 1)
+
+	def test_store(self, tmp_path):
+		store = MetricsStore(os.path.join(tmp_path, "metrics.sqlite"))
+		assert store.configurations() == list()
+		for duration in (1.0, 2.0, 3.0):
+			store.append(_record(duration, hits=3, misses=1))
+
+		assert store.configurations() == [("posix", "dbg", "make")]
+		records = store.builds("posix", "dbg", "make", limit=2)
+		assert [record["duration"] for record in records] == [2.0, 3.0]
+		assert records[-1]["phases"] == {"make": 3.0}
+		assert store.builds(None, "dbg", "make") == list()
+
+	def test_openmetrics(self):
+		record = _record(2.5, hits=3, misses=1)
+		txt = to_openmetrics("proj", [(record, [("flash", 1100, 1000, 10.0)])])
+		labels = 'project="proj",port="posix",target="dbg",backend="make"'
+		assert f"macrame_build_duration_seconds{{{labels}}} 2.5\n" in txt
+		assert f'macrame_build_phase_duration_seconds{{{labels},phase="make"}} 2.5\n' in txt
+		assert f"macrame_build_cache_hit_ratio{{{labels}}} 0.75\n" in txt
+		assert f'macrame_build_regression{{{labels},metric="flash"}} 1\n' in txt
+		assert f'macrame_build_regression{{{labels},metric="ram"}} 0\n' in txt
+		assert "# UNIT macrame_firmware_flash_bytes bytes\n" in txt
+		assert txt.endswith("# EOF\n")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+import json
+from macrame.ninja import NinjaBuildManager
+from macrame.ninja import escape
+from macrame.scheduler import Job
+
+
+def _jobs(variables=None):
+	source = Job(
+		"CC", "[p]", "tmp/obj/src/my file.o", ["src/my file.c"], "gcc -c 'src/my file.c' -DX=$HOME", aux=["Makefile"])
+	link = Job("LD", "[p]", "bin/p.elf", [source.output], "gcc 'tmp/obj/src/my file.o' -o bin/p.elf")
+	convert = Job("OC", "[p]", "tmp/obj/p.converted", [link.output], "mac convert", products=["bin/p.bin"])
+	test = Job("CXX", "[TEST]", "tmp/test/t.o", ["tests/t.cpp"], "g++ -c tests/t.cpp")
+	runner = Job("LD", "[TEST]", "bin/p_runTests", [test.output], "g++ tmp/test/t.o -o bin/p_runTests")
+	return [source, link, convert, test, runner]
+
+
+class TestClass:
+
+	def test_escape(self):
+		assert escape("c:/my dir/$x.c") == "c$:/my$ dir/$$x.c"
+
+	def test_generate(self, tmp_path, monkeypatch):
+		monkeypatch.chdir(tmp_path)
+		manager = NinjaBuildManager()
+		monkeypatch.setattr(manager, "jobs", _jobs)
+		monkeypatch.setattr(
+			manager, "test_runner", lambda variables=None: ("tests.mk", "bin/p_runTests", "tmp/test/", ["-v", "-c"]))
+
+		assert manager.generate()
+		with open(manager.ninja_path, "r", encoding="utf-8") as f:
+			txt = f.read()
+
+		assert "build tmp/obj/src/my$ file.o: cc src/my$ file.c\n" in txt
+		assert "  depfile = tmp/obj/src/my$ file.Td\n" in txt
+		assert "  cmd = gcc -c 'src/my file.c' -DX=$$HOME\n" in txt
+		assert "build bin/p.elf: ld tmp/obj/src/my$ file.o\n" in txt
+		assert "build tmp/obj/p.converted bin/p.bin: convert bin/p.elf\n" in txt
+		# The output of the compiler and of the linker is kept, not the one of the conversion
+		assert txt.count("  err = ") == 4
+		assert f"  err = {escape(_jobs()[0].log_path)}\n" in txt
+		assert "default bin/p.elf tmp/obj/p.converted bin/p.bin bin/p_runTests\n" in txt
+
+		with open(manager.ninja_path + ".json", "r", encoding="utf-8") as f:
+			cache = json.load(f)
+		assert cache["runner"] == "bin/p_runTests"
+		assert cache["runner_args"] == ["-v", "-c"]
+		assert cache["outputs"] == sorted(job.log_path for job in _jobs() if job.kind != "OC")
+		assert cache["files"] == ["Makefile", "toolchain.toml"]
+		assert manager.is_up_to_date()
+
+		# Unchanged
+		assert not manager.generate()
+		(tmp_path / "Makefile").write_text("all:\n")
+		assert not manager.is_up_to_date()
@@ -0,0 +1,23 @@
+from macrame.pch import select_headers
+from macrame.scheduler import Job
+
+
+class FakeScanner:
+
+	includes = {
+		"a.c": ["port/board.h", "inc/version.h", "src/a.h"],
+		"b.c": ["port/board.h", "inc/version.h", "src/b.h"],
+		"c.c": ["src/c.h", "port/board.h"],
+	}
+
+	def direct_headers(self, source, command):
+		return self.includes[source]
+
+
+class TestClass:
+
+	def test_select_headers(self):
+		jobs = [Job("CC", "[p]", f"obj/{s[0]}.o", [s], "gcc") for s in FakeScanner.includes]
+		assert select_headers(jobs, FakeScanner()) == ["port/board.h"]
+		assert select_headers(jobs, FakeScanner(), min_share=1.0) == ["port/board.h"]
+		assert select_headers(jobs[:1], FakeScanner()) == []
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+from macrame.profiling import hotspots
+from macrame.profiling import parse_callgrind
+from macrame.profiling import parse_perf_report
+
+CALLGRIND = """version: 1
+creator: callgrind-3.19.0
+positions: line
+events: Ir
+summary: 1000
+
+fl=(1) src/main.c
+fn=(1) main
+10 50
+cfl=(1)
+cfn=(2) parse
+calls=2 20
+11 900
+fn=(2)
+20 900
+fn=(3) idle
+30 50
+totals: 1000
+"""
+
+PERF = """# Children      Self  Symbol
+# ........  ........  ......
+#
+    96.10%     3.00%  [.] main
+    41.20%    41.20%  [.] parse_line
+     0.50%     0.50%  [k] do_syscall_64
+"""
+
+
+class TestClass:
+
+	def test_callgrind(self):
+		costs, total = parse_callgrind(CALLGRIND)
+		assert total == 1000
+		assert costs == {"main": [50, 950], "parse": [900, 900], "idle": [50, 50]}
+		assert hotspots(costs, top=2) == [("parse", 900, 900), ("main", 50, 950)]
+
+	def test_perf(self):
+		costs, total = parse_perf_report(PERF)
+		assert total == 100.0
+		assert costs["parse_line"] == [41.2, 41.2]
+		assert costs["main"] == [3.0, 96.1]
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import os
+import pytest
+from macrame.core import utils
+from macrame.core.exceptions import UserInputError
+from macrame.scaffold import create_project
+from macrame.scaffold import template_files
+
+
+def _template(root):
+	files = {
+		"src/main.c": "int main(void) { return 0; }\n",
+		"tests/AllTests.cpp": "",
+		"port/posix/Makefile": "CC = gcc\n",
+		"port/arm/Makefile": "CPPFLAGS += -Ithirdparty/CMSIS/Include/\n",
+		"port/arm/board.c": "",
+		"thirdparty/CMSIS/Include/core.h": "",
+		"thirdparty/Other/lib.h": "",
+		".gitignore": "tmp\n",
+	}
+	for path, content in files.items():
+		os.makedirs(os.path.join(root, os.path.dirname(path)), exist_ok=True)
+		with open(os.path.join(root, path), "w") as f:
+			f.write(content)
+	return str(root)
+
+
+class TestClass:
+
+	def test_template_files(self, tmp_path):
+		template = _template(tmp_path)
+		assert template_files(template, ["posix"]) == [
+			".gitignore", "port/posix/Makefile", "src/main.c", "tests/AllTests.cpp"]
+		assert "thirdparty/CMSIS/Include/core.h" in template_files(template, ["arm", "posix"])
+		assert "thirdparty/Other/lib.h" not in template_files(template, ["arm", "posix"])
+
+	def test_create_project(self, tmp_path):
+		template = _template(tmp_path / "template")
+		destination = str(tmp_path / "project")
+		counts = create_project(destination, ports=["arm"], template=template)
+		assert sum(counts.values()) == 7
+		# The unit tests need the posix port
+		assert sorted(os.listdir(os.path.join(destination, "port"))) == ["arm", "posix"]
+		with open(os.path.join(destination, "src", "main.c")) as f:
+			assert f.read() == "int main(void) { return 0; }\n"
+
+		with pytest.raises(UserInputError):
+			create_project(destination, template=template)
+		with pytest.raises(UserInputError):
+			create_project(str(tmp_path / "other"), ports=["nope"], template=template)
+
+	def test_existing_directory(self, tmp_path):
+		template = _template(tmp_path / "template")
+		destination = tmp_path / "project"
+		(destination / ".git").mkdir(parents=True)
+		create_project(str(destination), template=template, link=True)
+		assert sorted(os.listdir(destination)) == [".git", ".gitignore", "port", "src", "tests", "thirdparty"]
+
+	def test_interrupted(self, tmp_path, monkeypatch):
+		template = _template(tmp_path / "template")
+		clone_file = utils.clone_file
+		copied = list()
+
+		def interrupted(src, dst, link=False, reflink=True):
+			if len(copied) == 3:
+				raise KeyboardInterrupt
+			copied.append(dst)
+			return clone_file(src, dst, link, reflink)
+
+		monkeypatch.setattr(utils, "clone_file", interrupted)
+		with pytest.raises(KeyboardInterrupt):
+			create_project(str(tmp_path / "project"), template=template, jobs=1)
+		assert sorted(os.listdir(tmp_path)) == ["template"]
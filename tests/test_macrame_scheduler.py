@@ -0,0 +1,86 @@
+import os
+from macrame.scheduler import BuildHistory
+from macrame.scheduler import Job
+from macrame.scheduler import Scheduler
+from macrame.scheduler import instantiate
+
+
+def _jobs():
+	small = Job("CC", "[p]", "obj/small.o", ["small.c"], "")
+	big = Job("CXX", "[p]", "obj/big.o", ["big.cpp"], "")
+	link = Job("LD", "[p]", "bin/p.elf", [small.output, big.output], "")
+	for dep in (small, big):
+		link.deps.append(dep)
+		dep.consumers.append(link)
+	return small, big, link
+
+
+class TestClass:
+
+	def test_instantiate(self):
+		template = "gcc -c @MACRAME_IN@ -o @MACRAME_OUT@.o -MF @MACRAME_OUT@.Td"
+		assert instantiate(template, ["a.c"], "obj/a.o") == "gcc -c a.c -o obj/a.o -MF obj/a.Td"
+		assert instantiate("ld @MACRAME_IN@ -o @MACRAME_OUT@", ["a.o", "b.o"], "p.elf") == "ld a.o b.o -o p.elf"
+
+	def test_critical_path_priority(self, tmp_path, monkeypatch):
+		monkeypatch.chdir(tmp_path)
+		history = BuildHistory("history.json")
+		history.record("obj/small.o", "duration", 1.0)
+		history.record("obj/big.o", "duration", 8.0)
+		history.record("bin/p.elf", "duration", 2.0)
+
+		small, big, link = _jobs()
+		stale = Scheduler([small, big, link], history).plan()
+		assert len(stale) == 3
+		assert link.priority == 2.0
+		assert big.priority == 10.0
+		assert small.priority == 3.0
+
+	def test_history_average(self, tmp_path):
+		history = BuildHistory(str(tmp_path / "history.json"))
+		history.record("a.o", "duration", 4.0)
+		history.record("a.o", "duration", 2.0)
+		history.save()
+		assert BuildHistory(str(tmp_path / "history.json")).get("a.o", "duration") == 3.0
+
+	def test_memory_admission(self, tmp_path, monkeypatch):
+		monkeypatch.chdir(tmp_path)
+		history = BuildHistory("history.json")
+		history.record("obj/small.o", "rss", 100)
+		history.record("obj/big.o", "rss", 900)
+
+		small, big, link = _jobs()
+		scheduler = Scheduler([small, big, link], history, max_jobs=4, memory_budget=1000)
+		ready = [(-2.0, big), (-1.0, small)]
+		assert scheduler._admit(ready, dict()) is big
+		assert scheduler._admit(ready, {1: big}) is small
+		assert scheduler._admit([(-1.0, big)], {1: big}) is None
+
+	def test_explain(self, tmp_path, monkeypatch):
+		monkeypatch.chdir(tmp_path)
+		(tmp_path / "a.c").write_text("int a;\n")
+		(tmp_path / "a.o").write_text("")
+		(tmp_path / "a.d").write_text("a.o: a.c\n")
+		history = BuildHistory("history.json")
+		job = Job("CC", "[p]", "a.o", ["a.c"], "gcc -c a.c -o a.o")
+		os.utime("a.c", (0, 0))
+
+		assert job.explain(history=history) is None
+		history.record("a.o", "command", "0123456789abcdef", average=False)
+		assert job.explain(history=history) == ("changed command", None)
+		os.remove("a.o")
+		assert job.explain(history=history) == ("missing output", "a.o")
+
+	def test_root(self, tmp_path):
+		# The jobs of a project run in its directory, whatever the current one is
+		root = str(tmp_path)
+		(tmp_path / "a.c").write_text("int a;\n")
+		job = Job("CC", "[p]", "obj/a.o", ["a.c"], "cp a.c obj/a.o && printf 'obj/a.o: a.c\\n' > obj/a.Td")
+		history = BuildHistory(str(tmp_path / "history.json"))
+		assert job.explain(history=history, root=root) == ("missing output", "obj/a.o")
+
+		assert Scheduler([job], history, root=root).run() == 0
+		assert (tmp_path / "obj" / "a.o").read_text() == "int a;\n"
+		assert (tmp_path / "obj" / "a.d").is_file()
+		assert job.explain(history=history, root=root) is None
+		assert not os.path.exists("obj")
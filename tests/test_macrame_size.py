@@ -0,0 +1,44 @@
+from macrame.size import diff_snapshots
+from macrame.size import format_diff
+
+
+old = {
+	"sections": {
+		".text": {"main": 100, "grows": 10, "shrinks": 50, "removed": 8},
+		".bss": {"buffer": 64}
+	},
+	"totals": {".text": 168, ".bss": 64}
+}
+
+new = {
+	"sections": {
+		".text": {"main": 100, "grows": 30, "shrinks": 20, "added": 4},
+		".bss": {"buffer": 64}
+	},
+	"totals": {".text": 154, ".bss": 64}
+}
+
+
+class TestClass:
+
+	def test_diff_lists_only_changes(self):
+		changes = diff_snapshots(old, new)
+		assert list(changes) == [".text"]
+		assert changes[".text"] == [
+			("grows", 10, 30),
+			("added", 0, 4),
+			("removed", 8, 0),
+			("shrinks", 50, 20),
+		]
+
+	def test_diff_of_equal_snapshots(self):
+		assert diff_snapshots(old, old) == dict()
+		assert format_diff(old, old, dict()) == "No size changes\n"
+
+	def test_format_limits_symbols(self):
+		txt = format_diff(old, new, diff_snapshots(old, new), top=1)
+		assert txt.splitlines() == [
+			".text: -14 bytes (168 -> 154)",
+			"       +20  grows",
+			"       -30  shrinks",
+		]
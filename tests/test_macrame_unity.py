@@ -0,0 +1,17 @@
+from macrame.unity import is_excluded
+from macrame.unity import plan_batches
+
+
+class TestClass:
+
+	def test_balanced_batches(self):
+		weights = {"a.c": 8, "b.c": 4, "c.c": 3, "d.c": 2, "e.c": 1}
+		batches = plan_batches(sorted(weights), weights, 2)
+		assert batches == [["a.c", "e.c"], ["b.c", "c.c", "d.c"]]
+
+	def test_more_batches_than_sources(self):
+		assert plan_batches(["a.c"], {}, 4) == [["a.c"]]
+
+	def test_excluded(self):
+		assert is_excluded("src/legacy/x.c", ["src/legacy/*.c"])
+		assert not is_excluded("src/x.c", ["src/legacy/*.c"])
@@ -0,0 +1,32 @@
+import pytest
+from macrame.core.exceptions import UserInputError
+from macrame.workspace import MANIFEST_NAME
+from macrame.workspace import Workspace
+from macrame.workspace import find_manifest
+
+
+def _write(tmp_path, manifest):
+	(tmp_path / "a").mkdir()
+	(tmp_path / "b").mkdir()
+	(tmp_path / MANIFEST_NAME).write_text(manifest)
+	return str(tmp_path / MANIFEST_NAME)
+
+
+class TestClass:
+
+	def test_members(self, tmp_path):
+		path = _write(tmp_path, '[[member]]\npath = "a"\n\n[[member]]\npath = "b/"\ndepends = ["a"]\n')
+		workspace = Workspace(path)
+		assert [m.path for m in workspace.members] == ["a", "b"]
+		assert workspace.members[1].depends == ["a"]
+		assert find_manifest(str(tmp_path / "b")) == path
+
+	def test_circular_dependencies(self, tmp_path):
+		path = _write(tmp_path, '[[member]]\npath = "a"\ndepends = ["b"]\n\n[[member]]\npath = "b"\ndepends = ["a"]\n')
+		with pytest.raises(UserInputError):
+			Workspace(path)
+
+	def test_unknown_dependency(self, tmp_path):
+		path = _write(tmp_path, '[[member]]\npath = "a"\ndepends = ["c"]\n')
+		with pytest.raises(UserInputError):
+			Workspace(path)